@@ -2,29 +2,54 @@
 Admin API endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi.responses import FileResponse
 from typing import Optional
+import asyncio
 import os
-import tempfile
+import time
 from app.api.auth import verify_token
-from app.services.indexer import indexer_service
+from app.config import settings
+from app.services.indexer import document_source, indexer_service
+from app.services.jobs import JobQueueFull, index_job_service
 from app.models.request import IndexRequest
+from app.database import crud
+from app.database.db import SessionLocal
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
-@router.post("/index/file")
+def _load_request_stats(course_id: int, days: int) -> dict:
+    """Read course request aggregates (runs in worker thread)"""
+    db = SessionLocal()
+    try:
+        return crud.get_course_stats(db, course_id, days)
+    finally:
+        db.close()
+
+def _discard_upload(file_path: str):
+    if os.path.exists(file_path):
+        os.unlink(file_path)
+
+@router.post("/index/file", status_code=202)
 async def index_file(
     course_id: int = Form(...),
     title: str = Form(...),
     file: UploadFile = File(...),
     module_number: Optional[int] = Form(None),
+    path: Optional[str] = Form(None),
     token: str = Depends(verify_token)
 ):
     """
-    Index a document file (PDF, DOCX, TXT)
+    Queue a document file (PDF, DOCX, TXT, MD) for indexing
+    
+    The upload is streamed to disk and indexed by a background worker;
+    poll GET /admin/jobs/{job_id} for progress. path is the document's
+    place under MATERIALS_ROOT (module-1/lectures/lecture-1.md): it is
+    the source name cli_indexer.py uses, so the upload replaces what the
+    CLI indexed. Without it the source is the file name.
     Requires admin authentication
     """
     # Validate file type
-    allowed_extensions = ['.pdf', '.docx', '.txt']
+    allowed_extensions = ['.pdf', '.docx', '.txt', '.md']
     file_ext = os.path.splitext(file.filename)[1].lower()
     
     if file_ext not in allowed_extensions:
@@ -33,41 +58,73 @@ async def index_file(
             detail=f"Unsupported file type. Allowed: {allowed_extensions}"
         )
     
-    # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_path = tmp_file.name
+    metadata = {
+        "title": title,
+        "source": document_source(os.path.join(settings.MATERIALS_ROOT, path)) if path else file.filename,
+        "type": "file"
+    }
+    if module_number:
+        metadata["module"] = module_number
+    
+    job = index_job_service.create_job(course_id, file.filename, metadata)
     
+    # Stream upload to disk in chunks
+    upload_start = time.time()
+    size = 0
     try:
-        # Index document
-        metadata = {
-            "title": title,
-            "source": file.filename,
-            "type": "file"
-        }
-        if module_number:
-            metadata["module"] = module_number
+        with open(job.file_path, "wb") as out:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Max: {settings.UPLOAD_MAX_BYTES} bytes"
+                    )
+                await asyncio.to_thread(out.write, chunk)
         
-        result = await indexer_service.index_document(
-            file_path=tmp_path,
-            course_id=course_id,
-            metadata=metadata
-        )
-        
-        return {
-            "status": "success",
-            "message": f"Document indexed successfully",
-            **result
-        }
+        job.progress["bytes"] = size
+        job.timings_ms["upload"] = int((time.time() - upload_start) * 1000)
+        await index_job_service.enqueue(job)
     
+    except JobQueueFull as e:
+        _discard_upload(job.file_path)
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        _discard_upload(job.file_path)
+        raise
     except Exception as e:
+        _discard_upload(job.file_path)
         raise HTTPException(status_code=500, detail=str(e))
     
-    finally:
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+    return {
+        "status": "queued",
+        "message": "Document queued for indexing",
+        "job_id": job.id,
+        "status_url": f"/admin/jobs/{job.id}"
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    token: str = Depends(verify_token)
+):
+    """
+    Get indexing job status, progress, timings and error
+    """
+    job = await index_job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.public_dict()
+
+@router.get("/jobs")
+async def get_jobs_stats(token: str = Depends(verify_token)):
+    """
+    Get indexing queue statistics
+    """
+    return await index_job_service.stats()
 
 @router.post("/index/text")
 async def index_text(
@@ -84,7 +141,8 @@ async def index_text(
             course_id=request.course_id,
             metadata={
                 "title": request.title,
-                "source": "direct_input",
+                # One source per title so re-posting a text replaces it
+                "source": f"direct_input/{request.title}",
                 **request.metadata
             }
         )
@@ -101,26 +159,96 @@ async def index_text(
 @router.get("/stats/{course_id}")
 async def get_course_stats(
     course_id: int,
+    days: int = 30,
     token: str = Depends(verify_token)
 ):
     """
-    Get indexing statistics for a course
+    Get indexing and request statistics for a course
     """
     try:
-        # Query Qdrant for course documents
-        from app.services.qdrant_service import qdrant_service
+        from app.services.vector_store import get_async_vector_store
+        store = get_async_vector_store()
         
-        # Get collection info
-        collection_info = qdrant_service.client.get_collection(
-            collection_name=qdrant_service.collection_name
-        )
+        # Query the vector store for course documents
+        total_vectors = await store.count(course_id)
+        chunks_by_source = await store.source_stats(course_id)
+        
+        # Request metrics from daily aggregates
+        requests = await asyncio.to_thread(_load_request_stats, course_id, days)
         
         return {
             "course_id": course_id,
-            "total_vectors": collection_info.points_count,
-            "collection": qdrant_service.collection_name
+            "total_vectors": total_vectors,
+            "documents": len(chunks_by_source),
+            "sources": [
+                {"source": source, "chunks": chunks}
+                for source, chunks in sorted(chunks_by_source.items())
+            ],
+            "requests": requests,
+            "collection": store.collection_name
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/embedder/stats")
+async def get_embedder_stats(
+    token: str = Depends(verify_token)
+):
+    """
+    Get query embedding batching statistics
+    """
+    from app.services.embedder import embedding_scheduler
+    
+    return embedding_scheduler.stats()
+
+@router.get("/cache/semantic/stats")
+async def get_semantic_cache_stats(
+    token: str = Depends(verify_token)
+):
+    """
+    Get semantic answer cache statistics
+    """
+    from app.utils.semantic_cache import semantic_cache
+    
+    return semantic_cache.stats()
+
+@router.get("/logs/stats")
+async def get_request_log_stats(
+    token: str = Depends(verify_token)
+):
+    """
+    Get request log writer statistics
+    """
+    from app.database.log_writer import request_log_writer
+    
+    return request_log_writer.stats()
+
+@router.get("/profiles")
+async def list_profiles(
+    token: str = Depends(verify_token)
+):
+    """
+    List stored request profiles, newest first
+    """
+    from app.utils.profiler import profile_store
+    
+    return {
+        "enabled": settings.PROFILING_ENABLED,
+        "profiles": await asyncio.to_thread(profile_store.list)
+    }
+
+@router.get("/profiles/{name}")
+async def download_profile(
+    name: str,
+    token: str = Depends(verify_token)
+):
+    """
+    Download a profile (speedscope JSON or collapsed stacks)
+    """
+    from app.utils.profiler import profile_store
+    
+    file_path = profile_store.file_path(name)
+    if file_path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(file_path, filename=name)
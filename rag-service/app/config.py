@@ -13,11 +13,42 @@ class Settings(BaseSettings):
     YANDEX_API_KEY: str = ""
     YANDEX_FOLDER_ID: str = ""
     YANDEX_MODEL: str = "yandexgpt-lite"
+    YANDEX_HTTP2: bool = False
+    YANDEX_MAX_CONNECTIONS: int = 100
+    YANDEX_MAX_KEEPALIVE: int = 20
+    YANDEX_KEEPALIVE_EXPIRY: float = 60.0
+    YANDEX_CONNECT_TIMEOUT: float = 5.0
+    YANDEX_READ_TIMEOUT: float = 30.0
+    YANDEX_WRITE_TIMEOUT: float = 10.0
+    YANDEX_POOL_TIMEOUT: float = 5.0
     
     # Qdrant Settings
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
     QDRANT_COLLECTION: str = "course_materials"
+    QDRANT_UPSERT_BATCH_SIZE: int = 256
+    QDRANT_UPSERT_PARALLEL: int = 4
+    QDRANT_UPSERT_WAIT: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_TIMEOUT: int = 10
+    QDRANT_POOL_MAX_CONNECTIONS: int = 64
+    QDRANT_POOL_MAX_KEEPALIVE: int = 32
+    QDRANT_TENANCY_MODE: str = "shared"  # shared | tenant (per-course HNSW graphs)
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_PAYLOAD_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_QUANTIZATION: str = "none"  # none | scalar (int8) | binary
+    QDRANT_SCALAR_QUANTILE: float = 0.99
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = True
+    QDRANT_VECTORS_ON_DISK: bool = False  # keep original vectors on disk
+    QDRANT_SEARCH_OVERSAMPLING: float = 2.0
+    QDRANT_SEARCH_RESCORE: bool = True
+    
+    # Vector Store
+    VECTOR_STORE_BACKEND: str = "qdrant"  # qdrant | local (embedded, memory-mapped files)
+    VECTOR_STORE_PATH: str = "vector_store"  # local backend directory
+    VECTOR_STORE_DTYPE: str = "float32"  # local backend file format: float32 | float16 (searched as float32)
     
     # PostgreSQL Settings
     POSTGRES_HOST: str = "localhost"
@@ -26,26 +57,86 @@ class Settings(BaseSettings):
     POSTGRES_USER: str = "postgres"
     POSTGRES_PASSWORD: str = "postgres"
     
+    # Request Logging
+    REQUEST_LOG_ENABLED: bool = True
+    REQUEST_LOG_QUEUE_SIZE: int = 10000
+    REQUEST_LOG_BATCH_SIZE: int = 500
+    REQUEST_LOG_FLUSH_INTERVAL_MS: int = 1000
+    
     # Redis Settings
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
+    REDIS_MAX_CONNECTIONS: int = 50
     
     # Embeddings Settings
     EMBEDDING_MODEL: str = "intfloat/multilingual-e5-large"
-    CHUNK_SIZE: int = 500
+    EMBEDDING_BACKEND: str = "torch"  # torch | onnx | onnx-int8
+    EMBEDDING_ONNX_DIR: str = "models/onnx"
+    EMBEDDING_ONNX_THREADS: int = 0  # 0 = ONNX Runtime default
+    CHUNK_METHOD: str = "sentences"  # sentences | tokens | characters
+    CHUNK_SIZE: int = 500  # characters
     CHUNK_OVERLAP: int = 50
+    CHUNK_TOKENS: int = 256  # embedding model tokens, capped at model limit
+    CHUNK_OVERLAP_TOKENS: int = 32
+    EMBED_BATCH_MAX_SIZE: int = 32
+    EMBED_BATCH_MAX_WAIT_MS: float = 5
+    
+    # Indexing Jobs
+    INDEX_JOB_BACKEND: str = "local"  # local | redis
+    INDEX_JOB_WORKERS: int = 2  # jobs run at once in each API process (0: separate worker only)
+    INDEX_WORKER_CONCURRENCY: int = 2  # jobs run at once by python -m app.services.jobs
+    INDEX_JOB_QUEUE_SIZE: int = 100
+    INDEX_JOB_TTL: int = 86400  # keep finished job status, seconds
+    INDEX_JOB_LEASE: int = 60  # redis backend: requeue a running job after this long without a worker heartbeat, seconds
+    UPLOAD_DIR: str = "uploads"
+    MATERIALS_ROOT: str = "../course-materials"  # document sources are paths relative to it
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024
+    
+    # Retrieval Settings
+    RETRIEVAL_MODE: str = "hybrid"  # dense | hybrid (dense + sparse BM25 with RRF)
+    HYBRID_CANDIDATES: int = 20  # per-ranking candidates before fusion
+    RRF_K: int = 60
+    SPARSE_BM25_K1: float = 1.2
+    SPARSE_BM25_B: float = 0.75
+    SPARSE_AVG_DOC_LENGTH: float = 60  # tokens per chunk until a course has BM25 stats
+    SPARSE_REENCODE_DRIFT: float = 0.2  # migrate re-encodes a course when its avgdl moved more
     
     # Performance Settings
-    MAX_CHUNKS: int = 5
-    MAX_CONTEXT_LENGTH: int = 3000
+    MAX_CHUNKS: int = 5  # retrieved chunks and prompt passages
+    MAX_CONTEXT_LENGTH: int = 3000  # prompt context budget, LLM tokens
+    CONTEXT_CHARS_PER_TOKEN: float = 3.5  # token estimate for Russian text
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8  # shingle containment of near-duplicates
     REQUEST_TIMEOUT: int = 30
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 10
+    RATE_LIMIT_COURSE_PER_MINUTE: int = 300
+    RATE_LIMIT_MODE: str = "sliding_window"  # sliding_log | sliding_window | gcra
     
     # Caching
     CACHE_ENABLED: bool = True
     CACHE_TTL: int = 1800
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1000  # per course
+    SEMANTIC_CACHE_TTL: int = 1800
+    SEMANTIC_CACHE_GENERATION_TTL: float = 1.0  # seconds between reindex checks per course
+    SOURCE_STATS_CACHE_TTL: float = 30  # seconds /admin/stats reuses chunk counts per source
+    
+    # Health Checks
+    HEALTH_CHECK_INTERVAL: float = 15.0  # seconds between background probes
+    HEALTH_CHECK_TIMEOUT: float = 3.0  # per probe
+    HEALTH_STALE_AFTER: float = 60.0  # older results count as unknown
+    
+    # Profiling
+    PROFILING_ENABLED: bool = False
+    PROFILING_SAMPLE_RATE: float = 0.0  # share of requests always profiled
+    PROFILING_SLOW_MS: int = 0  # keep profiles of slower requests (0 = off)
+    PROFILING_INTERVAL_MS: float = 10.0  # stack sampling interval
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_FILES: int = 200  # oldest profiles are deleted
+    PROFILING_FORMAT: str = "speedscope"  # speedscope | collapsed
     
     class Config:
         env_file = ".env"
@@ -1,9 +1,27 @@
 """
 CRUD operations for database
 """
+from sqlalchemy import func, insert, literal_column, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from app.models.database import RequestLog
-from typing import List, Optional
+from app.models.database import RequestLog, CourseDailyStats
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+# Upper bounds of latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 30000]
+
+# Element-wise sum of the stored (possibly shorter or NULL) and the added
+# latency histogram, for INSERT ... ON CONFLICT DO UPDATE
+HISTOGRAM_SUM_SQL = """(
+    SELECT json_agg(
+        COALESCE((stored.value::text)::int, 0) + COALESCE((added.value::text)::int, 0)
+        ORDER BY COALESCE(stored.i, added.i)
+    )
+    FROM json_array_elements(course_daily_stats.latency_histogram) WITH ORDINALITY AS stored(value, i)
+    FULL JOIN json_array_elements(excluded.latency_histogram) WITH ORDINALITY AS added(value, i)
+        ON stored.i = added.i
+)"""
 
 def create_request_log(
     db: Session,
@@ -14,7 +32,9 @@ def create_request_log(
     chunks_used: Optional[dict] = None,
     response_time_ms: Optional[int] = None,
     status: str = "success",
-    error_message: Optional[str] = None
+    error_message: Optional[str] = None,
+    context_tokens: Optional[int] = None,
+    context_tokens_saved: Optional[int] = None
 ) -> RequestLog:
     """Create request log entry"""
     log = RequestLog(
@@ -25,13 +45,140 @@ def create_request_log(
         chunks_used=chunks_used,
         response_time_ms=response_time_ms,
         status=status,
-        error_message=error_message
+        error_message=error_message,
+        context_tokens=context_tokens,
+        context_tokens_saved=context_tokens_saved
     )
     db.add(log)
     db.commit()
     db.refresh(log)
     return log
 
+def bulk_create_request_logs(db: Session, rows: List[Dict]) -> int:
+    """
+    Insert many request log entries in one multi-row INSERT
+    and fold them into per-day course aggregates in the same transaction
+    """
+    if not rows:
+        return 0
+    db.execute(insert(RequestLog), rows)
+    update_course_daily_stats(db, rows)
+    db.commit()
+    return len(rows)
+
+def _latency_bucket(latency_ms: int) -> int:
+    for i, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return i
+    return len(LATENCY_BUCKETS_MS)
+
+def update_course_daily_stats(db: Session, rows: List[Dict]):
+    """
+    Add request log rows to course_daily_stats (no commit)
+    
+    One INSERT ... ON CONFLICT DO UPDATE adds to existing rows in the
+    database, so concurrent flushes add up without a read-modify-write.
+    Rows go in (course_id, day) order: flushes touching the same rows
+    lock them in the same order and cannot deadlock.
+    """
+    groups = {}
+    for row in rows:
+        created_at = row.get("created_at") or datetime.now(timezone.utc)
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc)
+        key = (row["course_id"], created_at.date())
+        group = groups.setdefault(key, {
+            "total": 0,
+            "errors": 0,
+            "latency_sum": 0,
+            "latency_count": 0,
+            "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        })
+        group["total"] += 1
+        if row.get("status") != "success":
+            group["errors"] += 1
+        if row.get("response_time_ms") is not None:
+            group["latency_sum"] += row["response_time_ms"]
+            group["latency_count"] += 1
+            group["histogram"][_latency_bucket(row["response_time_ms"])] += 1
+    
+    if not groups:
+        return
+    statement = pg_insert(CourseDailyStats).values([
+        {
+            "course_id": course_id,
+            "day": day,
+            "total_requests": group["total"],
+            "error_requests": group["errors"],
+            "latency_sum_ms": group["latency_sum"],
+            "latency_count": group["latency_count"],
+            "latency_histogram": group["histogram"]
+        }
+        for (course_id, day), group in sorted(groups.items())
+    ])
+    stats = CourseDailyStats.__table__.c
+    db.execute(statement.on_conflict_do_update(
+        constraint="uq_course_daily_stats",
+        set_={
+            "total_requests": stats.total_requests + statement.excluded.total_requests,
+            "error_requests": stats.error_requests + statement.excluded.error_requests,
+            "latency_sum_ms": stats.latency_sum_ms + statement.excluded.latency_sum_ms,
+            "latency_count": stats.latency_count + statement.excluded.latency_count,
+            "latency_histogram": literal_column(HISTOGRAM_SUM_SQL),
+            "updated_at": func.now()
+        }
+    ))
+
+def rebuild_course_daily_stats(db: Session, batch_size: int = 10000) -> int:
+    """
+    Recompute course_daily_stats from all of requests_log (commits)
+    
+    For logs written before the aggregates existed. The table is locked
+    for the whole rebuild, so log flushes that arrive meanwhile wait and
+    are added on top of the rebuilt rows.
+    
+    Returns: number of request log rows counted
+    """
+    db.execute(text("LOCK TABLE course_daily_stats IN EXCLUSIVE MODE"))
+    db.query(CourseDailyStats).delete(synchronize_session=False)
+    
+    counted = 0
+    batch = []
+    query = db.query(
+        RequestLog.course_id,
+        RequestLog.created_at,
+        RequestLog.status,
+        RequestLog.response_time_ms
+    ).yield_per(batch_size)
+    for row in query:
+        batch.append(row._asdict())
+        if len(batch) >= batch_size:
+            update_course_daily_stats(db, batch)
+            counted += len(batch)
+            batch = []
+    if batch:
+        update_course_daily_stats(db, batch)
+        counted += len(batch)
+    db.commit()
+    return counted
+
+def latency_percentile(histogram: List[int], q: float) -> Optional[int]:
+    """Estimate latency percentile from bucket counts (linear within bucket)"""
+    total = sum(histogram)
+    if total == 0:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, count in enumerate(histogram):
+        if count and cumulative + count >= rank:
+            lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0
+            if i >= len(LATENCY_BUCKETS_MS):
+                return lower
+            upper = LATENCY_BUCKETS_MS[i]
+            return int(lower + (upper - lower) * (rank - cumulative) / count)
+        cumulative += count
+    return LATENCY_BUCKETS_MS[-1]
+
 def get_user_requests(
     db: Session,
     user_id: int,
@@ -44,22 +191,42 @@ def get_user_requests(
         .limit(limit)\
         .all()
 
-def get_course_stats(db: Session, course_id: int) -> dict:
-    """Get statistics for course"""
-    total = db.query(RequestLog)\
-        .filter(RequestLog.course_id == course_id)\
-        .count()
-    
-    success = db.query(RequestLog)\
+def get_course_stats(db: Session, course_id: int, days: int = 30) -> dict:
+    """Get statistics for course from daily aggregates"""
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    rows = db.query(CourseDailyStats)\
         .filter(
-            RequestLog.course_id == course_id,
-            RequestLog.status == "success"
+            CourseDailyStats.course_id == course_id,
+            CourseDailyStats.day >= since
         )\
-        .count()
+        .order_by(CourseDailyStats.day)\
+        .all()
+    
+    total = sum(r.total_requests for r in rows)
+    errors = sum(r.error_requests for r in rows)
+    latency_sum = sum(r.latency_sum_ms for r in rows)
+    latency_count = sum(r.latency_count for r in rows)
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for r in rows:
+        for i, count in enumerate(r.latency_histogram or []):
+            histogram[i] += count
     
     return {
+        "days": days,
         "total_requests": total,
-        "successful_requests": success,
-        "error_rate": (total - success) / total if total > 0 else 0
+        "successful_requests": total - errors,
+        "error_rate": errors / total if total > 0 else 0,
+        "avg_response_time_ms": int(latency_sum / latency_count) if latency_count else None,
+        "p50_response_time_ms": latency_percentile(histogram, 0.50),
+        "p95_response_time_ms": latency_percentile(histogram, 0.95),
+        "p99_response_time_ms": latency_percentile(histogram, 0.99),
+        "daily": [
+            {
+                "day": r.day.isoformat(),
+                "total_requests": r.total_requests,
+                "error_requests": r.error_requests,
+                "p95_response_time_ms": latency_percentile(r.latency_histogram or [], 0.95)
+            }
+            for r in rows
+        ]
     }
-
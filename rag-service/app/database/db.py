@@ -1,14 +1,27 @@
 """
 Database connection and session management
 """
-from sqlalchemy import create_engine
+import math
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from app.config import settings
 
 DATABASE_URL = f"postgresql://{settings.POSTGRES_USER}:{settings.POSTGRES_PASSWORD}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
 
 engine = create_engine(DATABASE_URL)
+
+# Health probes connect afresh and give up within HEALTH_CHECK_TIMEOUT:
+# an unreachable server must not strand a worker thread per probe
+probe_engine = create_engine(
+    DATABASE_URL,
+    poolclass=NullPool,
+    connect_args={
+        "connect_timeout": max(2, math.ceil(settings.HEALTH_CHECK_TIMEOUT)),  # libpq minimum is 2
+        "options": f"-c statement_timeout={int(settings.HEALTH_CHECK_TIMEOUT * 1000)}"
+    }
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -20,7 +33,32 @@ def get_db():
     finally:
         db.close()
 
+def check_connection() -> bool:
+    """Run SELECT 1 on a new connection (blocking; call from a worker thread)"""
+    with probe_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    return True
+
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+
+def add_missing_columns():
+    """
+    Add model columns missing in existing tables
+    
+    create_all only creates new tables; nullable columns added to a
+    model later are added here, so older databases keep working.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
 
@@ -0,0 +1,136 @@
+"""
+Write-behind request logging to PostgreSQL
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List
+from app.config import settings
+from app.database import crud
+from app.database.db import SessionLocal
+
+def _write_rows(rows: List[Dict]) -> int:
+    """Bulk insert rows in a short-lived session (runs in worker thread)"""
+    db = SessionLocal()
+    try:
+        return crud.bulk_create_request_logs(db, rows)
+    finally:
+        db.close()
+
+class RequestLogWriter:
+    """
+    Buffers request log records and flushes them in bulk
+    
+    enqueue() never blocks the request: when the bounded queue is full the
+    record is dropped and counted. A background task flushes when a batch
+    fills up or the flush interval passes. stop() drains the queue.
+    """
+    
+    def __init__(
+        self,
+        write_fn: Callable[[List[Dict]], int] = _write_rows,
+        queue_size: int = None,
+        batch_size: int = None,
+        flush_interval_ms: int = None
+    ):
+        self.write_fn = write_fn
+        self.queue_size = queue_size or settings.REQUEST_LOG_QUEUE_SIZE
+        self.batch_size = batch_size or settings.REQUEST_LOG_BATCH_SIZE
+        self.flush_interval_ms = flush_interval_ms or settings.REQUEST_LOG_FLUSH_INTERVAL_MS
+        self._queue = None
+        self._task = None
+        self._stopping = False
+        
+        # Stats
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.lost = 0
+        self.last_flush_ms = 0
+    
+    async def start(self):
+        """Start background flusher"""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+    
+    def enqueue(self, record: Dict) -> bool:
+        """Queue record for writing; drops it if the queue is full"""
+        if self._queue is None:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(record)
+            self.enqueued += 1
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+    
+    async def _collect(self) -> List[Dict]:
+        """Wait for records until batch is full or flush interval passes"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval_ms / 1000
+        batch = []
+        
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _flush(self, batch: List[Dict]):
+        start_time = time.time()
+        try:
+            self.written += await asyncio.to_thread(self.write_fn, batch)
+            self.flushes += 1
+        except Exception as e:
+            self.flush_errors += 1
+            self.lost += len(batch)
+            print(f"Request log flush error: {e}")
+        self.last_flush_ms = int((time.time() - start_time) * 1000)
+    
+    async def _run(self):
+        """Flusher loop"""
+        while not self._stopping:
+            batch = await self._collect()
+            if batch:
+                await self._flush(batch)
+    
+    async def stop(self):
+        """Stop flusher and write everything still queued"""
+        # Flusher exits after at most one flush interval
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        
+        if self._queue is not None:
+            while not self._queue.empty():
+                batch = []
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                await self._flush(batch)
+    
+    def stats(self) -> Dict:
+        """Get writer statistics"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "lost": self.lost,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+request_log_writer = RequestLogWriter()
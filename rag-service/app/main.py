@@ -3,23 +3,51 @@ FastAPI application entry point
 """
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from datetime import datetime, timezone
+import asyncio
+import json
 import time
 
 from app.models.request import AskRequest
 from app.models.response import AskResponse, HealthResponse, ErrorResponse
 from app.api.auth import verify_token
 from app.api.admin import router as admin_router
-from app.services.qdrant_service import qdrant_service
+from app.services.vector_store import get_async_vector_store
+from app.services.embedder import embedding_scheduler
 from app.services.yandex_service import yandex_service
+from app.services.llm_client import llm_client
 from app.services.rag_pipeline import rag_pipeline
-from app.database.db import init_db
-from app.utils.rate_limiter import rate_limit_user
+from app.services.jobs import index_job_service
+from app.services.health import health_monitor
+from app.database.db import check_connection, init_db
+from app.database.log_writer import request_log_writer
+from app.utils.rate_limiter import rate_limit_user, rate_limit_course, rate_limiter
 from app.utils.cache import cache_service
+from app.utils.semantic_cache import semantic_cache
+from app.utils.metrics import EMBEDDING_QUEUE_DEPTH, RequestTimer, stage
+from app.utils.profiler import ProfilingMiddleware
+from app.config import settings
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+vector_store = get_async_vector_store()
+
+EMBEDDING_QUEUE_DEPTH.set_function(lambda: embedding_scheduler.queue_depth)
+
+async def _check_postgres() -> bool:
+    return await asyncio.to_thread(check_connection)
+
+# Only the vector store is required for readiness: without Redis and
+# PostgreSQL answers still work, and YandexGPT is shared by all instances
+health_monitor.register(settings.VECTOR_STORE_BACKEND, vector_store.check_health, required=True)
+health_monitor.register("postgres", _check_postgres)
+health_monitor.register("redis", rate_limiter.redis.ping)
+health_monitor.register("yandex_gpt", yandex_service.probe)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
@@ -27,9 +55,21 @@ async def lifespan(app: FastAPI):
     logger.info("startup", message="Initializing RAG Course Platform")
     init_db()
     logger.info("startup", message="Database initialized")
+    await llm_client.start()
+    await request_log_writer.start()
+    await index_job_service.start()
+    await health_monitor.start()
     yield
     # Shutdown
     logger.info("shutdown", message="Shutting down")
+    await health_monitor.stop()
+    await index_job_service.stop()
+    await request_log_writer.stop()
+    await embedding_scheduler.close()
+    await llm_client.close()
+    await rate_limiter.close()
+    await cache_service.close()
+    await vector_store.close()
 
 app = FastAPI(
     title="RAG Course Platform API",
@@ -41,6 +81,10 @@ app = FastAPI(
 # Include routers
 app.include_router(admin_router)
 
+# Sampling profiler for slow requests (opt-in)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -57,33 +101,97 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "health": "/health",
+            "health_live": "/health/live",
+            "health_ready": "/health/ready",
+            "metrics": "/metrics (Prometheus)",
             "ask": "/ask (POST, requires auth)",
+            "ask_stream": "/ask/stream (POST, requires auth, Server-Sent Events)",
             "docs": "/docs"
         }
     }
 
 @app.get("/health", response_model=HealthResponse)
 async def health():
-    """Health check endpoint"""
-    services = {
-        "api": "ok",
-        "qdrant": "ok" if qdrant_service.check_health() else "error",
-        "postgres": "ok"
-    }
+    """
+    Health check endpoint
     
-    # Check YandexGPT only if configured
-    if yandex_service.api_key:
-        yandex_ok = await yandex_service.check_health()
-        services["yandex_gpt"] = "ok" if yandex_ok else "error"
-    else:
-        services["yandex_gpt"] = "not_configured"
+    Reports the cached results of background dependency probes
+    (HEALTH_CHECK_INTERVAL); no dependency is called here.
+    """
+    services = {"api": "ok", **health_monitor.services()}
     
     return HealthResponse(
-        status="healthy",
+        status="degraded" if "error" in services.values() else "healthy",
         services=services,
-        version="1.0.0"
+        version="1.0.0",
+        checks=health_monitor.checks()
     )
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process serves requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: required dependencies passed their last probe"""
+    not_ready = health_monitor.not_ready()
+    return JSONResponse(
+        status_code=503 if not_ready else 200,
+        content={
+            "status": "not_ready" if not_ready else "ready",
+            "not_ready": not_ready,
+            "services": health_monitor.services()
+        }
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latency histograms and load gauges"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+def log_request(
+    request: AskRequest,
+    status: str,
+    answer: str = None,
+    chunks_used: list = None,
+    response_time_ms: int = None,
+    error_message: str = None,
+    context: dict = None
+):
+    """
+    Queue request log record (written in background batches)
+    
+    context is the context packing stats of answers generated now;
+    cached answers have none.
+    """
+    if not settings.REQUEST_LOG_ENABLED:
+        return
+    request_log_writer.enqueue({
+        "user_id": request.user_id,
+        "course_id": request.course_id,
+        "question": request.question,
+        "answer": answer,
+        "chunks_used": [
+            {
+                "source": c.get("source"),
+                "score": c.get("score"),
+                "chunk_index": c.get("metadata", {}).get("chunk_index")
+            }
+            for c in (chunks_used or [])
+        ],
+        "response_time_ms": response_time_ms,
+        "status": status,
+        "error_message": error_message,
+        "context_tokens": context["tokens_after"] if context else None,
+        "context_tokens_saved": context["tokens_saved"] if context else None,
+        "created_at": datetime.now(timezone.utc)
+    })
+
+def _is_scoped(request: AskRequest) -> bool:
+    """Whether the question is limited to a module or section"""
+    return request.module is not None or bool(request.section)
+
 @app.post("/ask", response_model=AskResponse)
 async def ask_question(
     request: AskRequest,
@@ -94,70 +202,285 @@ async def ask_question(
     Requires Bearer token authentication
     Rate limited per user
     """
-    # Rate limiting
-    await rate_limit_user(None, request.user_id)
-    
-    # Check cache
-    cached = cache_service.get_answer_cache(request.question, request.course_id)
-    if cached:
-        logger.info(
-            "cache_hit",
-            user_id=request.user_id,
-            course_id=request.course_id
-        )
-        return AskResponse(**cached)
+    start_time = time.time()
     
-    try:
-        logger.info(
-            "ask_question",
-            user_id=request.user_id,
-            course_id=request.course_id,
-            question_length=len(request.question)
-        )
-        
-        # Use full RAG pipeline
-        answer, chunks, response_time_ms = await rag_pipeline.process(
-            question=request.question,
-            course_id=request.course_id,
-            top_k=5
-        )
-        
-        result = {
-            "status": "success",
-            "answer": answer,
-            "chunks_used": chunks,
-            "response_time_ms": response_time_ms
-        }
+    with RequestTimer("ask", request.course_id) as timer:
+        # Rate limiting
+        with stage("rate_limit"):
+            await rate_limit_user(None, request.user_id)
+            await rate_limit_course(None, request.course_id)
         
-        # Cache result
-        cache_service.set_answer_cache(request.question, request.course_id, result)
+        # Check cache
+        with stage("cache"):
+            cached = cache_service.get_answer_cache(
+                request.question, request.course_id, request.module, request.section
+            )
+        if cached:
+            timer.cache = "exact"
+            logger.info(
+                "cache_hit",
+                user_id=request.user_id,
+                course_id=request.course_id
+            )
+            log_request(
+                request, "success", cached["answer"], cached.get("chunks_used"),
+                int((time.time() - start_time) * 1000)
+            )
+            return AskResponse(**cached)
         
-        logger.info(
-            "ask_success",
-            user_id=request.user_id,
-            course_id=request.course_id,
-            response_time_ms=response_time_ms,
-            chunks_count=len(chunks)
-        )
+        try:
+            # Check semantic cache (paraphrases of answered questions);
+            # it is per course only, so scoped questions bypass it
+            question_embedding = None
+            if settings.SEMANTIC_CACHE_ENABLED and not _is_scoped(request):
+                with stage("embedding"):
+                    question_embedding = await embedding_scheduler.submit(request.question)
+                with stage("cache"):
+                    cached = semantic_cache.get(question_embedding, request.course_id)
+                if cached:
+                    timer.cache = "semantic"
+                    logger.info(
+                        "semantic_cache_hit",
+                        user_id=request.user_id,
+                        course_id=request.course_id
+                    )
+                    log_request(
+                        request, "success", cached["answer"], cached.get("chunks_used"),
+                        int((time.time() - start_time) * 1000)
+                    )
+                    return AskResponse(**cached)
+            
+            logger.info(
+                "ask_question",
+                user_id=request.user_id,
+                course_id=request.course_id,
+                question_length=len(request.question)
+            )
+            
+            # Use full RAG pipeline
+            answer, chunks, response_time_ms, context = await rag_pipeline.process(
+                question=request.question,
+                course_id=request.course_id,
+                top_k=settings.MAX_CHUNKS,
+                question_embedding=question_embedding,
+                module=request.module,
+                section=request.section
+            )
+            
+            result = {
+                "status": "success",
+                "answer": answer,
+                "chunks_used": [c.model_dump() for c in chunks],
+                "response_time_ms": response_time_ms
+            }
+            
+            # Cache result
+            cache_service.set_answer_cache(
+                request.question, request.course_id, result, request.module, request.section
+            )
+            if question_embedding is not None:
+                semantic_cache.set(question_embedding, request.course_id, request.question, result)
+            
+            logger.info(
+                "ask_success",
+                user_id=request.user_id,
+                course_id=request.course_id,
+                response_time_ms=response_time_ms,
+                chunks_count=len(chunks),
+                context_tokens=context["tokens_after"],
+                context_tokens_saved=context["tokens_saved"]
+            )
+            log_request(request, "success", answer, result["chunks_used"], response_time_ms, context=context)
+            
+            return AskResponse(**result)
         
-        return AskResponse(**result)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(
+                "ask_error",
+                user_id=request.user_id,
+                course_id=request.course_id,
+                error=str(e)
+            )
+            log_request(
+                request, "error",
+                response_time_ms=int((time.time() - start_time) * 1000),
+                error_message=str(e)
+            )
+            raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: str, data: dict) -> str:
+    """Format Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_question_stream(
+    request: AskRequest,
+    token: str = Depends(verify_token)
+):
+    """
+    Ask a question and stream the answer as Server-Sent Events
     
-    except HTTPException:
+    Events: chunks (retrieved materials), token (answer delta),
+    done (full answer) or error
+    Requires Bearer token authentication
+    Rate limited per user
+    """
+    start_time = time.time()
+    # In flight only while the stream body runs, which always finishes it;
+    # failures before that finish it here
+    timer = RequestTimer("stream", request.course_id, in_flight=False)
+    
+    try:
+        # Rate limiting
+        with stage("rate_limit"):
+            await rate_limit_user(None, request.user_id)
+            await rate_limit_course(None, request.course_id)
+        
+        with stage("cache"):
+            cached = cache_service.get_answer_cache(
+                request.question, request.course_id, request.module, request.section
+            )
+    except BaseException:
+        timer.finish()
         raise
-    except Exception as e:
-        logger.error(
-            "ask_error",
-            user_id=request.user_id,
-            course_id=request.course_id,
-            error=str(e)
-        )
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def event_stream():
+        timer.start_flight()
+        with timer.activate():
+            if cached:
+                timer.cache = "exact"
+                logger.info(
+                    "cache_hit",
+                    user_id=request.user_id,
+                    course_id=request.course_id,
+                    stream=True
+                )
+                log_request(
+                    request, "success", cached["answer"], cached.get("chunks_used"),
+                    int((time.time() - start_time) * 1000)
+                )
+                yield _sse("chunks", {"chunks_used": cached.get("chunks_used", [])})
+                yield _sse("token", {"text": cached["answer"]})
+                yield _sse("done", cached)
+                return
+            
+            question_embedding = None
+            if settings.SEMANTIC_CACHE_ENABLED and not _is_scoped(request):
+                try:
+                    with stage("embedding"):
+                        question_embedding = await embedding_scheduler.submit(request.question)
+                except Exception as e:
+                    log_request(
+                        request, "error",
+                        response_time_ms=int((time.time() - start_time) * 1000),
+                        error_message=str(e)
+                    )
+                    yield _sse("error", {"error": str(e)})
+                    return
+                with stage("cache"):
+                    semantic_cached = semantic_cache.get(question_embedding, request.course_id)
+                if semantic_cached:
+                    timer.cache = "semantic"
+                    logger.info(
+                        "semantic_cache_hit",
+                        user_id=request.user_id,
+                        course_id=request.course_id,
+                        stream=True
+                    )
+                    log_request(
+                        request, "success", semantic_cached["answer"], semantic_cached.get("chunks_used"),
+                        int((time.time() - start_time) * 1000)
+                    )
+                    yield _sse("chunks", {"chunks_used": semantic_cached.get("chunks_used", [])})
+                    yield _sse("token", {"text": semantic_cached["answer"]})
+                    yield _sse("done", semantic_cached)
+                    return
+            
+            logger.info(
+                "ask_question",
+                user_id=request.user_id,
+                course_id=request.course_id,
+                question_length=len(request.question),
+                stream=True
+            )
+            
+            try:
+                async for item in rag_pipeline.process_stream(
+                    question=request.question,
+                    course_id=request.course_id,
+                    top_k=settings.MAX_CHUNKS,
+                    question_embedding=question_embedding,
+                    module=request.module,
+                    section=request.section
+                ):
+                    if item["event"] == "done":
+                        result = {k: v for k, v in item["data"].items() if k not in ("first_token_ms", "context")}
+                        cache_service.set_answer_cache(
+                            request.question, request.course_id, result, request.module, request.section
+                        )
+                        if question_embedding is not None:
+                            semantic_cache.set(question_embedding, request.course_id, request.question, result)
+                        logger.info(
+                            "ask_success",
+                            user_id=request.user_id,
+                            course_id=request.course_id,
+                            response_time_ms=item["data"]["response_time_ms"],
+                            first_token_ms=item["data"]["first_token_ms"],
+                            chunks_count=len(item["data"]["chunks_used"]),
+                            context_tokens=item["data"]["context"]["tokens_after"],
+                            context_tokens_saved=item["data"]["context"]["tokens_saved"],
+                            stream=True
+                        )
+                        log_request(
+                            request, "success", result["answer"], result["chunks_used"],
+                            result["response_time_ms"], context=item["data"]["context"]
+                        )
+                    elif item["event"] == "error":
+                        logger.error(
+                            "ask_error",
+                            user_id=request.user_id,
+                            course_id=request.course_id,
+                            error=item["data"]["error"],
+                            stream=True
+                        )
+                        log_request(
+                            request, "error",
+                            response_time_ms=int((time.time() - start_time) * 1000),
+                            error_message=item["data"]["error"]
+                        )
+                    yield _sse(item["event"], item["data"])
+            except Exception as e:
+                logger.error(
+                    "ask_error",
+                    user_id=request.user_id,
+                    course_id=request.course_id,
+                    error=str(e),
+                    stream=True
+                )
+                log_request(
+                    request, "error",
+                    response_time_ms=int((time.time() - start_time) * 1000),
+                    error_message=str(e)
+                )
+                yield _sse("error", {"error": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 @app.get("/test-qdrant")
 async def test_qdrant():
     """Test Qdrant connection"""
     try:
-        collections = qdrant_service.client.get_collections()
+        from app.services.async_qdrant_service import async_qdrant_service
+        collections = await async_qdrant_service.client.get_collections()
         return {
             "status": "ok",
             "collections": [c.name for c in collections.collections]
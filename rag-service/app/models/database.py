@@ -1,7 +1,7 @@
 """
 Database models
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, JSON, UniqueConstraint
 from sqlalchemy.sql import func
 from app.database.db import Base
 
@@ -17,5 +17,22 @@ class RequestLog(Base):
     response_time_ms = Column(Integer)
     status = Column(String(20))
     error_message = Column(Text)
+    context_tokens = Column(Integer)  # estimated prompt context tokens after packing
+    context_tokens_saved = Column(Integer)  # removed by merging, deduplication and budget
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
+
+class CourseDailyStats(Base):
+    """Per course, per day request aggregates, updated on every log flush"""
+    __tablename__ = "course_daily_stats"
+    __table_args__ = (UniqueConstraint("course_id", "day", name="uq_course_daily_stats"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    course_id = Column(Integer, nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+    total_requests = Column(Integer, nullable=False, default=0)
+    error_requests = Column(Integer, nullable=False, default=0)
+    latency_sum_ms = Column(BigInteger, nullable=False, default=0)
+    latency_count = Column(Integer, nullable=False, default=0)
+    latency_histogram = Column(JSON)  # counts per LATENCY_BUCKETS_MS bucket
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,12 +1,15 @@
 """
 Request models
 """
+from typing import Optional
 from pydantic import BaseModel, Field
 
 class AskRequest(BaseModel):
     user_id: int = Field(..., description="Moodle user ID")
     course_id: int = Field(..., description="Moodle course ID")
     question: str = Field(..., max_length=500, description="User question")
+    module: Optional[int] = Field(None, description="Search only this course module")
+    section: Optional[str] = Field(None, max_length=200, description="Search only under this heading")
 
 class IndexRequest(BaseModel):
     course_id: int
@@ -25,4 +25,5 @@ class HealthResponse(BaseModel):
     status: str
     services: dict
     version: str
+    checks: dict = {}
 
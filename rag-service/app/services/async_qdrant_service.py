@@ -0,0 +1,202 @@
+"""
+Async Qdrant service for the request hot path
+"""
+import asyncio
+import time
+import httpx
+from qdrant_client import AsyncQdrantClient
+from qdrant_client.models import FieldCondition, Filter, HasIdCondition, MatchValue, NamedSparseVector, SparseVector
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.qdrant_layout import course_filter, search_params
+from app.services.vector_store import AsyncVectorStore
+from app.utils.course_sources import course_sources
+from app.utils.sparse import SPARSE_VECTOR_NAME
+
+class AsyncQdrantService(AsyncVectorStore):
+    def __init__(self):
+        # One client per process: REST requests share a keep-alive pool,
+        # gRPC multiplexes over a single channel
+        self.client = AsyncQdrantClient(
+            host=settings.QDRANT_HOST,
+            port=settings.QDRANT_PORT,
+            grpc_port=settings.QDRANT_GRPC_PORT,
+            prefer_grpc=settings.QDRANT_PREFER_GRPC,
+            timeout=settings.QDRANT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.QDRANT_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.QDRANT_POOL_MAX_KEEPALIVE
+            )
+        )
+        self.collection_name = settings.QDRANT_COLLECTION
+        self._has_sparse = False
+        self._sparse_checked_at = None
+        self._source_stats: Dict[int, tuple] = {}
+    
+    async def search(
+        self,
+        vector: list,
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ):
+        """Search for similar vectors"""
+        try:
+            results = await self.client.search(
+                collection_name=self.collection_name,
+                query_vector=vector,
+                query_filter=self._course_filter(course_id, module, section),
+                search_params=search_params(),
+                limit=limit
+            )
+            return results
+        except Exception as e:
+            print(f"Qdrant search error: {e}")
+            return []
+    
+    async def search_sparse(
+        self,
+        indices: List[int],
+        values: List[float],
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ):
+        """Search lexical sparse vectors"""
+        if not indices:
+            return []
+        try:
+            results = await self.client.search(
+                collection_name=self.collection_name,
+                query_vector=NamedSparseVector(
+                    name=SPARSE_VECTOR_NAME,
+                    vector=SparseVector(indices=indices, values=values)
+                ),
+                query_filter=self._course_filter(course_id, module, section),
+                limit=limit
+            )
+            return results
+        except Exception as e:
+            print(f"Qdrant sparse search error: {e}")
+            return []
+    
+    async def score_points(self, vector: list, course_id: int, point_ids: List[str]) -> Dict[str, float]:
+        """Dense similarity of vector to the given course points"""
+        if not point_ids:
+            return {}
+        query_filter = self._course_filter(course_id)
+        query_filter.must.append(HasIdCondition(has_id=point_ids))
+        try:
+            results = await self.client.search(
+                collection_name=self.collection_name,
+                query_vector=vector,
+                query_filter=query_filter,
+                search_params=search_params(),
+                limit=len(point_ids)
+            )
+        except Exception as e:
+            print(f"Qdrant search error: {e}")
+            return {}
+        return {str(result.id): result.score for result in results}
+    
+    async def supports_sparse(self) -> bool:
+        """Whether the collection has the sparse vector (rechecked every minute until migrated)"""
+        now = time.monotonic()
+        if not self._has_sparse and (self._sparse_checked_at is None or now - self._sparse_checked_at > 60):
+            self._sparse_checked_at = now
+            try:
+                info = await self.get_collection_info()
+                self._has_sparse = SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+            except Exception as e:
+                print(f"Qdrant collection info error: {e}")
+        return self._has_sparse
+    
+    def _course_filter(self, course_id: int, module: Optional[int] = None, section: Optional[str] = None) -> Filter:
+        return course_filter(course_id, module, section)
+    
+    async def count(self, course_id: int) -> int:
+        """Count course points (uses course_id payload index)"""
+        result = await self.client.count(
+            collection_name=self.collection_name,
+            count_filter=self._course_filter(course_id),
+            exact=True
+        )
+        return result.count
+    
+    async def source_stats(self, course_id: int, page_size: int = 1000) -> Dict[str, int]:
+        """
+        Count chunks per source document of course
+        
+        Each source registered in course_sources is counted with an indexed
+        count query. If the counts miss points of the course (it was indexed
+        before sources were registered), the course is scrolled once and
+        its sources registered. Results are reused for
+        SOURCE_STATS_CACHE_TTL seconds.
+        """
+        now = time.monotonic()
+        cached = self._source_stats.get(course_id)
+        if cached is not None and now - cached[0] < settings.SOURCE_STATS_CACHE_TTL:
+            return cached[1]
+        
+        sources = sorted(await course_sources.members(course_id))
+        counts = await asyncio.gather(*(self._count_source(course_id, source) for source in sources))
+        chunks_by_source = {source: count for source, count in zip(sources, counts) if count}
+        await course_sources.remove(course_id, [source for source, count in zip(sources, counts) if not count])
+        if sum(chunks_by_source.values()) < await self.count(course_id):
+            chunks_by_source = await self._scroll_source_stats(course_id, page_size)
+            await course_sources.add_async(course_id, chunks_by_source)
+        
+        self._source_stats[course_id] = (now, chunks_by_source)
+        return chunks_by_source
+    
+    async def _count_source(self, course_id: int, source: str) -> int:
+        count_filter = self._course_filter(course_id)
+        count_filter.must.append(FieldCondition(key="metadata.source", match=MatchValue(value=source)))
+        result = await self.client.count(
+            collection_name=self.collection_name,
+            count_filter=count_filter,
+            exact=True
+        )
+        return result.count
+    
+    async def _scroll_source_stats(self, course_id: int, page_size: int) -> Dict[str, int]:
+        """Count chunks per source by scrolling the course payloads"""
+        chunks_by_source: Dict[str, int] = {}
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=self._course_filter(course_id),
+                limit=page_size,
+                offset=offset,
+                with_payload=["metadata.source"],
+                with_vectors=False
+            )
+            for point in points:
+                source = (point.payload or {}).get("metadata", {}).get("source", "unknown")
+                chunks_by_source[source] = chunks_by_source.get(source, 0) + 1
+            if offset is None:
+                break
+        return chunks_by_source
+    
+    async def get_collection_info(self):
+        """Get collection info"""
+        return await self.client.get_collection(
+            collection_name=self.collection_name
+        )
+    
+    async def check_health(self) -> bool:
+        """Check if Qdrant is healthy"""
+        try:
+            await self.client.get_collections()
+            return True
+        except:
+            return False
+    
+    async def close(self):
+        """Close connection pool"""
+        await self.client.close()
+
+async_qdrant_service = AsyncQdrantService()
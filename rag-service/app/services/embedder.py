@@ -1,26 +1,33 @@
 """
 Embedder service for creating text embeddings
 """
-from sentence_transformers import SentenceTransformer
 from app.config import settings
+from app.services.embedding_backends import get_backend
+from app.utils.batcher import MicroBatcher
 from typing import List
 
 class EmbedderService:
     def __init__(self):
-        print(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        self.dimension = self.model.get_sentence_embedding_dimension()
+        print(f"Loading embedding model: {settings.EMBEDDING_MODEL} ({settings.EMBEDDING_BACKEND})")
+        self.backend = get_backend(settings.EMBEDDING_BACKEND)
+        self.dimension = self.backend.dimension
         print(f"Model loaded. Embedding dimension: {self.dimension}")
     
     def embed(self, text: str) -> List[float]:
         """Create embedding for single text"""
-        embedding = self.model.encode(text, convert_to_tensor=False)
+        embedding = self.backend.encode([text])[0]
         return embedding.tolist()
     
     def embed_batch(self, texts: List[str]) -> List[List[float]]:
         """Create embeddings for multiple texts"""
-        embeddings = self.model.encode(texts, convert_to_tensor=False)
+        embeddings = self.backend.encode(texts)
         return [emb.tolist() for emb in embeddings]
 
 embedder_service = EmbedderService()
 
+# Batches query embeddings across concurrent requests
+embedding_scheduler = MicroBatcher(
+    embedder_service.embed_batch,
+    max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS
+)
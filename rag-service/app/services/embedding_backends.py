@@ -0,0 +1,209 @@
+"""
+Embedding backends: torch fp32, ONNX Runtime and int8 ONNX
+"""
+import json
+import os
+import time
+from typing import Dict, List
+import numpy as np
+from app.config import settings
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+class TorchBackend:
+    """SentenceTransformer in fp32 (reference implementation)"""
+    
+    name = "torch"
+    
+    def __init__(self, model_name: str = None):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name or settings.EMBEDDING_MODEL)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, convert_to_tensor=False))
+
+class OnnxBackend:
+    """
+    Exported transformer run by ONNX Runtime
+    
+    Pooling and normalization follow the SentenceTransformer modules recorded
+    at export time, so vectors stay compatible with the torch backend.
+    """
+    
+    def __init__(self, model_dir: str = None, quantized: bool = False, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        model_dir = model_dir or settings.EMBEDDING_ONNX_DIR
+        model_file = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise ValueError(
+                f"ONNX model not found: {model_path}. Run: python cli_embedder.py "
+                f"{'quantize' if quantized else 'export'} {model_dir}"
+            )
+        
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), encoding="utf-8") as f:
+            config = json.load(f)
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.EMBEDDING_ONNX_THREADS:
+            options.intra_op_num_threads = settings.EMBEDDING_ONNX_THREADS
+        
+        self.name = "onnx-int8" if quantized else "onnx"
+        self.session = ort.InferenceSession(
+            model_path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.max_length = config["max_seq_length"]
+        self.dimension = config["dimension"]
+        self.batch_size = batch_size
+    
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        
+        # Sort by length so each batch pads to similar sizes
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        
+        for start in range(0, len(texts), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in indices],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            pooled = self._pool(hidden, encoded["attention_mask"])
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            embeddings[indices] = pooled
+        
+        return embeddings
+
+def get_backend(name: str = None):
+    """Create embedding backend by name"""
+    name = name or settings.EMBEDDING_BACKEND
+    if name == "torch":
+        return TorchBackend()
+    elif name == "onnx":
+        return OnnxBackend(quantized=False)
+    elif name == "onnx-int8":
+        return OnnxBackend(quantized=True)
+    else:
+        raise ValueError(f"Unknown embedding backend: {name}")
+
+def export_onnx(output_dir: str = None, model_name: str = None) -> str:
+    """Export SentenceTransformer transformer to ONNX with its pooling config"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+    
+    output_dir = output_dir or settings.EMBEDDING_ONNX_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    
+    model = SentenceTransformer(model_name or settings.EMBEDDING_MODEL, device="cpu")
+    auto_model = model[0].auto_model.eval()
+    auto_model.config.return_dict = False
+    tokenizer = model.tokenizer
+    
+    dummy = tokenizer(["query: пример текста"], return_tensors="pt")
+    # Keep forward() argument order
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+    dynamic_axes = {n: {0: "batch", 1: "sequence"} for n in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            auto_model,
+            tuple(dummy[n] for n in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            do_constant_folding=True
+        )
+    
+    tokenizer.save_pretrained(output_dir)
+    
+    pooling = "mean"
+    for module in model:
+        if isinstance(module, Pooling) and module.get_config_dict().get("pooling_mode_cls_token"):
+            pooling = "cls"
+    
+    config = {
+        "model_name": model_name or settings.EMBEDDING_MODEL,
+        "pooling": pooling,
+        "normalize": any(isinstance(module, Normalize) for module in model),
+        "max_seq_length": model.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension()
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    
+    return model_path
+
+def quantize_onnx(model_dir: str = None) -> str:
+    """Dynamically quantize exported ONNX model weights to int8"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    model_dir = model_dir or settings.EMBEDDING_ONNX_DIR
+    source_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+    if not os.path.exists(source_path):
+        raise ValueError(f"ONNX model not found: {source_path}. Run export first.")
+    
+    target_path = os.path.join(model_dir, ONNX_INT8_MODEL_FILE)
+    quantize_dynamic(
+        source_path,
+        target_path,
+        weight_type=QuantType.QInt8,
+        # fp32 e5-large is over the 2 GB protobuf limit
+        use_external_data_format=True
+    )
+    return target_path
+
+def parity_check(texts: List[str], reference, candidate) -> Dict:
+    """Compare candidate backend against reference by cosine drift (1 - cos)"""
+    start_time = time.time()
+    ref = np.asarray(reference.encode(texts), dtype=np.float32)
+    ref_ms = int((time.time() - start_time) * 1000)
+    
+    start_time = time.time()
+    cand = np.asarray(candidate.encode(texts), dtype=np.float32)
+    cand_ms = int((time.time() - start_time) * 1000)
+    
+    ref /= np.clip(np.linalg.norm(ref, axis=1, keepdims=True), 1e-12, None)
+    cand /= np.clip(np.linalg.norm(cand, axis=1, keepdims=True), 1e-12, None)
+    drift = 1.0 - (ref * cand).sum(axis=1)
+    
+    return {
+        "texts": len(texts),
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "cosine_drift_mean": float(drift.mean()),
+        "cosine_drift_p95": float(np.percentile(drift, 95)),
+        "cosine_drift_max": float(drift.max()),
+        "reference_ms": ref_ms,
+        "candidate_ms": cand_ms
+    }
@@ -1,10 +1,15 @@
 """
 Generator service with RAG-optimized prompts
 """
-import httpx
-from typing import List
+import json
+from typing import AsyncIterator, List
 from app.config import settings
+from app.services.llm_client import llm_client
 from app.models.response import Chunk
+from app.utils.metrics import stage
+
+class GeneratorError(Exception):
+    """Raised when generation fails"""
 
 class GeneratorService:
     def __init__(self):
@@ -12,24 +17,16 @@ class GeneratorService:
         self.folder_id = settings.YANDEX_FOLDER_ID
         self.model = settings.YANDEX_MODEL
         self.endpoint = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+        self.http = llm_client
     
-    async def generate_with_context(
-        self, 
-        question: str, 
-        chunks: List[Chunk]
-    ) -> str:
-        """Generate answer using RAG context"""
-        
-        if not self.api_key or not self.folder_id:
-            return "YandexGPT не настроен. Установите YANDEX_API_KEY и YANDEX_FOLDER_ID."
-        
-        # Build RAG prompt
+    def _build_payload(self, question: str, chunks: List[Chunk], stream: bool = False) -> dict:
+        """Build completion request payload"""
         prompt = self._build_rag_prompt(question, chunks)
         
-        payload = {
+        return {
             "modelUri": f"gpt://{self.folder_id}/{self.model}",
             "completionOptions": {
-                "stream": False,
+                "stream": stream,
                 "temperature": 0.6,
                 "maxTokens": 1000
             },
@@ -44,27 +41,88 @@ class GeneratorService:
                 }
             ]
         }
-        
-        headers = {
+    
+    def _headers(self) -> dict:
+        return {
             "Authorization": f"Api-Key {self.api_key}",
             "Content-Type": "application/json"
         }
+    
+    async def generate_with_context(
+        self, 
+        question: str, 
+        chunks: List[Chunk]
+    ) -> str:
+        """
+        Generate answer using RAG context
+        
+        Raises GeneratorError on API or connection failure, so error texts
+        are never returned (and cached) as answers.
+        """
+        
+        if not self.api_key or not self.folder_id:
+            raise GeneratorError("YandexGPT не настроен. Установите YANDEX_API_KEY и YANDEX_FOLDER_ID.")
+        
+        with stage("prompt"):
+            payload = self._build_payload(question, chunks)
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
+            with stage("generation"):
+                response = await self.http.client.post(
                     self.endpoint,
                     json=payload,
-                    headers=headers
+                    headers=self._headers()
                 )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["result"]["alternatives"][0]["message"]["text"]
-                else:
-                    return f"Ошибка YandexGPT API: {response.status_code}"
         except Exception as e:
-            return f"Ошибка подключения к YandexGPT: {str(e)}"
+            raise GeneratorError(f"Ошибка подключения к YandexGPT: {str(e)}")
+        
+        if response.status_code != 200:
+            raise GeneratorError(f"Ошибка YandexGPT API: {response.status_code}")
+        result = response.json()
+        return result["result"]["alternatives"][0]["message"]["text"]
+    
+    async def stream_with_context(
+        self,
+        question: str,
+        chunks: List[Chunk]
+    ) -> AsyncIterator[str]:
+        """
+        Stream answer using RAG context
+        
+        Yields text deltas. The streaming API sends one JSON object per line
+        with the cumulative text so far; only the new suffix is yielded.
+        Raises GeneratorError on API or connection failure.
+        """
+        if not self.api_key or not self.folder_id:
+            raise GeneratorError("YandexGPT не настроен. Установите YANDEX_API_KEY и YANDEX_FOLDER_ID.")
+        
+        with stage("prompt"):
+            payload = self._build_payload(question, chunks, stream=True)
+        sent = 0
+        
+        try:
+            with stage("generation"):
+                async with self.http.client.stream(
+                    "POST",
+                    self.endpoint,
+                    json=payload,
+                    headers=self._headers()
+                ) as response:
+                    if response.status_code != 200:
+                        raise GeneratorError(f"Ошибка YandexGPT API: {response.status_code}")
+                    
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        result = json.loads(line)
+                        text = result["result"]["alternatives"][0]["message"]["text"]
+                        if len(text) > sent:
+                            yield text[sent:]
+                            sent = len(text)
+        except GeneratorError:
+            raise
+        except Exception as e:
+            raise GeneratorError(f"Ошибка подключения к YandexGPT: {str(e)}")
     
     def _build_rag_prompt(self, question: str, chunks: List[Chunk]) -> str:
         """Build RAG prompt with context chunks"""
@@ -105,12 +163,9 @@ class GeneratorService:
         return prompt
     
     async def check_health(self) -> bool:
-        """Check if YandexGPT is accessible"""
-        try:
-            result = await self.generate_with_context("test", [])
-            return "Ошибка" not in result
-        except:
-            return False
+        """Check if YandexGPT is accessible (tokenizer call, not billed)"""
+        from app.services.yandex_service import yandex_service
+        return await yandex_service.check_health()
 
 generator_service = GeneratorService()
 
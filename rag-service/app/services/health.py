@@ -0,0 +1,111 @@
+"""
+Background dependency health checks
+
+Dependencies are probed every HEALTH_CHECK_INTERVAL seconds with cheap
+calls and the results are cached with timestamps, so health endpoints
+answer from memory however often load balancers poll them.
+"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+
+# Probe: True (ok), False (error) or None (not configured); may raise
+Probe = Callable[[], Awaitable[Optional[bool]]]
+
+class HealthMonitor:
+    """
+    Cached results of periodically run dependency probes
+    
+    Required probes decide readiness: the service is ready once each of
+    them has succeeded within HEALTH_STALE_AFTER seconds. The others only
+    show up in the health report.
+    """
+    
+    def __init__(self, interval: float = None, timeout: float = None, stale_after: float = None):
+        self.interval = interval or settings.HEALTH_CHECK_INTERVAL
+        self.timeout = timeout or settings.HEALTH_CHECK_TIMEOUT
+        self.stale_after = stale_after or settings.HEALTH_STALE_AFTER
+        self._probes: Dict[str, Tuple[Probe, bool]] = {}
+        self._results: Dict[str, Dict] = {}
+        self._checked: Dict[str, float] = {}  # name -> monotonic time of last check
+        self._task = None
+    
+    def register(self, name: str, probe: Probe, required: bool = False):
+        self._probes[name] = (probe, required)
+    
+    async def check(self, name: str) -> Dict:
+        """Run one probe now and cache its result"""
+        probe, _ = self._probes[name]
+        start_time = time.perf_counter()
+        error = None
+        try:
+            ok = await asyncio.wait_for(probe(), self.timeout)
+        except asyncio.TimeoutError:
+            ok, error = False, f"timeout after {self.timeout}s"
+        except Exception as e:
+            ok, error = False, str(e)
+        
+        if ok is None:
+            status = "not_configured"
+        else:
+            status = "ok" if ok else "error"
+        self._results[name] = {
+            "status": status,
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "latency_ms": round((time.perf_counter() - start_time) * 1000, 1),
+            "error": error
+        }
+        self._checked[name] = time.monotonic()
+        return self._results[name]
+    
+    async def check_all(self):
+        """Run all probes concurrently"""
+        await asyncio.gather(*(self.check(name) for name in self._probes))
+    
+    async def _run(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.interval)
+    
+    async def start(self):
+        """Start probing on the running loop (first round right away)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+    
+    def _status(self, name: str) -> str:
+        if name not in self._results:
+            return "unknown"
+        if time.monotonic() - self._checked[name] > self.stale_after:
+            return "stale"
+        return self._results[name]["status"]
+    
+    def services(self) -> Dict[str, str]:
+        """Status of every probe: ok, error, not_configured, unknown or stale"""
+        return {name: self._status(name) for name in self._probes}
+    
+    def checks(self) -> Dict[str, Dict]:
+        """Last result of every probe with its timestamp and latency"""
+        return {
+            name: {**self._results.get(name, {}), "status": self._status(name), "required": required}
+            for name, (_, required) in self._probes.items()
+        }
+    
+    def not_ready(self) -> List[str]:
+        """Required probes without a fresh success"""
+        return [
+            name for name, (_, required) in self._probes.items()
+            if required and self._status(name) != "ok"
+        ]
+
+health_monitor = HealthMonitor()
@@ -1,69 +1,140 @@
 """
 Document indexing service
 """
+import asyncio
+import hashlib
+import json
 import os
-from typing import List, Dict
+from collections import defaultdict
+from typing import Awaitable, Callable, Iterable, List, Dict, Optional, Tuple, Union
+from app.config import settings
+from app.utils.batcher import MicroBatcher, iterate_in_thread
 from app.utils.parsers import DocumentParser
-from app.utils.chunker import chunker
+from app.utils.chunker import CHUNKER_VERSION, chunker
 from app.services.embedder import embedder_service
-from app.services.qdrant_service import qdrant_service
+from app.services.vector_store import get_vector_store
+from app.utils.cache import cache_service
+from app.utils.semantic_cache import semantic_cache
+
+def content_hash(data: Union[str, bytes]) -> str:
+    """SHA-256 hex digest of text or bytes"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+def document_source(path: str, root: str = None) -> str:
+    """
+    Source name of a course document: its path relative to MATERIALS_ROOT
+    
+    The CLI and the API name a document the same way, so indexing it
+    again from either replaces its points. Paths outside the root keep
+    only the file name.
+    """
+    root = os.path.abspath(root or settings.MATERIALS_ROOT)
+    path = os.path.abspath(path)
+    if os.path.commonpath([root, path]) == root and path != root:
+        return os.path.relpath(path, root).replace(os.sep, "/")
+    return os.path.basename(path)
+
+def embedding_fingerprint() -> str:
+    """Vector space of stored embeddings: model and backend"""
+    return f"{settings.EMBEDDING_MODEL}:{settings.EMBEDDING_BACKEND}"
+
+def _options_hash(metadata: Dict) -> str:
+    options = json.dumps(
+        {
+            "metadata": metadata,
+            "chunk_method": chunker.method,
+            "chunk_size": chunker.chunk_size,
+            "chunk_overlap": chunker.chunk_overlap,
+            "chunk_tokens": chunker.chunk_tokens,
+            "chunk_overlap_tokens": chunker.chunk_overlap_tokens,
+            "chunker_version": CHUNKER_VERSION,
+            "embedding": embedding_fingerprint()
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str
+    )
+    return content_hash(options)[:16]
+
+def document_hash(content: Union[str, bytes], metadata: Dict) -> str:
+    """
+    Fingerprint of a document as indexed
+    
+    Covers everything that changes the stored chunks: the raw content,
+    caller metadata, chunking parameters and the embedding fingerprint.
+    """
+    return content_hash(content) + ":" + _options_hash(metadata)
+
+def file_document_hash(file_path: str, metadata: Dict, block_size: int = 1024 * 1024) -> str:
+    """document_hash of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest() + ":" + _options_hash(metadata)
 
 class IndexerService:
     def __init__(self):
         self.parser = DocumentParser()
         self.chunker = chunker
         self.embedder = embedder_service
-        self.qdrant = qdrant_service
+        self.store = get_vector_store()
     
     async def index_document(
         self,
         file_path: str,
         course_id: int,
-        metadata: Dict = None
+        metadata: Dict = None,
+        progress: Optional[Callable[[Dict], Awaitable]] = None
     ) -> Dict:
         """
         Index a document: parse, chunk, embed, store
+        
+        Re-indexing the same source is incremental: unchanged documents
+        are skipped without parsing, unchanged chunks are not re-embedded
+        and chunks that disappeared from the document are deleted.
+        Markdown and DOCX chunks stay inside one heading section and store
+        its heading path as metadata headings and section.
         """
         if metadata is None:
             metadata = {}
         
-        # 1. Parse document
-        text = self.parser.parse(file_path)
+        filename = metadata.get("filename") or os.path.basename(file_path)
+        source = metadata.get("source") or filename
+        metadata = {**metadata, "source": source}
         
-        if not text.strip():
-            raise ValueError("Document is empty or could not be parsed")
+        doc_hash = await asyncio.to_thread(file_document_hash, file_path, metadata)
         
-        # 2. Chunk text
-        chunks = self.chunker.chunk(text, method="sentences")
+        existing, unchanged = await asyncio.to_thread(self.source_state, course_id, source, doc_hash)
+        if unchanged:
+            return {
+                "filename": filename,
+                "total_characters": None,
+                **self._unchanged_result(course_id, source, len(existing))
+            }
         
-        if not chunks:
-            raise ValueError("No chunks created from document")
+        characters = 0
         
-        # 3. Create embeddings
-        embeddings = self.embedder.embed_batch(chunks)
+        def sections():
+            nonlocal characters
+            for headings, page, text in self.parser.iter_clean_sections(file_path):
+                characters += len(text)
+                yield headings, page, text
         
-        # 4. Store in Qdrant
-        filename = os.path.basename(file_path)
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_metadata = {
-                **metadata,
-                "filename": filename,
-                "chunk_index": i,
-                "total_chunks": len(chunks)
-            }
-            
-            self.qdrant.insert(
-                vector=embedding,
-                course_id=course_id,
-                content=chunk,
-                metadata=chunk_metadata
-            )
+        # Parse, clean and chunk lazily: embedding and upserts of the first
+        # chunks run while later pages are still being parsed
+        result = await self.index_chunks(
+            self.chunker.iter_section_chunks(sections()), course_id, source, doc_hash,
+            {**metadata, "filename": filename}, existing,
+            progress=progress
+        )
         
         return {
             "filename": filename,
-            "chunks_created": len(chunks),
-            "total_characters": len(text),
-            "course_id": course_id
+            "total_characters": characters,
+            **result
         }
     
     async def index_text(
@@ -74,39 +145,194 @@ class IndexerService:
     ) -> Dict:
         """
         Index raw text directly
+        
+        Texts with the same metadata source are re-indexed incrementally
+        like documents.
         """
         if metadata is None:
             metadata = {}
         
+        source = metadata.get("source") or "direct_input"
+        metadata = {**metadata, "source": source}
+        
         # 1. Clean text
         text = DocumentParser.clean_text(text)
         
-        # 2. Chunk
-        chunks = self.chunker.chunk(text, method="sentences")
+        # 2-4. Chunk, embed new chunks and sync Qdrant
+        result = await self.index_chunks(
+            self.chunker.iter_chunks([(None, text)]),
+            course_id, source, document_hash(text, metadata), metadata
+        )
+        
+        return {
+            "total_characters": len(text),
+            **result
+        }
+    
+    def source_state(self, course_id: int, source: str, doc_hash: str) -> Tuple[Dict[str, dict], bool]:
+        """Stored points of a source and whether they are all from doc_hash"""
+        existing = self.store.get_source_points(course_id, source)
+        unchanged = bool(existing) and all(
+            m.get("doc_hash") == doc_hash for m in existing.values()
+        )
+        return existing, unchanged
+    
+    @staticmethod
+    def invalidate_answers(course_id: int):
+        """Drop exact and semantic cached answers of a reindexed course"""
+        cache_service.invalidate_course(course_id)
+        semantic_cache.invalidate_course(course_id)
+    
+    @staticmethod
+    def _unchanged_result(course_id: int, source: str, chunks: int) -> Dict:
+        return {
+            "source": source,
+            "status": "unchanged",
+            "chunks_created": chunks,
+            "chunks_embedded": 0,
+            "chunks_reused": 0,
+            "chunks_deleted": 0,
+            "course_id": course_id,
+            "upsert_batches": 0,
+            "upsert_time_ms": 0
+        }
+    
+    async def index_chunks(
+        self,
+        chunks: Iterable[Union[str, Dict]],
+        course_id: int,
+        source: str,
+        doc_hash: str,
+        metadata: Dict,
+        existing: Optional[Dict[str, dict]] = None,
+        batcher: Optional[MicroBatcher] = None,
+        progress: Optional[Callable[[Dict], Awaitable]] = None
+    ) -> Dict:
+        """
+        Make the stored points of a source match chunks
+        
+        Shared by API and bulk indexing. chunks are texts or chunk dicts
+        (iter_chunks, iter_section_chunks) and may be a lazy generator: it
+        is consumed in a worker thread in batches of
+        QDRANT_UPSERT_BATCH_SIZE, and each batch is
+        embedded and upserted while the next one is produced. existing is
+        the result of get_source_points if the caller already has it. With
+        batcher, embeddings go through it so concurrently indexed
+        documents share model batches. progress is awaited after each
+        batch with chunks, embedded and reused counts so far.
         
-        # 3. Embed
-        embeddings = self.embedder.embed_batch(chunks)
+        Point IDs derive from (course_id, source, chunk hash), so a chunk
+        that is already stored keeps its ID: its vector is reused when only
+        the metadata changed and nothing is written when it is identical.
+        Vectors are reused only if they were made with the current
+        embedding model and backend; other chunks are embedded. Stored
+        points that no longer match any chunk are deleted after all upserts.
+        """
+        if existing is None:
+            existing = await asyncio.to_thread(self.store.get_source_points, course_id, source)
+        fingerprint = embedding_fingerprint()
         
-        # 4. Store
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_metadata = {
-                **metadata,
-                "chunk_index": i,
-                "total_chunks": len(chunks)
-            }
+        occurrences = defaultdict(int)
+        seen_ids = set()
+        chunk_index = 0
+        embedded = 0
+        reused = 0
+        upsert_batches = 0
+        upsert_time_ms = 0
+        
+        async for batch in iterate_in_thread(chunks, settings.QDRANT_UPSERT_BATCH_SIZE):
+            planned = []
+            for chunk in batch:
+                if isinstance(chunk, str):
+                    chunk = {"text": chunk}
+                chunk_hash = content_hash(chunk["text"])
+                point_id = self.store.point_id(course_id, source, chunk_hash, occurrences[chunk_hash])
+                occurrences[chunk_hash] += 1
+                seen_ids.add(point_id)
+                
+                chunk_metadata = {
+                    **metadata,
+                    "chunk_index": chunk_index,
+                    "chunk_hash": chunk_hash,
+                    "doc_hash": doc_hash,
+                    "embedding": fingerprint
+                }
+                if chunk.get("page_start") is not None:
+                    chunk_metadata["page"] = chunk["page_start"]
+                    chunk_metadata["page_end"] = chunk["page_end"]
+                if chunk.get("start") is not None:
+                    chunk_metadata["char_start"] = chunk["start"]
+                    chunk_metadata["char_end"] = chunk["end"]
+                if chunk.get("headings"):
+                    chunk_metadata["headings"] = chunk["headings"]
+                    chunk_metadata["section"] = " > ".join(chunk["headings"])
+                chunk_index += 1
+                
+                planned.append({
+                    "id": point_id,
+                    "course_id": course_id,
+                    "content": chunk["text"],
+                    "metadata": chunk_metadata
+                })
+            
+            # Stored vectors from another model or backend are not reusable
+            new_items = [
+                item for item in planned
+                if item["id"] not in existing or existing[item["id"]].get("embedding") != fingerprint
+            ]
+            changed_items = [
+                item for item in planned
+                if item["id"] in existing
+                and existing[item["id"]].get("embedding") == fingerprint
+                and existing[item["id"]] != item["metadata"]
+            ]
             
-            self.qdrant.insert(
-                vector=embedding,
-                course_id=course_id,
-                content=chunk,
-                metadata=chunk_metadata
-            )
+            if new_items:
+                texts = [item["content"] for item in new_items]
+                if batcher is not None:
+                    embeddings = await asyncio.gather(*(batcher.submit(text) for text in texts))
+                else:
+                    embeddings = await asyncio.to_thread(self.embedder.embed_batch, texts)
+                for item, embedding in zip(new_items, embeddings):
+                    item["vector"] = embedding
+            
+            if changed_items:
+                stored_vectors = await asyncio.to_thread(
+                    self.store.get_vectors, [item["id"] for item in changed_items]
+                )
+                for item in changed_items:
+                    item["vector"] = stored_vectors[item["id"]]
+            
+            if new_items or changed_items:
+                upsert_stats = await asyncio.to_thread(self.store.insert_many, new_items + changed_items)
+                upsert_batches += upsert_stats["batches"]
+                upsert_time_ms += upsert_stats["total_time_ms"]
+            embedded += len(new_items)
+            reused += len(changed_items)
+            if progress is not None:
+                await progress({"chunks": chunk_index, "embedded": embedded, "reused": reused})
+        
+        if chunk_index == 0:
+            raise ValueError("No chunks created from document")
+        
+        # Delete after upserts so the source never disappears from search
+        orphan_ids = [point_id for point_id in existing if point_id not in seen_ids]
+        await asyncio.to_thread(self.store.delete_points, orphan_ids)
+        
+        changed = bool(embedded or reused or orphan_ids)
+        if changed:
+            await asyncio.to_thread(self.invalidate_answers, course_id)
         
         return {
-            "chunks_created": len(chunks),
-            "total_characters": len(text),
-            "course_id": course_id
+            "source": source,
+            "status": "updated" if existing and changed else ("created" if changed else "unchanged"),
+            "chunks_created": chunk_index,
+            "chunks_embedded": embedded,
+            "chunks_reused": reused,
+            "chunks_deleted": len(orphan_ids),
+            "course_id": course_id,
+            "upsert_batches": upsert_batches,
+            "upsert_time_ms": upsert_time_ms
         }
 
 indexer_service = IndexerService()
-
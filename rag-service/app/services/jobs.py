@@ -0,0 +1,462 @@
+"""
+Background indexing jobs
+
+Uploads are written to UPLOAD_DIR and indexed by a fixed number of worker
+tasks, so a large document never runs inside the request handler. Job
+state lives in a queue backend: "local" keeps everything in process
+(single API process and tests), "redis" shares the queue and job state
+between API processes (UPLOAD_DIR must then be on shared storage).
+
+With the redis backend, indexing can move off the API processes: set
+INDEX_JOB_WORKERS=0 for the API and run separate worker processes with
+python -m app.services.jobs [--concurrency N]. Parsing and embedding then
+no longer compete with /ask for CPU.
+
+A redis worker moves the job id it takes into a processing list and keeps
+a lease on it while the job runs. If the worker dies, the lease expires
+after INDEX_JOB_LEASE seconds and the next idle worker puts the job back
+on the queue.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+from redis.asyncio import ConnectionPool, Redis
+from app.config import settings
+
+# Check room and enqueue in one atomic step, so concurrent uploads from
+# several API processes cannot overfill the queue
+ENQUEUE_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('LPUSH', KEYS[1], ARGV[4])
+return 1
+"""
+
+# Requeue processing jobs whose lease expired. A job without a lease (its
+# worker died right after taking it) gets one, so it is requeued one lease
+# later at the latest.
+REQUEUE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local requeued = 0
+for _, job_id in ipairs(redis.call('LRANGE', KEYS[1], 0, -1)) do
+    local deadline = redis.call('ZSCORE', KEYS[3], job_id)
+    if not deadline then
+        redis.call('ZADD', KEYS[3], now + tonumber(ARGV[2]), job_id)
+    elseif tonumber(deadline) < now then
+        redis.call('LREM', KEYS[1], 1, job_id)
+        redis.call('ZREM', KEYS[3], job_id)
+        redis.call('RPUSH', KEYS[2], job_id)
+        requeued = requeued + 1
+    end
+end
+return requeued
+"""
+
+class JobQueueFull(Exception):
+    """Raised when the indexing queue has no room for another job"""
+
+class IndexJob:
+    """
+    One document indexing job
+    
+    status: queued -> running -> done | failed
+    timings_ms: upload, queued (waiting for a worker), indexing, total
+    progress: chunks processed so far while running
+    """
+    
+    def __init__(
+        self,
+        course_id: int,
+        file_path: str,
+        filename: str,
+        metadata: Dict,
+        job_id: str = None
+    ):
+        self.id = job_id or uuid.uuid4().hex
+        self.course_id = course_id
+        self.file_path = file_path
+        self.filename = filename
+        self.metadata = metadata
+        self.status = "queued"
+        self.progress = {"bytes": 0, "chunks": 0, "chunks_embedded": 0}
+        self.timings_ms = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+    
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "course_id": self.course_id,
+            "file_path": self.file_path,
+            "filename": self.filename,
+            "metadata": self.metadata,
+            "status": self.status,
+            "progress": self.progress,
+            "timings_ms": self.timings_ms,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "IndexJob":
+        job = cls(
+            course_id=data["course_id"],
+            file_path=data["file_path"],
+            filename=data["filename"],
+            metadata=data["metadata"],
+            job_id=data["job_id"]
+        )
+        for key in ("status", "progress", "timings_ms", "result", "error", "created_at", "started_at", "finished_at"):
+            setattr(job, key, data[key])
+        return job
+    
+    def public_dict(self) -> Dict:
+        """Job state for the status API (without server paths)"""
+        data = self.to_dict()
+        del data["file_path"]
+        return data
+
+class LocalJobQueue:
+    """In-process queue and job store"""
+    
+    def __init__(self, max_size: int = None, ttl: int = None):
+        self.max_size = max_size or settings.INDEX_JOB_QUEUE_SIZE
+        self.ttl = ttl or settings.INDEX_JOB_TTL
+        self._queue = None
+        self._jobs: Dict[str, IndexJob] = {}
+    
+    def _ensure_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+        return self._queue
+    
+    async def put(self, job: IndexJob):
+        self._prune()
+        try:
+            self._ensure_queue().put_nowait(job.id)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"Indexing queue is full ({self.max_size} jobs)")
+        self._jobs[job.id] = job
+    
+    async def get(self) -> IndexJob:
+        job_id = await self._ensure_queue().get()
+        return self._jobs[job_id]
+    
+    async def save(self, job: IndexJob):
+        self._jobs[job.id] = job
+    
+    async def load(self, job_id: str) -> Optional[IndexJob]:
+        return self._jobs.get(job_id)
+    
+    async def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    async def extend(self, job: IndexJob):
+        pass
+    
+    async def ack(self, job: IndexJob):
+        pass
+    
+    def drain(self) -> List[IndexJob]:
+        """Remove and return jobs still waiting; nothing else would run them"""
+        jobs = []
+        while self._queue is not None and not self._queue.empty():
+            jobs.append(self._jobs[self._queue.get_nowait()])
+        return jobs
+    
+    def _prune(self):
+        """Forget finished jobs older than ttl"""
+        cutoff = time.time() - self.ttl
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]:
+            del self._jobs[job_id]
+    
+    async def close(self):
+        pass
+
+class RedisJobQueue:
+    """
+    Redis list as queue, job state as JSON strings with ttl
+    
+    get() moves a job id from the queue to the processing list with BLMOVE
+    and leases it for `lease` seconds (a deadline in a sorted set); the
+    worker extends the lease while the job runs and acks it when done.
+    """
+    
+    QUEUE_KEY = "index_jobs:queue"
+    PROCESSING_KEY = "index_jobs:processing"
+    LEASES_KEY = "index_jobs:leases"
+    
+    def __init__(self, max_size: int = None, ttl: int = None, lease: int = None):
+        self.max_size = max_size or settings.INDEX_JOB_QUEUE_SIZE
+        self.ttl = ttl or settings.INDEX_JOB_TTL
+        self.lease = lease or settings.INDEX_JOB_LEASE
+        self.pool = ConnectionPool(
+            host=getattr(settings, 'REDIS_HOST', 'localhost'),
+            port=getattr(settings, 'REDIS_PORT', 6379),
+            db=2,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=True
+        )
+        self.redis = Redis(connection_pool=self.pool)
+        self.enqueue_script = self.redis.register_script(ENQUEUE_SCRIPT)
+        self.requeue_script = self.redis.register_script(REQUEUE_SCRIPT)
+    
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"index_jobs:job:{job_id}"
+    
+    async def put(self, job: IndexJob):
+        queued = await self.enqueue_script(
+            keys=[self.QUEUE_KEY, self._job_key(job.id)],
+            args=[self.max_size, json.dumps(job.to_dict(), ensure_ascii=False), self.ttl, job.id]
+        )
+        if not queued:
+            raise JobQueueFull(f"Indexing queue is full ({self.max_size} jobs)")
+    
+    async def get(self) -> IndexJob:
+        while True:
+            await self.requeue_stale()
+            job_id = await self.redis.blmove(self.QUEUE_KEY, self.PROCESSING_KEY, 5, "RIGHT", "LEFT")
+            if job_id is None:
+                continue
+            job = await self.load(job_id)
+            if job is not None:
+                await self.redis.zadd(self.LEASES_KEY, {job_id: time.time() + self.lease})
+                return job
+            # State expired: nothing left to run
+            await self.redis.lrem(self.PROCESSING_KEY, 1, job_id)
+    
+    async def requeue_stale(self) -> int:
+        """Put jobs of dead workers back on the queue; returns how many"""
+        return await self.requeue_script(
+            keys=[self.PROCESSING_KEY, self.QUEUE_KEY, self.LEASES_KEY],
+            args=[time.time(), self.lease]
+        )
+    
+    async def extend(self, job: IndexJob):
+        """Push the lease of a running job forward"""
+        await self.redis.zadd(self.LEASES_KEY, {job.id: time.time() + self.lease}, xx=True)
+    
+    async def ack(self, job: IndexJob):
+        """Job finished (done or failed): stop tracking it"""
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.lrem(self.PROCESSING_KEY, 1, job.id)
+        pipe.zrem(self.LEASES_KEY, job.id)
+        await pipe.execute()
+    
+    async def save(self, job: IndexJob):
+        await self.redis.set(self._job_key(job.id), json.dumps(job.to_dict(), ensure_ascii=False), ex=self.ttl)
+    
+    async def load(self, job_id: str) -> Optional[IndexJob]:
+        data = await self.redis.get(self._job_key(job_id))
+        return IndexJob.from_dict(json.loads(data)) if data else None
+    
+    async def depth(self) -> int:
+        return await self.redis.llen(self.QUEUE_KEY)
+    
+    def drain(self) -> List[IndexJob]:
+        """Queued jobs stay in Redis for other workers"""
+        return []
+    
+    async def close(self):
+        await self.pool.disconnect()
+
+def get_job_queue(backend: str = None):
+    backend = backend or settings.INDEX_JOB_BACKEND
+    if backend == "local":
+        return LocalJobQueue()
+    elif backend == "redis":
+        return RedisJobQueue()
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+async def _index_document(job: IndexJob, progress: Callable[[Dict], Awaitable]) -> Dict:
+    # Imported here so the job module does not load the embedding model
+    from app.services.indexer import indexer_service
+    return await indexer_service.index_document(
+        file_path=job.file_path,
+        course_id=job.course_id,
+        metadata={**job.metadata, "filename": job.filename},
+        progress=progress
+    )
+
+class IndexJobService:
+    """
+    Queues indexing jobs and runs them on a bounded number of workers
+    
+    At most `workers` documents are indexed at once; further jobs wait in
+    the queue. Parsing, embedding and Qdrant writes inside a job run in
+    worker threads, so the event loop keeps serving requests.
+    """
+    
+    def __init__(
+        self,
+        index_fn: Callable[[IndexJob, Callable[[Dict], Awaitable]], Awaitable[Dict]] = _index_document,
+        queue=None,
+        workers: int = None
+    ):
+        self.index_fn = index_fn
+        self.queue = queue
+        self.workers = settings.INDEX_JOB_WORKERS if workers is None else workers
+        self._tasks = []
+        self._running: Dict[str, IndexJob] = {}
+    
+    async def start(self):
+        """Start worker tasks on the running loop"""
+        if self.queue is None:
+            self.queue = get_job_queue()
+        if self.workers == 0 and isinstance(self.queue, LocalJobQueue):
+            print("⚠️  INDEX_JOB_WORKERS=0 with the local job backend: uploaded files will never be indexed")
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    async def stop(self):
+        """Stop workers; running jobs and jobs left in a local queue are marked failed"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self.queue is None:
+            return
+        for job in self.queue.drain():
+            job.status = "failed"
+            job.error = "Interrupted by shutdown"
+            job.finished_at = time.time()
+            if os.path.exists(job.file_path):
+                os.unlink(job.file_path)
+            await self.queue.save(job)
+        await self.queue.close()
+    
+    def create_job(self, course_id: int, filename: str, metadata: Dict) -> IndexJob:
+        """New job with an upload path in UPLOAD_DIR"""
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        file_ext = os.path.splitext(filename)[1].lower()
+        return IndexJob(
+            course_id=course_id,
+            file_path=os.path.join(settings.UPLOAD_DIR, f"{job_id}{file_ext}"),
+            filename=filename,
+            metadata=metadata,
+            job_id=job_id
+        )
+    
+    async def enqueue(self, job: IndexJob) -> IndexJob:
+        """Queue job; raises JobQueueFull when the queue has no room"""
+        job.status = "queued"
+        job.created_at = time.time()
+        await self.queue.put(job)
+        return job
+    
+    async def get(self, job_id: str) -> Optional[IndexJob]:
+        return self._running.get(job_id) or await self.queue.load(job_id)
+    
+    async def stats(self) -> Dict:
+        return {
+            "backend": type(self.queue).__name__ if self.queue else None,
+            "workers": self.workers,
+            "running": len(self._running),
+            "queue_depth": await self.queue.depth() if self.queue else 0
+        }
+    
+    async def _worker(self):
+        while True:
+            try:
+                job = await self.queue.get()
+            except Exception as e:
+                # Keep the worker alive through Redis restarts
+                print(f"Index job queue error: {e}")
+                await asyncio.sleep(1)
+                continue
+            await self._run(job)
+    
+    async def _heartbeat(self, job: IndexJob):
+        """Keep the job's lease while it runs"""
+        while True:
+            await asyncio.sleep(settings.INDEX_JOB_LEASE / 3)
+            try:
+                await self.queue.extend(job)
+            except Exception as e:
+                print(f"Index job heartbeat error: {e}")
+    
+    async def _run(self, job: IndexJob):
+        job.status = "running"
+        job.started_at = time.time()
+        job.timings_ms["queued"] = int((job.started_at - job.created_at) * 1000)
+        self._running[job.id] = job
+        await self.queue.save(job)
+        
+        async def progress(state: Dict):
+            job.progress["chunks"] = state["chunks"]
+            job.progress["chunks_embedded"] = state["embedded"]
+            await self.queue.save(job)
+        
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            job.result = await self.index_fn(job, progress)
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Interrupted by shutdown"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            heartbeat.cancel()
+            job.finished_at = time.time()
+            job.timings_ms["indexing"] = int((job.finished_at - job.started_at) * 1000)
+            job.timings_ms["total"] = sum(
+                job.timings_ms.get(stage, 0) for stage in ("upload", "queued", "indexing")
+            )
+            self._running.pop(job.id, None)
+            if os.path.exists(job.file_path):
+                os.unlink(job.file_path)
+            try:
+                await self.queue.save(job)
+                await self.queue.ack(job)
+            except Exception as e:
+                print(f"Index job save error: {e}")
+
+index_job_service = IndexJobService()
+
+async def run_worker(concurrency: int = None):
+    """Run jobs from the Redis queue until SIGINT or SIGTERM"""
+    service = IndexJobService(queue=RedisJobQueue(), workers=concurrency or settings.INDEX_WORKER_CONCURRENCY)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    
+    await service.start()
+    print(f"🛠️  Indexing worker started ({service.workers} concurrent jobs)")
+    await stopping.wait()
+    print("🛑 Stopping indexing worker")
+    await service.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run indexing jobs from the Redis queue")
+    parser.add_argument("--concurrency", type=int, default=None, help="jobs run at once (default: INDEX_WORKER_CONCURRENCY)")
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.concurrency))
+
+if __name__ == "__main__":
+    main()
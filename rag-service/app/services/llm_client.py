@@ -0,0 +1,53 @@
+"""
+Shared HTTP client for upstream LLM calls
+"""
+import httpx
+from app.config import settings
+
+class LLMClient:
+    """
+    App-scoped httpx.AsyncClient
+    
+    Keeps connections to the YandexGPT endpoint alive between requests, so
+    DNS, TCP and TLS setup is paid once per connection instead of per call.
+    Started and closed in the FastAPI lifespan; created lazily on first use
+    elsewhere (CLI, tests).
+    """
+    
+    def __init__(self):
+        self._client = None
+    
+    def _create(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=settings.YANDEX_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.YANDEX_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.YANDEX_MAX_KEEPALIVE,
+                keepalive_expiry=settings.YANDEX_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.YANDEX_CONNECT_TIMEOUT,
+                read=settings.YANDEX_READ_TIMEOUT,
+                write=settings.YANDEX_WRITE_TIMEOUT,
+                pool=settings.YANDEX_POOL_TIMEOUT
+            )
+        )
+    
+    async def start(self):
+        """Open connection pool"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create()
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._create()
+        return self._client
+    
+    async def close(self):
+        """Close connection pool"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+llm_client = LLMClient()
@@ -0,0 +1,582 @@
+"""
+Embedded vector store: brute-force search over memory-mapped files
+
+Each course lives in VECTOR_STORE_PATH/course_<id>/:
+- vectors.bin: unit-length vectors, one row per point (float32 or
+  float16), memory-mapped and grown by doubling
+- points.jsonl: append-only log of upserts {"id", "row", "payload"} and
+  deletes {"id", "deleted": true}, replayed on load and compacted when
+  mostly stale
+- index.json: dimension and dtype
+
+Search scores the course matrix (or only the rows matching the payload
+filter) against the query in one matrix product and selects the top k
+with argpartition. float16 is a storage format: it halves the file and
+its page cache, but searches score a float32 copy of the live rows kept
+in process memory (each row is converted once, when it becomes live),
+because converting float16 on every search is several times slower than
+the search itself. There are no sparse vectors: search_sparse returns no
+results and supports_sparse is false, so retrieval is dense only.
+
+Writers never hold a course lock while writing files: an upsert reserves
+free rows, writes and flushes just those rows, and only then makes the
+points live under the lock, so searches keep running during indexing.
+Updated points move to a fresh row for the same reason.
+
+Several processes may share a store (the API and cli_indexer.py): writes
+to a course take an exclusive fcntl lock on its .lock file and first
+replay what other processes logged, so rows are never handed out twice.
+Readers pick up new log lines (or reload a compacted log) before every
+read, so points written elsewhere are searchable right after their write.
+"""
+import asyncio
+import fcntl
+import json
+import mmap
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from qdrant_client.models import ScoredPoint
+from app.config import settings
+from app.services.qdrant_layout import PAYLOAD_INDEXES
+from app.services.vector_store import AsyncVectorStore, VectorStore
+
+# Payload fields that can be filtered on (course_id is the partition)
+FILTER_FIELDS = [field for field in PAYLOAD_INDEXES if field != "course_id"]
+
+INITIAL_CAPACITY = 1024
+
+# Rewrite the points log when it has this many stale entries more than live points
+COMPACT_MIN_STALE = 1000
+
+def _field_values(payload: dict, field: str) -> list:
+    """Values of a dotted payload field; list fields give every element"""
+    value = payload
+    for key in field.split("."):
+        if not isinstance(value, dict):
+            return []
+        value = value.get(key)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _normalized(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class CourseIndex:
+    """
+    Vectors and payloads of one course
+    
+    lock guards the in-memory state; writes are serialized by the caller
+    and hold file_lock() across processes.
+    """
+    
+    def __init__(self, path: str, dtype: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.vectors_path = os.path.join(path, "vectors.bin")
+        self.log_path = os.path.join(path, "points.jsonl")
+        self.meta_path = os.path.join(path, "index.json")
+        self.lock_path = os.path.join(path, ".lock")
+        self.default_dtype = np.dtype(dtype)
+        self._reset()
+        self.refresh()
+    
+    def _reset(self):
+        self.dtype = self.default_dtype
+        self.dimension = None
+        self.capacity = 0
+        self.vectors = None
+        self.search_vectors = None  # float32 copy of live rows when stored as float16
+        self._mmap = None
+        self.valid = np.zeros(0, dtype=bool)
+        self.ids: List[Optional[str]] = []  # row -> point ID, None for free rows
+        self.payloads: List[Optional[dict]] = []
+        self.rows: Dict[str, int] = {}
+        self.free: List[int] = []
+        self.index = {field: defaultdict(set) for field in FILTER_FIELDS}
+        self.log_entries = 0
+        self.log_inode = None
+        self.log_offset = 0  # bytes of the points log replayed so far
+    
+    @contextmanager
+    def file_lock(self):
+        """Exclusive write access to the course across processes"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _read_meta(self) -> bool:
+        if not os.path.exists(self.meta_path):
+            return False
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dimension = meta["dimension"]
+        self.dtype = np.dtype(meta["dtype"])
+        self._open_vectors()
+        return True
+    
+    def refresh(self):
+        """Replay points log lines written since the last read, by any process"""
+        with self.lock:
+            if self.dimension is None and not self._read_meta():
+                return
+            try:
+                f = open(self.log_path, "rb")
+            except FileNotFoundError:
+                return
+            with f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self.log_inode or stat.st_size < self.log_offset:
+                    if self.log_inode is not None:
+                        # Compacted by another process: replay from the start
+                        self._reset()
+                        self._read_meta()
+                    self.log_inode = stat.st_ino
+                if stat.st_size == self.log_offset:
+                    return
+                f.seek(self.log_offset)
+                data = f.read(stat.st_size - self.log_offset)
+            
+            # Vectors are written before their log lines, possibly past our mapping
+            self._remap()
+            # A line still being appended is read next time
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("deleted"):
+                    self._remove(entry["id"])
+                else:
+                    self._assign(entry["id"], entry["row"], entry["payload"])
+                self.log_entries += 1
+            self.log_offset += end
+            self.free = [row for row, point_id in enumerate(self.ids) if point_id is None]
+    
+    @property
+    def row_bytes(self) -> int:
+        return self.dimension * self.dtype.itemsize
+    
+    def _open_vectors(self):
+        """Map the whole vectors file"""
+        self.capacity = os.path.getsize(self.vectors_path) // self.row_bytes
+        if self.capacity:
+            with open(self.vectors_path, "r+b") as f:
+                self._mmap = mmap.mmap(f.fileno(), self.capacity * self.row_bytes)
+            self.vectors = np.ndarray((self.capacity, self.dimension), dtype=self.dtype, buffer=self._mmap)
+        else:
+            self._mmap = None
+            self.vectors = np.zeros((0, self.dimension), dtype=self.dtype)
+        valid = np.zeros(self.capacity, dtype=bool)
+        valid[:len(self.valid)] = self.valid[:self.capacity]
+        self.valid = valid
+    
+    def _remap(self):
+        """Map the vectors file again if another process grew it"""
+        if os.path.getsize(self.vectors_path) // self.row_bytes > self.capacity:
+            self._open_vectors()
+    
+    def _init_files(self, dimension: int):
+        os.makedirs(self.path, exist_ok=True)
+        self.dimension = dimension
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"dimension": dimension, "dtype": self.dtype.name}, f)
+        open(self.vectors_path, "ab").close()
+        self._open_vectors()
+    
+    def _grow(self, rows: int):
+        if rows <= self.capacity:
+            return
+        capacity = max(rows, self.capacity * 2, INITIAL_CAPACITY)
+        # Rows are flushed when written, the old mapping has nothing dirty
+        os.truncate(self.vectors_path, capacity * self.row_bytes)
+        self._open_vectors()
+    
+    def _assign(self, point_id: str, row: int, payload: dict):
+        if point_id in self.rows and self.rows[point_id] != row:
+            self._remove(point_id)
+        elif point_id in self.rows:
+            self._unindex(row)
+        while len(self.ids) <= row:
+            self.ids.append(None)
+            self.payloads.append(None)
+        self.ids[row] = point_id
+        self.payloads[row] = payload
+        self.rows[point_id] = row
+        self.valid[row] = True
+        if self.dtype != np.float32:
+            self._copy_for_search(row)
+        for field in FILTER_FIELDS:
+            for value in _field_values(payload, field):
+                self.index[field][value].add(row)
+    
+    def _copy_for_search(self, row: int):
+        if self.search_vectors is None or row >= len(self.search_vectors):
+            size = 0 if self.search_vectors is None else len(self.search_vectors)
+            grown = np.zeros((max(row + 1, size * 2, INITIAL_CAPACITY), self.dimension), dtype=np.float32)
+            if size:
+                grown[:size] = self.search_vectors
+            self.search_vectors = grown
+        self.search_vectors[row] = self.vectors[row]
+    
+    def _unindex(self, row: int):
+        for field in FILTER_FIELDS:
+            for value in _field_values(self.payloads[row], field):
+                rows = self.index[field].get(value)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del self.index[field][value]
+    
+    def _remove(self, point_id: str) -> bool:
+        row = self.rows.pop(point_id, None)
+        if row is None:
+            return False
+        self._unindex(row)
+        self.ids[row] = None
+        self.payloads[row] = None
+        self.valid[row] = False
+        self.free.append(row)
+        return True
+    
+    def _append_log(self, entries: List[dict]):
+        """Append entries; the caller holds file_lock() and has refreshed"""
+        with open(self.log_path, "ab") as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode("utf-8"))
+            self.log_inode = os.fstat(f.fileno()).st_ino
+            self.log_offset = f.tell()
+        self.log_entries += len(entries)
+    
+    def compact(self):
+        """Rewrite the points log with live points only, when mostly stale"""
+        with self.lock:
+            if self.log_entries <= 2 * len(self.rows) + COMPACT_MIN_STALE:
+                return
+            entries = [
+                {"id": point_id, "row": row, "payload": self.payloads[row]}
+                for point_id, row in self.rows.items()
+            ]
+        # No writer can interleave, so the snapshot stays current
+        tmp_path = self.log_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for entry in entries:
+                f.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+            log_offset = f.tell()
+            log_inode = os.fstat(f.fileno()).st_ino
+        with self.lock:
+            os.replace(tmp_path, self.log_path)
+            self.log_entries = len(entries)
+            self.log_inode = log_inode
+            self.log_offset = log_offset
+    
+    def reserve(self, count: int, dimension: int) -> List[int]:
+        """Rows for count new point versions; not live until commit()"""
+        with self.lock:
+            self.refresh()
+            if self.dimension is None:
+                self._init_files(dimension)
+            if dimension != self.dimension:
+                raise ValueError(f"Vector dimension {dimension} does not match store dimension {self.dimension}")
+            self._remap()
+            rows = []
+            next_row = len(self.ids)
+            for _ in range(count):
+                if self.free:
+                    rows.append(self.free.pop())
+                else:
+                    rows.append(next_row)
+                    next_row += 1
+            self._grow(next_row)
+            return rows
+    
+    def write_vectors(self, rows: List[int], vectors: np.ndarray):
+        """Write and flush reserved rows; searches skip them meanwhile"""
+        self.vectors[rows] = vectors.astype(self.dtype)
+        row_bytes = self.row_bytes
+        start = min(rows) * row_bytes
+        offset = start - start % mmap.ALLOCATIONGRANULARITY
+        self._mmap.flush(offset, (max(rows) + 1) * row_bytes - offset)
+    
+    def commit(self, rows: List[int], points: List[Tuple[str, dict]]):
+        """Log payloads of written rows and make them live, replacing older versions"""
+        entries = [
+            {"id": point_id, "row": row, "payload": payload}
+            for row, (point_id, payload) in zip(rows, points)
+        ]
+        with self.lock:
+            self._append_log(entries)
+            for row, (point_id, payload) in zip(rows, points):
+                self._assign(point_id, row, payload)
+    
+    def upsert(self, points: List[Tuple[str, dict]], vectors: np.ndarray):
+        """Write vectors first, then log payloads, so a logged point always has its vector"""
+        with self.file_lock():
+            rows = self.reserve(len(points), vectors.shape[1])
+            self.write_vectors(rows, vectors)
+            self.commit(rows, points)
+            self.compact()
+    
+    def delete(self, point_ids: Iterable[str]) -> int:
+        with self.file_lock():
+            with self.lock:
+                self.refresh()
+                removed = [point_id for point_id in point_ids if self._remove(point_id)]
+                if removed:
+                    self._append_log([{"id": point_id, "deleted": True} for point_id in removed])
+            self.compact()
+        return len(removed)
+    
+    def _candidate_rows(self, conditions: Dict[str, object]) -> Optional[np.ndarray]:
+        """Rows matching all conditions, None when unfiltered"""
+        if not conditions:
+            return None
+        rows = None
+        for field, value in conditions.items():
+            matching = self.index[field].get(value, set())
+            rows = set(matching) if rows is None else rows & matching
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+    
+    def search(self, query: np.ndarray, limit: int, conditions: Dict[str, object]) -> List[Tuple[int, float]]:
+        """Top limit (row, score) pairs among live rows matching conditions"""
+        if not self.rows or limit <= 0:
+            return []
+        matrix = self.vectors if self.search_vectors is None else self.search_vectors
+        candidates = self._candidate_rows(conditions)
+        if candidates is None:
+            n = len(self.ids)
+            scores = matrix[:n] @ query
+            if len(self.rows) < n:
+                scores[~self.valid[:n]] = -np.inf
+            rows = None
+        else:
+            if len(candidates) == 0:
+                return []
+            scores = matrix[candidates] @ query
+            rows = candidates
+        
+        k = min(limit, len(self.rows) if rows is None else len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]) if rows is not None else int(i), float(scores[i])) for i in top]
+
+class LocalVectorStore(VectorStore):
+    """VectorStore over per-course CourseIndex directories"""
+    
+    def __init__(self, path: str = None, dtype: str = None):
+        self.path = path or settings.VECTOR_STORE_PATH
+        self.dtype = dtype or settings.VECTOR_STORE_DTYPE
+        self.collection_name = f"local:{self.path}"
+        self._courses: Dict[int, CourseIndex] = {}
+        self._lock = threading.Lock()  # the course dict
+        self._write_lock = threading.Lock()  # one writer at a time
+        os.makedirs(self.path, exist_ok=True)
+        self._all_courses()
+    
+    def _course(self, course_id: int, create: bool = False) -> Optional[CourseIndex]:
+        """Course index, up to date with writes of other processes"""
+        path = os.path.join(self.path, f"course_{course_id}")
+        with self._lock:
+            course = self._courses.get(course_id)
+            if course is None:
+                # Created by another process since we looked
+                if not create and not os.path.isdir(path):
+                    return None
+                course = self._courses[course_id] = CourseIndex(path, self.dtype)
+                return course
+        course.refresh()
+        return course
+    
+    def _all_courses(self) -> List[CourseIndex]:
+        course_ids = [
+            int(name[len("course_"):]) for name in os.listdir(self.path) if name.startswith("course_")
+        ]
+        courses = [self._course(course_id) for course_id in course_ids]
+        return [course for course in courses if course is not None]
+    
+    def search(
+        self,
+        vector: list,
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> List[ScoredPoint]:
+        """Most similar course points (cosine), best first"""
+        conditions = {}
+        if module is not None:
+            conditions["metadata.module"] = module
+        if section:
+            conditions["metadata.headings"] = section
+        query = _normalized(vector)[0]
+        
+        course = self._course(course_id)
+        if course is None:
+            return []
+        with course.lock:
+            return [
+                ScoredPoint(id=course.ids[row], version=0, score=score, payload=course.payloads[row])
+                for row, score in course.search(query, limit, conditions)
+            ]
+    
+    def insert_many(self, items: List[Dict], batch_size: int = None, parallel: int = None, wait: bool = None) -> Dict:
+        """Upsert points; one write per course, always durable on return"""
+        start_time = time.time()
+        by_course = defaultdict(list)
+        for item in items:
+            by_course[item["course_id"]].append(item)
+        
+        batch_timings_ms = []
+        with self._write_lock:
+            for course_id, course_items in by_course.items():
+                batch_start = time.time()
+                points = [
+                    (
+                        item.get("id") or str(uuid.uuid4()),
+                        {"course_id": course_id, "content": item["content"], "metadata": item["metadata"]}
+                    )
+                    for item in course_items
+                ]
+                vectors = _normalized([item["vector"] for item in course_items])
+                self._course(course_id, create=True).upsert(points, vectors)
+                batch_timings_ms.append(int((time.time() - batch_start) * 1000))
+        
+        return {
+            "points": len(items),
+            "batches": len(batch_timings_ms),
+            "batch_timings_ms": batch_timings_ms,
+            "total_time_ms": int((time.time() - start_time) * 1000)
+        }
+    
+    def get_source_points(self, course_id: int, source: str, page_size: int = None) -> Dict[str, dict]:
+        """All points of one source document: {point_id: metadata}"""
+        course = self._course(course_id)
+        if course is None:
+            return {}
+        with course.lock:
+            return {
+                course.ids[row]: course.payloads[row].get("metadata", {})
+                for row in course.index["metadata.source"].get(source, ())
+            }
+    
+    def get_vectors(self, point_ids: List[str]) -> Dict[str, list]:
+        """Stored (unit-length) vectors by point ID"""
+        vectors = {}
+        for course in self._all_courses():
+            with course.lock:
+                for point_id in point_ids:
+                    row = course.rows.get(point_id)
+                    if row is not None:
+                        vectors[point_id] = course.vectors[row].astype(np.float32).tolist()
+        return vectors
+    
+    def delete_points(self, point_ids: List[str]):
+        """Delete points by ID"""
+        if not point_ids:
+            return
+        with self._write_lock:
+            for course in self._all_courses():
+                course.delete(point_ids)
+    
+    def count(self, course_id: int) -> int:
+        course = self._course(course_id)
+        if course is None:
+            return 0
+        with course.lock:
+            return len(course.rows)
+    
+    def source_stats(self, course_id: int) -> Dict[str, int]:
+        course = self._course(course_id)
+        if course is None:
+            return {}
+        with course.lock:
+            return {source: len(rows) for source, rows in course.index["metadata.source"].items()}
+    
+    def check_health(self) -> bool:
+        return os.path.isdir(self.path)
+    
+    def flush(self):
+        for course in self._all_courses():
+            with course.lock:
+                if course._mmap is not None:
+                    course._mmap.flush()
+
+class AsyncLocalVectorStore(AsyncVectorStore):
+    """
+    AsyncVectorStore over a LocalVectorStore
+    
+    Calls run in a thread: they wait for the course lock, which an
+    indexing job in this process may hold between its writes.
+    """
+    
+    def __init__(self, store: LocalVectorStore):
+        self.store = store
+        self.collection_name = store.collection_name
+    
+    async def search(
+        self,
+        vector: list,
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> List[ScoredPoint]:
+        return await asyncio.to_thread(self.store.search, vector, course_id, limit, module, section)
+    
+    async def search_sparse(
+        self,
+        indices: List[int],
+        values: List[float],
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> list:
+        return []
+    
+    async def score_points(self, vector: list, course_id: int, point_ids: List[str]) -> Dict[str, float]:
+        vectors = await asyncio.to_thread(self.store.get_vectors, point_ids)
+        if not vectors:
+            return {}
+        ids = list(vectors)
+        scores = _normalized([vectors[i] for i in ids]) @ _normalized(vector)[0]
+        return {point_id: float(score) for point_id, score in zip(ids, scores)}
+    
+    async def supports_sparse(self) -> bool:
+        return False
+    
+    async def count(self, course_id: int) -> int:
+        return await asyncio.to_thread(self.store.count, course_id)
+    
+    async def source_stats(self, course_id: int) -> Dict[str, int]:
+        return await asyncio.to_thread(self.store.source_stats, course_id)
+    
+    async def check_health(self) -> bool:
+        return self.store.check_health()
+    
+    async def close(self):
+        self.store.flush()
+
+@lru_cache(maxsize=1)
+def get_local_store() -> LocalVectorStore:
+    """Process-wide LocalVectorStore at VECTOR_STORE_PATH"""
+    return LocalVectorStore()
+
+@lru_cache(maxsize=1)
+def get_async_local_store() -> AsyncLocalVectorStore:
+    return AsyncLocalVectorStore(get_local_store())
@@ -0,0 +1,108 @@
+"""
+Qdrant collection layout: payload indexes, HNSW, quantization, search params
+"""
+from typing import Optional
+from qdrant_client.models import (
+    BinaryQuantization, BinaryQuantizationConfig, FieldCondition, Filter, HnswConfigDiff, MatchValue,
+    PayloadSchemaType, QuantizationSearchParams, ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    SearchParams
+)
+from app.config import settings
+
+# Payload fields used in search filters
+PAYLOAD_INDEXES = {
+    "course_id": PayloadSchemaType.INTEGER,
+    "metadata.module": PayloadSchemaType.INTEGER,
+    "metadata.source": PayloadSchemaType.KEYWORD,
+    "metadata.headings": PayloadSchemaType.KEYWORD
+}
+
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+
+def course_filter(course_id: int, module: Optional[int] = None, section: Optional[str] = None) -> Filter:
+    """
+    Course filter, optionally narrowed to a module and a section
+    
+    section matches any heading on a chunk's heading path, so a
+    chapter heading also selects its subsections. All conditions use
+    payload indexes.
+    """
+    must = [FieldCondition(key="course_id", match=MatchValue(value=course_id))]
+    if module is not None:
+        must.append(FieldCondition(key="metadata.module", match=MatchValue(value=module)))
+    if section:
+        must.append(FieldCondition(key="metadata.headings", match=MatchValue(value=section)))
+    return Filter(must=must)
+
+def hnsw_config(tenancy_mode: str = None) -> HnswConfigDiff:
+    """
+    HNSW settings for tenancy mode
+    
+    shared: one global graph over all courses (default Qdrant layout).
+    tenant: m=0 disables the global graph and payload_m builds a graph
+    per course_id value, so every course-filtered search walks only
+    its own course's graph.
+    """
+    tenancy_mode = tenancy_mode or settings.QDRANT_TENANCY_MODE
+    if tenancy_mode == "tenant":
+        return HnswConfigDiff(
+            m=0,
+            payload_m=settings.QDRANT_HNSW_PAYLOAD_M,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT
+        )
+    elif tenancy_mode == "shared":
+        return HnswConfigDiff(
+            m=settings.QDRANT_HNSW_M,
+            payload_m=0,
+            ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT
+        )
+    else:
+        raise ValueError(f"Unknown tenancy mode: {tenancy_mode}")
+
+def quantization_config(mode: str = None):
+    """
+    Quantization settings for mode
+    
+    scalar: int8 per dimension, 4x less memory, small recall loss.
+    binary: 1 bit per dimension, 32x less memory, needs oversampling
+    and rescoring to keep recall.
+    """
+    mode = mode or settings.QDRANT_QUANTIZATION
+    if mode == "none":
+        return None
+    elif mode == "scalar":
+        return ScalarQuantization(
+            scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=settings.QDRANT_SCALAR_QUANTILE,
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+    elif mode == "binary":
+        return BinaryQuantization(
+            binary=BinaryQuantizationConfig(
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM
+            )
+        )
+    else:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+def search_params(
+    mode: str = None,
+    oversampling: float = None,
+    rescore: bool = None
+) -> Optional[SearchParams]:
+    """
+    Search params: query quantized vectors for oversampling * limit
+    candidates, then rescore them with the original vectors
+    """
+    mode = mode or settings.QDRANT_QUANTIZATION
+    if mode == "none":
+        return None
+    return SearchParams(
+        quantization=QuantizationSearchParams(
+            ignore=False,
+            rescore=settings.QDRANT_SEARCH_RESCORE if rescore is None else rescore,
+            oversampling=oversampling or settings.QDRANT_SEARCH_OVERSAMPLING
+        )
+    )
@@ -2,41 +2,301 @@
 Qdrant service for vector operations
 """
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import (
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, Disabled, Distance,
+    FieldCondition, Filter, MatchValue, PointIdsList, VectorParams, VectorParamsDiff,
+    PointStruct, PointVectors, SparseVector, SparseVectorParams
+)
 from app.config import settings
+from app.services.qdrant_layout import PAYLOAD_INDEXES, course_filter, hnsw_config, quantization_config, search_params
+from app.services.vector_store import VectorStore
+from app.utils.course_sources import course_sources
+from app.utils.sparse import SPARSE_VECTOR_NAME, sparse_encoder
+from app.utils.sparse_stats import CourseTermStats, sparse_stats
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import time
 import uuid
 
-class QdrantService:
+class QdrantService(VectorStore):
     def __init__(self):
         self.client = QdrantClient(
             host=settings.QDRANT_HOST,
             port=settings.QDRANT_PORT
         )
         self.collection_name = settings.QDRANT_COLLECTION
+        self.has_sparse = False
         self._ensure_collection()
     
     def _ensure_collection(self):
         """Create collection if not exists"""
         from app.services.embedder import embedder_service
         collections = self.client.get_collections().collections
-        if not any(c.name == self.collection_name for c in collections):
-            vector_size = embedder_service.dimension
-            self.client.create_collection(
+        if not any(c.name == self._physical_name() for c in collections):
+            self._create_collection(self.collection_name, embedder_service.dimension)
+        
+        self.ensure_payload_indexes()
+        self.has_sparse = self._collection_has_sparse()
+    
+    def _create_collection(self, name: str, vector_size: int):
+        """New collection with the current layout"""
+        self.client.create_collection(
+            collection_name=name,
+            vectors_config=VectorParams(
+                size=vector_size,
+                distance=Distance.COSINE,
+                on_disk=settings.QDRANT_VECTORS_ON_DISK
+            ),
+            sparse_vectors_config={SPARSE_VECTOR_NAME: SparseVectorParams()},
+            hnsw_config=hnsw_config(),
+            quantization_config=quantization_config()
+        )
+    
+    def _physical_name(self) -> str:
+        """Collection behind collection_name, which may be an alias"""
+        for alias in self.client.get_aliases().aliases:
+            if alias.alias_name == self.collection_name:
+                return alias.collection_name
+        return self.collection_name
+    
+    def _collection_has_sparse(self) -> bool:
+        info = self.client.get_collection(collection_name=self._physical_name())
+        return SPARSE_VECTOR_NAME in (info.config.params.sparse_vectors or {})
+    
+    def ensure_payload_indexes(self, collection_name: str = None) -> List[str]:
+        """Create missing payload indexes; returns created field names"""
+        collection_name = collection_name or self._physical_name()
+        info = self.client.get_collection(collection_name=collection_name)
+        existing = info.payload_schema or {}
+        created = []
+        for field_name, field_schema in PAYLOAD_INDEXES.items():
+            if field_name not in existing:
+                self.client.create_payload_index(
+                    collection_name=collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
+                created.append(field_name)
+        return created
+    
+    def migrate(self) -> List[str]:
+        """
+        Bring existing collection to current layout
+        
+        A missing sparse vector is added by copying into a new collection
+        first (Qdrant cannot add vectors to a collection), which already
+        has the current layout; the other settings are updated in place.
+        
+        Returns: list of applied changes
+        """
+        changes = []
+        if not self._collection_has_sparse():
+            changes.extend(self.recreate_with_sparse())
+        else:
+            changes.extend(self.refresh_sparse_stats())
+        changes.extend(f"payload index: {f}" for f in self.ensure_payload_indexes())
+        
+        physical_name = self._physical_name()
+        info = self.client.get_collection(collection_name=physical_name)
+        current = info.config.hnsw_config
+        target = hnsw_config()
+        if (current.m, current.payload_m or 0) != (target.m, target.payload_m):
+            # Qdrant rebuilds HNSW graphs in the background
+            self.client.update_collection(
+                collection_name=physical_name,
+                hnsw_config=target
+            )
+            changes.append(
+                f"hnsw: m={current.m}, payload_m={current.payload_m} -> "
+                f"m={target.m}, payload_m={target.payload_m} ({settings.QDRANT_TENANCY_MODE})"
+            )
+        
+        # Original vectors on disk, quantized copy (if any) in RAM
+        on_disk = bool(info.config.params.vectors.on_disk)
+        if on_disk != settings.QDRANT_VECTORS_ON_DISK:
+            self.client.update_collection(
+                collection_name=physical_name,
+                vectors_config={"": VectorParamsDiff(on_disk=settings.QDRANT_VECTORS_ON_DISK)}
+            )
+            changes.append(f"vectors on_disk: {on_disk} -> {settings.QDRANT_VECTORS_ON_DISK}")
+        
+        current_quantization = self._quantization_mode(info.config.quantization_config)
+        if current_quantization != settings.QDRANT_QUANTIZATION:
+            self.client.update_collection(
+                collection_name=physical_name,
+                quantization_config=quantization_config() or Disabled.DISABLED
+            )
+            changes.append(f"quantization: {current_quantization} -> {settings.QDRANT_QUANTIZATION}")
+        
+        return changes
+    
+    def recreate_with_sparse(self, page_size: int = 256) -> List[str]:
+        """
+        Copy all points into a new collection with the sparse vector
+        
+        Points keep their IDs, dense vectors and payloads; sparse vectors
+        are computed from the stored content after counting the BM25
+        statistics of every course. collection_name then becomes an alias
+        of the new collection and the old one is deleted. Writes made
+        during the copy are lost, so stop indexing while it runs.
+        """
+        source = self._physical_name()
+        target = f"{self.collection_name}_{int(time.time())}"
+        info = self.client.get_collection(collection_name=source)
+        self._create_collection(target, info.config.params.vectors.size)
+        self.ensure_payload_indexes(target)
+        
+        course_stats = self.count_sparse_stats(source)
+        for course_id, stats in course_stats.items():
+            sparse_stats.replace(course_id, stats, stats.avg_doc_length)
+        
+        def sparse_vector(payload: dict) -> SparseVector:
+            stats = course_stats.get(payload.get("course_id"))
+            return self._sparse_vector(payload.get("content", ""), stats.avg_doc_length if stats else None)
+        
+        copied = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=source,
+                limit=page_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if points:
+                self.client.upsert(
+                    collection_name=target,
+                    points=[
+                        PointStruct(
+                            id=point.id,
+                            vector={
+                                "": point.vector[""] if isinstance(point.vector, dict) else point.vector,
+                                SPARSE_VECTOR_NAME: sparse_vector(point.payload)
+                            },
+                            payload=point.payload
+                        )
+                        for point in points
+                    ]
+                )
+                copied += len(points)
+            if offset is None:
+                break
+        
+        if source == self.collection_name:
+            # An alias cannot share its name with a collection
+            self.client.delete_collection(collection_name=source)
+            self.client.update_collection_aliases(change_aliases_operations=[
+                CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=self.collection_name))
+            ])
+        else:
+            self.client.update_collection_aliases(change_aliases_operations=[
+                DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.collection_name)),
+                CreateAliasOperation(create_alias=CreateAlias(collection_name=target, alias_name=self.collection_name))
+            ])
+            self.client.delete_collection(collection_name=source)
+        self.has_sparse = True
+        return [
+            f"sparse vectors: copied {copied} points into {target}",
+            f"alias: {self.collection_name} -> {target} (was {source})"
+        ]
+    
+    @staticmethod
+    def _quantization_mode(config) -> str:
+        if config is None:
+            return "none"
+        if getattr(config, "scalar", None) is not None:
+            return "scalar"
+        if getattr(config, "binary", None) is not None:
+            return "binary"
+        return "product"
+    
+    def count_sparse_stats(self, collection_name: str = None, page_size: int = 256) -> Dict[int, CourseTermStats]:
+        """BM25 statistics of every course counted from stored content"""
+        course_stats: Dict[int, CourseTermStats] = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name or self.collection_name,
+                limit=page_size,
+                offset=offset,
+                with_payload=["course_id", "content"],
+                with_vectors=False
+            )
+            for point in points:
+                course_id = point.payload.get("course_id")
+                course_stats.setdefault(course_id, CourseTermStats()).add(point.payload.get("content", ""))
+            if offset is None:
+                break
+        return course_stats
+    
+    def refresh_sparse_stats(self) -> List[str]:
+        """
+        Recount BM25 statistics of every course from stored content
+        
+        Indexing keeps the counts up to date incrementally and encodes new
+        chunks with the avgdl of that moment; a course whose avgdl moved by
+        more than SPARSE_REENCODE_DRIFT since its vectors were last
+        re-encoded gets all sparse vectors re-encoded. Run with indexing
+        stopped, like the rest of migrate.
+        
+        Returns: list of applied changes
+        """
+        changes = []
+        for course_id, stats in self.count_sparse_stats().items():
+            avgdl = stats.avg_doc_length
+            encoded_avgdl = sparse_stats.encoded_avg_doc_length(course_id)
+            if encoded_avgdl is None or abs(avgdl - encoded_avgdl) / encoded_avgdl > settings.SPARSE_REENCODE_DRIFT:
+                updated = self.backfill_sparse(course_id, avgdl)
+                encoded_avgdl = avgdl
+                changes.append(f"sparse vectors: re-encoded {updated} points of course {course_id} (avgdl {avgdl:.1f})")
+            sparse_stats.replace(course_id, stats, encoded_avgdl)
+        return changes
+    
+    def backfill_sparse(self, course_id: int, avg_doc_length: float = None, page_size: int = 256) -> int:
+        """Compute sparse vectors from stored content for all course points"""
+        updated = 0
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
                 collection_name=self.collection_name,
-                vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
+                scroll_filter=course_filter(course_id),
+                limit=page_size,
+                offset=offset,
+                with_payload=["content"],
+                with_vectors=False
             )
+            if points:
+                self.client.update_vectors(
+                    collection_name=self.collection_name,
+                    points=[
+                        PointVectors(
+                            id=point.id,
+                            vector={SPARSE_VECTOR_NAME: self._sparse_vector(point.payload.get("content", ""), avg_doc_length)}
+                        )
+                        for point in points
+                    ]
+                )
+                updated += len(points)
+            if offset is None:
+                break
+        return updated
     
-    def search(self, vector: list, course_id: int, limit: int = 5):
+    def search(
+        self,
+        vector: list,
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ):
         """Search for similar vectors"""
         try:
             results = self.client.search(
                 collection_name=self.collection_name,
                 query_vector=vector,
-                query_filter={
-                    "must": [
-                        {"key": "course_id", "match": {"value": course_id}}
-                    ]
-                },
+                query_filter=course_filter(course_id, module, section),
+                search_params=search_params(),
                 limit=limit
             )
             return results
@@ -44,10 +304,25 @@ class QdrantService:
             print(f"Qdrant search error: {e}")
             return []
     
-    def insert(self, vector: list, course_id: int, content: str, metadata: dict):
-        """Insert vector into collection"""
-        point = PointStruct(
-            id=str(uuid.uuid4()),
+    @staticmethod
+    def _sparse_vector(content: str, avg_doc_length: float = None) -> SparseVector:
+        indices, values = sparse_encoder.encode_document(content, avg_doc_length)
+        return SparseVector(indices=indices, values=values)
+    
+    def _make_point(
+        self,
+        vector: list,
+        course_id: int,
+        content: str,
+        metadata: dict,
+        point_id=None,
+        avg_doc_length: float = None
+    ) -> PointStruct:
+        """Build point with standard payload layout"""
+        if self.has_sparse:
+            vector = {"": vector, SPARSE_VECTOR_NAME: self._sparse_vector(content, avg_doc_length)}
+        return PointStruct(
+            id=point_id or str(uuid.uuid4()),
             vector=vector,
             payload={
                 "course_id": course_id,
@@ -55,10 +330,178 @@ class QdrantService:
                 "metadata": metadata
             }
         )
-        self.client.upsert(
+    
+    def get_source_points(self, course_id: int, source: str, page_size: int = 256) -> Dict[str, dict]:
+        """All points of one source document: {point_id: metadata}"""
+        source_filter = Filter(must=[
+            FieldCondition(key="course_id", match=MatchValue(value=course_id)),
+            FieldCondition(key="metadata.source", match=MatchValue(value=source))
+        ])
+        points = {}
+        offset = None
+        while True:
+            page, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=source_filter,
+                limit=page_size,
+                offset=offset,
+                with_payload=["metadata"],
+                with_vectors=False
+            )
+            for point in page:
+                points[str(point.id)] = point.payload.get("metadata", {})
+            if offset is None:
+                break
+        return points
+    
+    def get_vectors(self, point_ids: List[str]) -> Dict[str, list]:
+        """Stored dense vectors by point ID"""
+        if not point_ids:
+            return {}
+        records = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=point_ids,
+            with_payload=False,
+            with_vectors=[""] if self.has_sparse else True
+        )
+        vectors = {}
+        for record in records:
+            vector = record.vector
+            if isinstance(vector, dict):
+                vector = vector[""]
+            vectors[str(record.id)] = vector
+        return vectors
+    
+    def delete_points(self, point_ids: List[str]):
+        """Delete points by ID and take them out of the BM25 statistics"""
+        if not point_ids:
+            return
+        removed = []
+        if self.has_sparse:
+            removed = self.client.retrieve(
+                collection_name=self.collection_name,
+                ids=point_ids,
+                with_payload=["course_id", "content"],
+                with_vectors=False
+            )
+        self.client.delete(
             collection_name=self.collection_name,
-            points=[point]
+            points_selector=PointIdsList(points=point_ids)
         )
+        self._update_sparse_stats([record.payload for record in removed], sign=-1)
+    
+    def _update_sparse_stats(self, payloads: List[dict], sign: int = 1):
+        """Count payloads of added (sign=-1: deleted) points per course"""
+        texts_by_course: Dict[int, List[str]] = {}
+        for payload in payloads:
+            texts_by_course.setdefault(payload.get("course_id"), []).append(payload.get("content", ""))
+        for course_id, texts in texts_by_course.items():
+            sparse_stats.add(course_id, texts, sign)
+    
+    @staticmethod
+    def _register_sources(payloads: List[dict]):
+        """Remember the source documents of added points per course"""
+        sources_by_course: Dict[int, set] = {}
+        for payload in payloads:
+            source = payload.get("metadata", {}).get("source", "unknown")
+            sources_by_course.setdefault(payload.get("course_id"), set()).add(source)
+        for course_id, sources in sources_by_course.items():
+            course_sources.add(course_id, sources)
+    
+    def insert_many(
+        self,
+        items: List[Dict],
+        batch_size: int = None,
+        parallel: int = None,
+        wait: bool = None
+    ) -> Dict:
+        """
+        Bulk insert vectors in batches
+        
+        Each item is a dict with keys: vector, course_id, content, metadata
+        (and optional id). Batches are sent concurrently; with wait=False
+        every batch but the last is fire-and-forget and the last one is sent
+        with wait=True after all others were acknowledged, so it returns
+        only once the whole write has been applied.
+        
+        Sparse vectors are normalized by the average chunk length of their
+        course, and points that were not stored yet are added to its BM25
+        statistics.
+        
+        Returns: stats with per-batch timings
+        """
+        batch_size = batch_size or settings.QDRANT_UPSERT_BATCH_SIZE
+        parallel = parallel or settings.QDRANT_UPSERT_PARALLEL
+        if wait is None:
+            wait = settings.QDRANT_UPSERT_WAIT
+        
+        avg_doc_lengths = {}
+        if self.has_sparse:
+            avg_doc_lengths = {
+                course_id: sparse_stats.avg_doc_length(course_id)
+                for course_id in {item["course_id"] for item in items}
+            }
+        points = [
+            self._make_point(
+                item["vector"],
+                item["course_id"],
+                item["content"],
+                item["metadata"],
+                point_id=item.get("id"),
+                avg_doc_length=avg_doc_lengths.get(item["course_id"])
+            )
+            for item in items
+        ]
+        
+        # Re-upserted points (new metadata, other model) are counted already
+        stored_ids = set()
+        if self.has_sparse and points:
+            stored_ids = {
+                str(record.id) for record in self.client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=[point.id for point in points],
+                    with_payload=False,
+                    with_vectors=False
+                )
+            }
+        batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+        
+        start_time = time.time()
+        batch_timings_ms = [0] * len(batches)
+        
+        def upsert_batch(index: int, wait_batch: bool):
+            batch_start = time.time()
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=batches[index],
+                wait=wait_batch
+            )
+            batch_timings_ms[index] = int((time.time() - batch_start) * 1000)
+        
+        if batches:
+            # Without wait the last batch acts as a consistency barrier
+            head = batches if wait else batches[:-1]
+            if head:
+                with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+                    futures = [
+                        executor.submit(upsert_batch, i, wait)
+                        for i in range(len(head))
+                    ]
+                    for future in futures:
+                        future.result()
+            if not wait:
+                upsert_batch(len(batches) - 1, True)
+        
+        if self.has_sparse:
+            self._update_sparse_stats([point.payload for point in points if str(point.id) not in stored_ids])
+        self._register_sources([point.payload for point in points])
+        
+        return {
+            "points": len(points),
+            "batches": len(batches),
+            "batch_timings_ms": batch_timings_ms,
+            "total_time_ms": int((time.time() - start_time) * 1000)
+        }
     
     def check_health(self) -> bool:
         """Check if Qdrant is healthy"""
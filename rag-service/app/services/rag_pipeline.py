@@ -2,26 +2,35 @@
 RAG Pipeline orchestration
 """
 import time
-from typing import Tuple, List
+from typing import AsyncIterator, Dict, Optional, Tuple, List
 from app.services.retriever import retriever_service
-from app.services.generator import generator_service
+from app.services.generator import generator_service, GeneratorError
 from app.models.response import Chunk
+from app.utils.context_packer import context_packer
+from app.utils.metrics import stage
 
 class RAGPipeline:
     def __init__(self):
         self.retriever = retriever_service
         self.generator = generator_service
+        self.packer = context_packer
     
     async def process(
         self, 
         question: str, 
         course_id: int,
-        top_k: int = 5
-    ) -> Tuple[str, List[Chunk], int]:
+        top_k: int = 5,
+        question_embedding: Optional[List[float]] = None,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> Tuple[str, List[Chunk], int, Dict]:
         """
         Process question through full RAG pipeline
         
-        Returns: (answer, chunks_used, response_time_ms)
+        Returns: (answer, chunks_used, response_time_ms, context_stats)
+        where chunks_used are the packed passages sent to the LLM and
+        context_stats is ContextPacker.pack stats.
+        Raises GeneratorError if the answer could not be generated.
         """
         start_time = time.time()
         
@@ -29,19 +38,85 @@ class RAGPipeline:
         chunks = await self.retriever.retrieve(
             question=question,
             course_id=course_id,
-            top_k=top_k
+            top_k=top_k,
+            question_embedding=question_embedding,
+            module=module,
+            section=section
         )
         
-        # 2. Generate answer with context
+        # 2. Merge, deduplicate and fit chunks into the context budget
+        with stage("prompt"):
+            chunks, context_stats = self.packer.pack(chunks)
+        
+        # 3. Generate answer with context
         answer = await self.generator.generate_with_context(
             question=question,
             chunks=chunks
         )
         
-        # 3. Calculate response time
+        # 4. Calculate response time
         response_time_ms = int((time.time() - start_time) * 1000)
         
-        return answer, chunks, response_time_ms
+        return answer, chunks, response_time_ms, context_stats
+    
+    async def process_stream(
+        self,
+        question: str,
+        course_id: int,
+        top_k: int = 5,
+        question_embedding: Optional[List[float]] = None,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Process question and stream the answer
+        
+        Yields events: chunks (packed context), token (answer delta),
+        then done (full answer, timings and context stats) or error.
+        """
+        start_time = time.time()
+        
+        # 1. Retrieve relevant chunks
+        chunks = await self.retriever.retrieve(
+            question=question,
+            course_id=course_id,
+            top_k=top_k,
+            question_embedding=question_embedding,
+            module=module,
+            section=section
+        )
+        with stage("prompt"):
+            chunks, context_stats = self.packer.pack(chunks)
+        yield {"event": "chunks", "data": {"chunks_used": [c.model_dump() for c in chunks]}}
+        
+        # 2. Stream answer tokens
+        parts = []
+        first_token_ms = None
+        try:
+            async for delta in self.generator.stream_with_context(
+                question=question,
+                chunks=chunks
+            ):
+                if first_token_ms is None:
+                    first_token_ms = int((time.time() - start_time) * 1000)
+                parts.append(delta)
+                yield {"event": "token", "data": {"text": delta}}
+        except GeneratorError as e:
+            yield {"event": "error", "data": {"error": str(e)}}
+            return
+        
+        # 3. Final answer with timings
+        yield {
+            "event": "done",
+            "data": {
+                "status": "success",
+                "answer": "".join(parts),
+                "chunks_used": [c.model_dump() for c in chunks],
+                "response_time_ms": int((time.time() - start_time) * 1000),
+                "first_token_ms": first_token_ms,
+                "context": context_stats
+            }
+        }
 
 rag_pipeline = RAGPipeline()
 
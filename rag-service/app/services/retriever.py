@@ -1,29 +1,64 @@
 """
 Retriever service for finding relevant chunks
 """
-from typing import List
-from app.services.embedder import embedder_service
-from app.services.qdrant_service import qdrant_service
+import asyncio
+from typing import List, Optional
+from app.config import settings
+from app.services.embedder import embedder_service, embedding_scheduler
+from app.services.vector_store import get_async_vector_store
 from app.models.response import Chunk
+from app.utils.metrics import stage
+from app.utils.parsers import DocumentParser
+from app.utils.sparse import sparse_encoder, reciprocal_rank_fusion
+from app.utils.sparse_stats import sparse_stats
 
 class RetrieverService:
     def __init__(self):
         self.embedder = embedder_service
-        self.qdrant = qdrant_service
+        self.scheduler = embedding_scheduler
+        self.store = get_async_vector_store()
+        self.sparse = sparse_encoder
+        self.sparse_stats = sparse_stats
     
-    async def retrieve(self, question: str, course_id: int, top_k: int = 5) -> List[Chunk]:
+    async def retrieve(
+        self,
+        question: str,
+        course_id: int,
+        top_k: int = 5,
+        question_embedding: Optional[List[float]] = None,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> List[Chunk]:
         """
         Retrieve relevant chunks for question
+        
+        In hybrid mode dense and sparse (BM25) searches run concurrently and
+        their rankings are fused with reciprocal rank fusion; stores without
+        sparse vectors (not migrated yet, local backend) search dense only.
+        Chunk score is the cosine similarity to the question in both modes.
+        module and section restrict both searches to one module and heading.
         """
-        # 1. Create embedding for question
-        question_embedding = self.embedder.embed(question)
-        
-        # 2. Search in Qdrant
-        results = self.qdrant.search(
-            vector=question_embedding,
-            course_id=course_id,
-            limit=top_k
-        )
+        # Headings are stored cleaned, so match the same form
+        if section:
+            section = DocumentParser.clean_text(section) or None
+        scope = {"module": module, "section": section}
+        
+        # 1. Create embedding for question (unless already computed)
+        if question_embedding is None:
+            with stage("embedding"):
+                question_embedding = await self.scheduler.submit(question)
+        
+        # 2. Search the vector store
+        with stage("search"):
+            if settings.RETRIEVAL_MODE == "hybrid" and await self.store.supports_sparse():
+                results = await self._hybrid_search(question, question_embedding, course_id, top_k, scope)
+            else:
+                results = await self.store.search(
+                    vector=question_embedding,
+                    course_id=course_id,
+                    limit=top_k,
+                    **scope
+                )
         
         # 3. Convert to Chunk objects
         chunks = []
@@ -36,6 +71,62 @@ class RetrieverService:
             ))
         
         return chunks
+    
+    async def _hybrid_search(
+        self,
+        question: str,
+        question_embedding: List[float],
+        course_id: int,
+        top_k: int,
+        scope: Optional[dict] = None
+    ) -> list:
+        """
+        Dense + sparse search fused by RRF
+        
+        Query terms are weighted by their IDF in the course. Results come
+        in fused order but keep the cosine score; lexical-only matches get
+        theirs from one extra dense lookup.
+        """
+        candidates = max(top_k, settings.HYBRID_CANDIDATES)
+        idf = await self.sparse_stats.query_idf(course_id, self.sparse.query_indices(question))
+        indices, values = self.sparse.encode_query(question, idf)
+        scope = scope or {}
+        
+        dense_results, sparse_results = await asyncio.gather(
+            self.store.search(
+                vector=question_embedding,
+                course_id=course_id,
+                limit=candidates,
+                **scope
+            ),
+            self.store.search_sparse(
+                indices=indices,
+                values=values,
+                course_id=course_id,
+                limit=candidates,
+                **scope
+            )
+        )
+        
+        fused = reciprocal_rank_fusion([
+            [r.id for r in dense_results],
+            [r.id for r in sparse_results]
+        ])[:top_k]
+        
+        points = {r.id: r for r in sparse_results}
+        points.update({r.id: r for r in dense_results})
+        dense_ids = {r.id for r in dense_results}
+        lexical_only = [point_id for point_id, _ in fused if point_id not in dense_ids]
+        cosine = {}
+        if lexical_only:
+            cosine = await self.store.score_points(question_embedding, course_id, [str(i) for i in lexical_only])
+        
+        results = []
+        for point_id, _ in fused:
+            result = points[point_id]
+            if point_id not in dense_ids:
+                result = result.model_copy(update={"score": cosine.get(str(point_id), 0.0)})
+            results.append(result)
+        return results
 
 retriever_service = RetrieverService()
-
@@ -0,0 +1,156 @@
+"""
+Vector store interface and backend selection
+
+VECTOR_STORE_BACKEND picks the implementation:
+- qdrant: Qdrant server (QdrantService / AsyncQdrantService)
+- local: in-process brute-force index over memory-mapped files
+  (LocalVectorStore), for tests and small single-course deployments
+"""
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+from app.config import settings
+
+# Namespace for deterministic point IDs
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "rag-course-platform/points")
+
+class VectorStore(ABC):
+    """
+    Store used by indexing: writes and source bookkeeping
+    
+    Points have a string ID, a dense vector and the payload
+    {"course_id", "content", "metadata"}. Search results are Qdrant
+    ScoredPoint objects for every backend.
+    """
+    
+    collection_name: str
+    
+    @staticmethod
+    def point_id(course_id: int, source: str, chunk_hash: str, occurrence: int = 0) -> str:
+        """
+        Stable point ID for a chunk
+        
+        occurrence numbers identical chunks within one source, so repeated
+        passages get separate points instead of overwriting each other.
+        """
+        return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{course_id}/{source}/{chunk_hash}/{occurrence}"))
+    
+    @abstractmethod
+    def search(
+        self,
+        vector: list,
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> list:
+        """Most similar course points, best first"""
+    
+    @abstractmethod
+    def insert_many(self, items: List[Dict], batch_size: int = None, parallel: int = None, wait: bool = None) -> Dict:
+        """
+        Upsert points from dicts with vector, course_id, content, metadata
+        and optional id
+        
+        Returns: stats with points, batches, batch_timings_ms, total_time_ms
+        """
+    
+    @abstractmethod
+    def get_source_points(self, course_id: int, source: str) -> Dict[str, dict]:
+        """All points of one source document: {point_id: metadata}"""
+    
+    @abstractmethod
+    def get_vectors(self, point_ids: List[str]) -> Dict[str, list]:
+        """Stored dense vectors by point ID"""
+    
+    @abstractmethod
+    def delete_points(self, point_ids: List[str]):
+        """Delete points by ID"""
+    
+    @abstractmethod
+    def check_health(self) -> bool:
+        """Whether the store is usable"""
+    
+    def insert(self, vector: list, course_id: int, content: str, metadata: dict):
+        """Insert one point with a random ID"""
+        self.insert_many([{
+            "vector": vector,
+            "course_id": course_id,
+            "content": content,
+            "metadata": metadata
+        }])
+
+class AsyncVectorStore(ABC):
+    """Store used on the request path: search and read-only stats"""
+    
+    collection_name: str
+    
+    @abstractmethod
+    async def search(
+        self,
+        vector: list,
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> list:
+        """Most similar course points, best first"""
+    
+    @abstractmethod
+    async def search_sparse(
+        self,
+        indices: List[int],
+        values: List[float],
+        course_id: int,
+        limit: int = 5,
+        module: Optional[int] = None,
+        section: Optional[str] = None
+    ) -> list:
+        """Best lexical (sparse vector) matches; [] if unsupported"""
+    
+    @abstractmethod
+    async def score_points(self, vector: list, course_id: int, point_ids: List[str]) -> Dict[str, float]:
+        """Dense similarity of vector to the given course points"""
+    
+    @abstractmethod
+    async def supports_sparse(self) -> bool:
+        """Whether search_sparse can find anything"""
+    
+    @abstractmethod
+    async def count(self, course_id: int) -> int:
+        """Number of course points"""
+    
+    @abstractmethod
+    async def source_stats(self, course_id: int) -> Dict[str, int]:
+        """Chunks per source document of course"""
+    
+    @abstractmethod
+    async def check_health(self) -> bool:
+        """Whether the store is usable"""
+    
+    @abstractmethod
+    async def close(self):
+        """Release connections and flush state"""
+
+def get_vector_store(backend: str = None) -> VectorStore:
+    """Shared VectorStore of backend (default VECTOR_STORE_BACKEND)"""
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    # Imported here: importing qdrant_service connects to Qdrant
+    if backend == "qdrant":
+        from app.services.qdrant_service import qdrant_service
+        return qdrant_service
+    elif backend == "local":
+        from app.services.local_vector_store import get_local_store
+        return get_local_store()
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+def get_async_vector_store(backend: str = None) -> AsyncVectorStore:
+    """Shared AsyncVectorStore of backend (default VECTOR_STORE_BACKEND)"""
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    if backend == "qdrant":
+        from app.services.async_qdrant_service import async_qdrant_service
+        return async_qdrant_service
+    elif backend == "local":
+        from app.services.local_vector_store import get_async_local_store
+        return get_async_local_store()
+    raise ValueError(f"Unknown vector store backend: {backend}")
@@ -1,8 +1,8 @@
 """
 YandexGPT service for text generation
 """
-import httpx
 from app.config import settings
+from app.services.llm_client import llm_client
 
 class YandexGPTService:
     def __init__(self):
@@ -10,6 +10,8 @@ class YandexGPTService:
         self.folder_id = settings.YANDEX_FOLDER_ID
         self.model = settings.YANDEX_MODEL
         self.endpoint = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+        self.tokenize_endpoint = "https://llm.api.cloud.yandex.net/foundationModels/v1/tokenize"
+        self.http = llm_client
     
     async def generate(self, prompt: str, context: str = "") -> str:
         """Generate text using YandexGPT"""
@@ -43,28 +45,44 @@ class YandexGPTService:
         }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    self.endpoint,
-                    json=payload,
-                    headers=headers
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return result["result"]["alternatives"][0]["message"]["text"]
-                else:
-                    return f"Ошибка YandexGPT API: {response.status_code}"
+            response = await self.http.client.post(
+                self.endpoint,
+                json=payload,
+                headers=headers
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                return result["result"]["alternatives"][0]["message"]["text"]
+            else:
+                return f"Ошибка YandexGPT API: {response.status_code}"
         except Exception as e:
             return f"Ошибка подключения к YandexGPT: {str(e)}"
     
     async def check_health(self) -> bool:
-        """Check if YandexGPT is accessible"""
+        """
+        Check if YandexGPT is accessible
+        
+        Calls the tokenizer, which checks key, folder and model without
+        a billed completion.
+        """
+        if not self.api_key or not self.folder_id:
+            return False
         try:
-            result = await self.generate("test")
-            return "Ошибка" not in result
+            response = await self.http.client.post(
+                self.tokenize_endpoint,
+                json={"modelUri": f"gpt://{self.folder_id}/{self.model}", "text": "ping"},
+                headers={"Authorization": f"Api-Key {self.api_key}"}
+            )
+            return response.status_code == 200
         except:
             return False
+    
+    async def probe(self):
+        """Health probe: None when not configured"""
+        if not self.api_key or not self.folder_id:
+            return None
+        return await self.check_health()
 
 yandex_service = YandexGPTService()
 
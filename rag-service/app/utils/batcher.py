@@ -0,0 +1,174 @@
+"""
+Dynamic micro-batching for CPU-bound batch functions
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List
+
+class MicroBatcher:
+    """
+    Collects concurrent submissions into batches
+    
+    A batch is dispatched when it reaches max_batch_size or when the first
+    item has waited max_wait_ms. The batch function runs in a single worker
+    thread, so the event loop stays free and new items keep queueing while
+    the previous batch is being computed.
+    """
+    
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="microbatch")
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        
+        # Stats
+        self.batches_total = 0
+        self.items_total = 0
+        self.max_batch_seen = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = 0
+        self.batch_size_counts: Dict[int, int] = {}
+    
+    def _ensure_worker(self):
+        """Start worker on the running loop (restarted if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+    
+    async def submit(self, item: Any) -> Any:
+        """Submit single item and wait for its result"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+    
+    async def _collect(self) -> list:
+        """Wait for first item, then gather more until size or time limit"""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait_ms / 1000
+        
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _run(self):
+        """Worker loop"""
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            
+            start_time = time.time()
+            try:
+                results = await self._loop.run_in_executor(self._executor, self.batch_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            self._record(len(batch), int((time.time() - start_time) * 1000))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+    
+    def _record(self, size: int, elapsed_ms: int):
+        self.batches_total += 1
+        self.items_total += size
+        self.max_batch_seen = max(self.max_batch_seen, size)
+        self.last_batch_size = size
+        self.last_batch_ms = elapsed_ms
+        self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+    
+    async def close(self):
+        """Stop worker task"""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        self._worker = None
+    
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+    
+    def stats(self) -> Dict:
+        """Get batching statistics"""
+        return {
+            "queue_depth": self.queue_depth,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches_total": self.batches_total,
+            "items_total": self.items_total,
+            "avg_batch_size": round(self.items_total / self.batches_total, 2) if self.batches_total else 0,
+            "max_batch_seen": self.max_batch_seen,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_ms": self.last_batch_ms,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items()))
+        }
+
+async def iterate_in_thread(iterable: Iterable, batch_size: int, depth: int = 2) -> AsyncIterator[List]:
+    """
+    Consume a blocking iterable in a worker thread, yielding batches
+    
+    At most depth batches wait in the queue, so a slow consumer pauses
+    the producer instead of letting it run ahead and buffer everything.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=depth)
+    done = object()
+    stopped = False
+    
+    def put(item):
+        asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+    
+    def produce():
+        try:
+            batch = []
+            for item in iterable:
+                if stopped:
+                    return
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    put(batch)
+                    batch = []
+            if batch:
+                put(batch)
+            put(done)
+        except Exception as e:
+            put(e)
+    
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await producer
+    finally:
+        # Unblock a producer waiting on a full queue if we stopped early
+        stopped = True
+        while not queue.empty():
+            queue.get_nowait()
@@ -2,6 +2,7 @@
 Caching service using Redis
 """
 from redis import Redis
+from redis.asyncio import ConnectionPool, Redis as AsyncRedis
 from app.config import settings
 import json
 import hashlib
@@ -14,6 +15,15 @@ class CacheService:
             db=1,
             decode_responses=True
         )
+        # Same database for lookups on the event loop
+        self.pool = ConnectionPool(
+            host=getattr(settings, 'REDIS_HOST', 'localhost'),
+            port=getattr(settings, 'REDIS_PORT', 6379),
+            db=1,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=True
+        )
+        self.async_redis = AsyncRedis(connection_pool=self.pool)
         self.ttl = 3600  # 1 hour default TTL
     
     def _make_key(self, prefix: str, *args) -> str:
@@ -47,15 +57,44 @@ class CacheService:
         except Exception as e:
             print(f"Cache delete error: {e}")
     
-    def get_answer_cache(self, question: str, course_id: int):
+    def _answer_key(self, question: str, course_id: int, module: int = None, section: str = None) -> str:
+        # Scoped questions get their own entries; unscoped keys are unchanged
+        if module is None and not section:
+            return self._make_key("answer", course_id, question.lower().strip())
+        return self._make_key("answer", course_id, question.lower().strip(), module, section or "")
+    
+    def get_answer_cache(self, question: str, course_id: int, module: int = None, section: str = None):
         """Get cached answer for question"""
-        key = self._make_key("answer", course_id, question.lower().strip())
-        return self.get(key)
+        return self.get(self._answer_key(question, course_id, module, section))
     
-    def set_answer_cache(self, question: str, course_id: int, answer: dict):
+    def set_answer_cache(self, question: str, course_id: int, answer: dict, module: int = None, section: str = None):
         """Cache answer for question"""
-        key = self._make_key("answer", course_id, question.lower().strip())
-        self.set(key, answer, ttl=1800)  # 30 minutes
+        key = self._answer_key(question, course_id, module, section)
+        ttl = 1800  # 30 minutes
+        try:
+            # Remember the key per course, so reindexing can drop it
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.setex(key, ttl, json.dumps(answer))
+            pipe.sadd(self._course_answers_key(course_id), key)
+            pipe.expire(self._course_answers_key(course_id), ttl)
+            pipe.execute()
+        except Exception as e:
+            print(f"Cache set error: {e}")
+    
+    def _course_answers_key(self, course_id: int) -> str:
+        return f"answer:keys:{course_id}"
+    
+    def invalidate_course(self, course_id: int):
+        """Drop cached answers of course"""
+        try:
+            keys = self.redis.smembers(self._course_answers_key(course_id))
+            self.redis.delete(self._course_answers_key(course_id), *keys)
+        except Exception as e:
+            print(f"Cache invalidate error: {e}")
+    
+    async def close(self):
+        """Close async connection pool"""
+        await self.pool.disconnect()
 
 cache_service = CacheService()
 
@@ -1,62 +1,309 @@
 """
 Text chunking strategies
 """
-from typing import List
+import re
+from itertools import groupby
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
 from app.config import settings
+from app.utils.parsers import DocumentParser, Section, Segment
+
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+
+CHUNK_METHODS = ("sentences", "characters", "tokens")
+
+# Bumped when chunk boundaries change for the same settings, so stored
+# documents are re-chunked on the next indexing run
+CHUNKER_VERSION = 2
+
+# Special tokens added around every input by the embedding model
+SPECIAL_TOKENS = 2
+
+@lru_cache(maxsize=4)
+def get_tokenizer(model_name: str = None):
+    """Fast tokenizer of the embedding model (loaded once per process)"""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name or settings.EMBEDDING_MODEL)
+
+def model_token_limit(tokenizer) -> int:
+    """Text tokens the model reads, without special tokens"""
+    model_max = getattr(tokenizer, "model_max_length", None) or 512
+    if model_max > 100000:
+        # Tokenizers without a configured limit report a huge sentinel
+        model_max = 512
+    return model_max - SPECIAL_TOKENS
 
 class TextChunker:
     def __init__(
         self, 
         chunk_size: int = None, 
-        chunk_overlap: int = None
+        chunk_overlap: int = None,
+        chunk_tokens: int = None,
+        chunk_overlap_tokens: int = None,
+        method: str = None,
+        tokenizer=None
     ):
         self.chunk_size = chunk_size or settings.CHUNK_SIZE
         self.chunk_overlap = chunk_overlap or settings.CHUNK_OVERLAP
+        self.chunk_tokens = chunk_tokens or settings.CHUNK_TOKENS
+        self.chunk_overlap_tokens = chunk_overlap_tokens if chunk_overlap_tokens is not None else settings.CHUNK_OVERLAP_TOKENS
+        self.method = method or settings.CHUNK_METHOD
+        if self.method not in CHUNK_METHODS:
+            raise ValueError(f"Unknown chunking method: {self.method}")
+        self._tokenizer = tokenizer
+    
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer()
+        return self._tokenizer
+    
+    @property
+    def max_tokens(self) -> int:
+        """Chunk token limit, capped by what the model reads"""
+        return min(self.chunk_tokens, model_token_limit(self.tokenizer))
     
     def chunk_by_sentences(self, text: str) -> List[str]:
         """
         Split text into chunks by sentences
         Tries to keep chunks around target size
         """
-        import re
+        return [chunk["text"] for chunk in self._iter_sentence_chunks([(None, text)])]
+    
+    def iter_sentences(self, segments: Iterable[Segment]) -> Iterator[Segment]:
+        """
+        Yield (page, sentence) across segment boundaries
         
-        # Split into sentences
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        Only the unfinished tail sentence of the previous segment is held
+        back, so memory does not grow with the document. A sentence gets
+        the page it starts on.
+        """
+        pending = ""
+        pending_page = None
+        max_pending = self.chunk_size * 8
         
-        chunks = []
+        for page, text in segments:
+            if not text:
+                continue
+            if pending:
+                text = pending + " " + text
+                start_page = pending_page
+            else:
+                start_page = page
+            
+            parts = SENTENCE_SPLIT_RE.split(text)
+            for i, sentence in enumerate(parts[:-1]):
+                yield (start_page if i == 0 else page), sentence
+            
+            pending = parts[-1]
+            pending_page = start_page if len(parts) == 1 else page
+            # Text without sentence ends must not accumulate unbounded
+            if len(pending) > max_pending:
+                yield pending_page, pending
+                pending = ""
+        
+        if pending:
+            yield pending_page, pending
+    
+    def iter_chunks(self, segments: Iterable[Segment], method: str = None) -> Iterator[Dict]:
+        """
+        Stream chunks from (page, text) segments
+        
+        Yields dicts with text, page_start and page_end (None for formats
+        without pages); token chunks also carry start/end character
+        offsets into the segments joined with spaces and their token count.
+        """
+        method = method or self.method
+        if method == "sentences":
+            return self._iter_sentence_chunks(segments)
+        elif method == "tokens":
+            return self._iter_token_chunks(segments)
+        elif method == "characters":
+            text = " ".join(t for _, t in segments if t)
+            return iter([
+                {"text": chunk, "page_start": None, "page_end": None}
+                for chunk in self.chunk_by_characters(text)
+            ])
+        else:
+            raise ValueError(f"Unknown chunking method: {method}")
+    
+    def iter_section_chunks(self, sections: Iterable[Section], method: str = None) -> Iterator[Dict]:
+        """
+        Stream chunks that never cross a heading boundary
+        
+        Consecutive segments with the same heading path are chunked with
+        iter_chunks; every chunk also carries its headings. Token chunk
+        offsets stay relative to all segments joined with spaces.
+        """
+        base = 0
+        for headings, group in groupby(sections, key=lambda section: section[0]):
+            length = -1
+            
+            def segments():
+                nonlocal length
+                for _, page, text in group:
+                    length += len(text) + 1
+                    yield page, text
+            
+            for chunk in self.iter_chunks(segments(), method):
+                chunk["headings"] = list(headings)
+                if chunk.get("start") is not None:
+                    chunk["start"] += base
+                    chunk["end"] += base
+                yield chunk
+            base += length + 1
+    
+    def _iter_sentence_chunks(self, segments: Iterable[Segment]) -> Iterator[Dict]:
+        """Sentence chunks, same chunking as chunk_by_sentences"""
         current_chunk = []
         current_length = 0
         
-        for sentence in sentences:
+        def emit(sentences):
+            return {
+                "text": ' '.join(s for _, s in sentences),
+                "page_start": sentences[0][0],
+                "page_end": sentences[-1][0]
+            }
+        
+        for page, sentence in self.iter_sentences(segments):
             sentence_length = len(sentence)
             
             # If adding this sentence exceeds chunk_size
             if current_length + sentence_length > self.chunk_size and current_chunk:
                 # Save current chunk
-                chunks.append(' '.join(current_chunk))
+                yield emit(current_chunk)
                 
-                # Start new chunk with overlap
-                overlap_sentences = []
+                # Start new chunk with overlap: longest suffix within chunk_overlap
+                overlap_start = len(current_chunk)
                 overlap_length = 0
-                for s in reversed(current_chunk):
-                    if overlap_length + len(s) <= self.chunk_overlap:
-                        overlap_sentences.insert(0, s)
-                        overlap_length += len(s)
-                    else:
-                        break
+                while overlap_start > 0 and overlap_length + len(current_chunk[overlap_start - 1][1]) <= self.chunk_overlap:
+                    overlap_start -= 1
+                    overlap_length += len(current_chunk[overlap_start][1])
                 
-                current_chunk = overlap_sentences
+                current_chunk = current_chunk[overlap_start:]
                 current_length = overlap_length
             
-            current_chunk.append(sentence)
+            current_chunk.append((page, sentence))
             current_length += sentence_length
         
         # Add last chunk
         if current_chunk:
-            chunks.append(' '.join(current_chunk))
+            yield emit(current_chunk)
+    
+    def chunk_by_tokens(self, text: str) -> List[Dict]:
+        """
+        Split text into windows of at most max_tokens model tokens
+        
+        The text is tokenized once; windows are index ranges over the
+        offset mapping, so building chunks and their overlap never copies
+        token lists. A window ends at a sentence start when one falls in
+        its second half, and the overlap begins at a sentence start when
+        one falls inside it.
+        
+        Returns: dicts with text, start/end character offsets and tokens
+        """
+        encoding = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            verbose=False
+        )
+        offsets = encoding["offset_mapping"]
+        total = len(offsets)
+        if total == 0:
+            return []
+        
+        max_tokens = self.max_tokens
+        overlap = min(self.chunk_overlap_tokens, max_tokens // 2)
+        token_starts = [start for start, _ in offsets]
+        # Token index of every sentence start
+        boundaries = [
+            index for index in (
+                bisect_left(token_starts, match.end())
+                for match in SENTENCE_SPLIT_RE.finditer(text)
+            )
+            if 0 < index < total
+        ]
+        
+        chunks = []
+        start = 0
+        while start < total:
+            end = min(start + max_tokens, total)
+            if end < total:
+                i = bisect_right(boundaries, end) - 1
+                if i >= 0 and boundaries[i] > start + max_tokens // 2:
+                    end = boundaries[i]
+            
+            char_start = offsets[start][0]
+            char_end = offsets[end - 1][1]
+            chunks.append({
+                "text": text[char_start:char_end],
+                "start": char_start,
+                "end": char_end,
+                "tokens": end - start
+            })
+            if end == total:
+                break
+            
+            next_start = max(end - overlap, start + 1)
+            i = bisect_left(boundaries, next_start)
+            if i < len(boundaries) and boundaries[i] < end:
+                next_start = boundaries[i]
+            start = next_start
         
         return chunks
     
+    def _iter_token_chunks(self, segments: Iterable[Segment]) -> Iterator[Dict]:
+        """
+        Token chunks over a sliding text window
+        
+        Segments are buffered until the window holds several chunks; all
+        chunks but the last are emitted and the buffer restarts at the last
+        chunk's start, so each token is re-tokenized at most once more.
+        """
+        window_chars = self.max_tokens * 32
+        buffer = ""
+        base = 0  # offset of buffer[0] in the joined text
+        pages = []  # (buffer offset, page) of each segment start
+        
+        def located(chunk):
+            starts = [offset for offset, _ in pages]
+            return {
+                **chunk,
+                "start": base + chunk["start"],
+                "end": base + chunk["end"],
+                "page_start": pages[bisect_right(starts, chunk["start"]) - 1][1],
+                "page_end": pages[bisect_right(starts, max(chunk["end"] - 1, 0)) - 1][1]
+            }
+        
+        for page, text in segments:
+            if not text:
+                continue
+            if buffer:
+                buffer += " "
+            pages.append((len(buffer), page))
+            buffer += text
+            if len(buffer) < window_chars:
+                continue
+            
+            chunks = self.chunk_by_tokens(buffer)
+            if not chunks:
+                continue
+            for chunk in chunks[:-1]:
+                yield located(chunk)
+            
+            cut = chunks[-1]["start"]
+            buffer = buffer[cut:]
+            base += cut
+            # Page at the cut starts the new buffer
+            page_at_cut = [p for offset, p in pages if offset <= cut][-1]
+            pages = [(0, page_at_cut)] + [(offset - cut, p) for offset, p in pages if offset > cut]
+        
+        if buffer:
+            for chunk in self.chunk_by_tokens(buffer):
+                yield located(chunk)
+    
     def chunk_by_characters(self, text: str) -> List[str]:
         """Simple character-based chunking with overlap"""
         chunks = []
@@ -84,7 +331,10 @@ class TextChunker:
                         chunk = chunk[:last_space]
             
             chunks.append(chunk.strip())
-            start += len(chunk) - self.chunk_overlap
+            if start + len(chunk) >= text_length:
+                break
+            # Always advance, even when a chunk is shorter than the overlap
+            start += max(len(chunk) - self.chunk_overlap, 1)
         
         return chunks
     
@@ -94,8 +344,30 @@ class TextChunker:
             return self.chunk_by_sentences(text)
         elif method == "characters":
             return self.chunk_by_characters(text)
+        elif method == "tokens":
+            return [chunk["text"] for chunk in self.chunk_by_tokens(text)]
         else:
             raise ValueError(f"Unknown chunking method: {method}")
 
 chunker = TextChunker()
 
+def chunk_file(file_path: str) -> Tuple[int, List[Dict]]:
+    """
+    Parse and chunk a file with default settings
+    
+    Only depends on parsers and settings, so it is cheap to run in
+    worker processes. Returns: (text length, chunk dicts from
+    iter_section_chunks)
+    """
+    characters = 0
+    
+    def counted(sections):
+        nonlocal characters
+        for headings, page, text in sections:
+            characters += len(text)
+            yield headings, page, text
+    
+    chunks = list(chunker.iter_section_chunks(counted(DocumentParser.iter_clean_sections(file_path))))
+    if not chunks:
+        raise ValueError("Document is empty or could not be parsed")
+    return characters, chunks
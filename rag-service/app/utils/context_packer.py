@@ -0,0 +1,185 @@
+"""
+Prompt context packing under a token budget
+"""
+import math
+import re
+from collections import defaultdict
+from typing import Callable, Dict, List, Tuple
+from app.config import settings
+from app.models.response import Chunk
+
+WORD_RE = re.compile(r'\w+')
+
+# "[Материал N] (релевантность: ..., источник: ...)" header of each passage
+PASSAGE_OVERHEAD_TOKENS = 12
+
+SENTENCE_ENDS = ".!?"
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count from text length"""
+    return math.ceil(len(text) / settings.CONTEXT_CHARS_PER_TOKEN)
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return set(words)
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def _text_overlap(a: str, b: str) -> int:
+    """
+    Length of the longest prefix of b that a ends with
+    
+    Sentence chunks overlap by whole sentences, so only prefixes of b
+    that end a sentence are tried.
+    """
+    for k in range(min(len(a), len(b)), 0, -1):
+        if (k == len(b) or (b[k] == " " and b[k - 1] in SENTENCE_ENDS)) and a.endswith(b[:k]):
+            return k
+    return 0
+
+def _join(first: Chunk, second: Chunk) -> str:
+    """Text of two neighbouring chunks with their overlap once"""
+    a, b = first.content, second.content
+    a_end = first.metadata.get("char_end")
+    b_start = second.metadata.get("char_start")
+    if a_end is not None and b_start is not None:
+        # Token chunks: offsets are in the same document coordinates
+        overlap = a_end - b_start
+        if 0 < overlap <= len(b):
+            return a + b[overlap:]
+        return a + " " + b
+    overlap = _text_overlap(a, b)
+    return a + b[overlap:] if overlap else a + " " + b
+
+class ContextPacker:
+    """
+    Turns retrieved chunks into the passages sent to the LLM
+    
+    1. Chunks of the same source with consecutive chunk_index are merged
+       into one passage, so their overlap is sent once.
+    2. Passages whose word shingles are mostly contained in a more
+       relevant passage are dropped as near-duplicates.
+    3. Passages are taken by relevance while they fit the token budget;
+       the most relevant one is truncated if it alone does not fit.
+    """
+    
+    def __init__(
+        self,
+        max_tokens: int = None,
+        max_passages: int = None,
+        dedup_threshold: float = None,
+        count_tokens: Callable[[str], int] = estimate_tokens
+    ):
+        self.max_tokens = max_tokens or settings.MAX_CONTEXT_LENGTH
+        self.max_passages = max_passages or settings.MAX_CHUNKS
+        self.dedup_threshold = dedup_threshold or settings.CONTEXT_DEDUP_THRESHOLD
+        self.count_tokens = count_tokens
+    
+    def passage_tokens(self, chunk: Chunk) -> int:
+        return self.count_tokens(chunk.content) + PASSAGE_OVERHEAD_TOKENS
+    
+    def merge_adjacent(self, chunks: List[Chunk]) -> List[Chunk]:
+        """Merge runs of consecutive chunk_index per source; keeps score order"""
+        by_source = defaultdict(list)
+        passages = []
+        for chunk in chunks:
+            if chunk.metadata.get("chunk_index") is None:
+                passages.append(chunk)
+            else:
+                by_source[chunk.source].append(chunk)
+        
+        for source_chunks in by_source.values():
+            source_chunks.sort(key=lambda c: c.metadata["chunk_index"])
+            run = [source_chunks[0]]
+            for chunk in source_chunks[1:]:
+                last_index = run[-1].metadata["chunk_index"]
+                if chunk.metadata["chunk_index"] == last_index:
+                    continue
+                if chunk.metadata["chunk_index"] == last_index + 1:
+                    run.append(chunk)
+                else:
+                    passages.append(self._merge(run))
+                    run = [chunk]
+            passages.append(self._merge(run))
+        
+        passages.sort(key=lambda c: c.score, reverse=True)
+        return passages
+    
+    @staticmethod
+    def _merge(run: List[Chunk]) -> Chunk:
+        if len(run) == 1:
+            return run[0]
+        content = run[0].content
+        previous = run[0]
+        for chunk in run[1:]:
+            content = _join(previous.model_copy(update={"content": content}), chunk)
+            previous = chunk.model_copy(update={"content": content})
+        
+        metadata = {**run[0].metadata, "chunk_index_end": run[-1].metadata["chunk_index"]}
+        for key in ("page_end", "char_end"):
+            if run[-1].metadata.get(key) is not None:
+                metadata[key] = run[-1].metadata[key]
+        return Chunk(
+            content=content,
+            score=max(c.score for c in run),
+            source=run[0].source,
+            metadata=metadata
+        )
+    
+    def drop_duplicates(self, passages: List[Chunk]) -> List[Chunk]:
+        """Drop passages mostly contained in a more relevant kept one"""
+        kept = []
+        kept_shingles = []
+        for passage in passages:
+            shingles = _shingles(passage.content)
+            duplicate = any(
+                shingles and other and len(shingles & other) / min(len(shingles), len(other)) >= self.dedup_threshold
+                for other in kept_shingles
+            )
+            if not duplicate:
+                kept.append(passage)
+                kept_shingles.append(shingles)
+        return kept
+    
+    def _truncate(self, passage: Chunk, tokens: int) -> Chunk:
+        """Cut passage to about tokens, at a sentence end when possible"""
+        max_chars = int(len(passage.content) * tokens / max(self.count_tokens(passage.content), 1))
+        content = passage.content[:max_chars]
+        sentence_end = max(content.rfind(end) for end in SENTENCE_ENDS)
+        if sentence_end > max_chars // 2:
+            content = content[:sentence_end + 1]
+        return passage.model_copy(update={"content": content})
+    
+    def pack(self, chunks: List[Chunk]) -> Tuple[List[Chunk], Dict]:
+        """
+        Passages for the prompt, most relevant first
+        
+        Returns: (passages, stats) where stats has chunks, passages,
+        tokens_before (all chunks as retrieved), tokens_after and
+        tokens_saved.
+        """
+        tokens_before = sum(self.passage_tokens(c) for c in chunks)
+        
+        packed = []
+        used = 0
+        for passage in self.drop_duplicates(self.merge_adjacent(chunks)):
+            if len(packed) >= self.max_passages:
+                break
+            tokens = self.passage_tokens(passage)
+            if used + tokens <= self.max_tokens:
+                packed.append(passage)
+                used += tokens
+            elif not packed:
+                passage = self._truncate(passage, self.max_tokens - PASSAGE_OVERHEAD_TOKENS)
+                packed.append(passage)
+                used += self.passage_tokens(passage)
+        
+        return packed, {
+            "chunks": len(chunks),
+            "passages": len(packed),
+            "tokens_before": tokens_before,
+            "tokens_after": used,
+            "tokens_saved": tokens_before - used
+        }
+
+context_packer = ContextPacker()
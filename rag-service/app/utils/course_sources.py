@@ -0,0 +1,64 @@
+"""
+Source documents of every course, for the admin statistics
+"""
+from typing import Iterable, Set
+from app.utils.cache import cache_service
+
+class CourseSources:
+    """
+    Set of source names per course in Redis
+    
+    The vector store adds the sources of inserted points, so the admin
+    stats can count chunks per source with indexed count queries instead
+    of scrolling the whole course. Names are only a candidate list:
+    sources whose count dropped to zero are removed by the reader.
+    Lookups that fail return no sources.
+    """
+    
+    def __init__(self, redis_client=None, async_redis_client=None):
+        self.redis = redis_client
+        self.async_redis = async_redis_client
+    
+    def _key(self, course_id: int) -> str:
+        return f"course:sources:{course_id}"
+    
+    def add(self, course_id: int, sources: Iterable[str]):
+        sources = set(sources)
+        if not sources or self.redis is None:
+            return
+        try:
+            self.redis.sadd(self._key(course_id), *sources)
+        except Exception as e:
+            print(f"Course sources update error: {e}")
+    
+    async def add_async(self, course_id: int, sources: Iterable[str]):
+        sources = set(sources)
+        if not sources or self.async_redis is None:
+            return
+        try:
+            await self.async_redis.sadd(self._key(course_id), *sources)
+        except Exception as e:
+            print(f"Course sources update error: {e}")
+    
+    async def remove(self, course_id: int, sources: Iterable[str]):
+        sources = set(sources)
+        if not sources or self.async_redis is None:
+            return
+        try:
+            await self.async_redis.srem(self._key(course_id), *sources)
+        except Exception as e:
+            print(f"Course sources update error: {e}")
+    
+    async def members(self, course_id: int) -> Set[str]:
+        if self.async_redis is None:
+            return set()
+        try:
+            return set(await self.async_redis.smembers(self._key(course_id)))
+        except Exception as e:
+            print(f"Course sources lookup error: {e}")
+            return set()
+
+course_sources = CourseSources(
+    redis_client=cache_service.redis,
+    async_redis_client=cache_service.async_redis
+)
@@ -0,0 +1,106 @@
+"""
+Prometheus metrics: per-stage request latency and load gauges
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from prometheus_client import Gauge, Histogram
+
+# Sub-millisecond cache lookups up to slow generations
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Time spent in one stage of an /ask request",
+    ["endpoint", "stage", "course_id", "cache"],
+    buckets=STAGE_BUCKETS
+)
+
+IN_FLIGHT = Gauge(
+    "rag_requests_in_flight",
+    "/ask requests being processed",
+    ["endpoint"]
+)
+
+EMBEDDING_QUEUE_DEPTH = Gauge(
+    "rag_embedding_queue_depth",
+    "Texts waiting for the embedding micro-batcher"
+)
+
+_current: ContextVar[Optional["RequestTimer"]] = ContextVar("request_timer", default=None)
+
+class RequestTimer:
+    """
+    Stage durations of one request
+    
+    While active in the current context, stage() blocks anywhere in the
+    request path (endpoint, retriever, generator) add to it. finish()
+    records every stage and the total with the request's cache outcome
+    (miss, exact or semantic), which is only known once the request is
+    over. Used as a context manager it finishes on exit.
+    
+    With in_flight=False the request counts as in flight only after
+    start_flight(), so a timer that is never finished (a stream whose
+    body never runs) cannot leave the gauge raised.
+    """
+    
+    def __init__(self, endpoint: str, course_id: int, in_flight: bool = True):
+        self.endpoint = endpoint
+        self.course_id = str(course_id)
+        self.cache = "miss"
+        self.stages: Dict[str, float] = {}
+        self._start = time.perf_counter()
+        self._finished = False
+        self._in_flight = False
+        if in_flight:
+            self.start_flight()
+        self.activate()
+    
+    def start_flight(self):
+        """Count the request in the in-flight gauge until finish()"""
+        if not self._in_flight and not self._finished:
+            self._in_flight = True
+            IN_FLIGHT.labels(self.endpoint).inc()
+    
+    def activate(self) -> "RequestTimer":
+        """Collect stages of the current context (e.g. a streaming task)"""
+        _current.set(self)
+        return self
+    
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def finish(self):
+        """Record histograms; later calls do nothing"""
+        if self._finished:
+            return
+        self._finished = True
+        if self._in_flight:
+            IN_FLIGHT.labels(self.endpoint).dec()
+        self.stages["total"] = time.perf_counter() - self._start
+        for stage, seconds in self.stages.items():
+            STAGE_SECONDS.labels(self.endpoint, stage, self.course_id, self.cache).observe(seconds)
+    
+    def __enter__(self) -> "RequestTimer":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.finish()
+
+@contextmanager
+def stage(name: str):
+    """Time a block as stage name of the active request, if any"""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+def current_timer() -> Optional[RequestTimer]:
+    """Timer of the request handled in the current context, if any"""
+    return _current.get()
@@ -3,32 +3,185 @@ Document parsers for different file formats
 """
 import PyPDF2
 import docx
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Tuple
 import re
 
+WHITESPACE_RE = re.compile(r'\s+')
+SPECIAL_CHARS_RE = re.compile(r'[^\w\s\.,!?;:()\-—]')
+
+# Plain-text paragraphs longer than this are split on line boundaries
+MAX_SEGMENT_CHARS = 64 * 1024
+
+# (page number or None, text)
+Segment = Tuple[Optional[int], str]
+
+# (heading path, page number or None, text)
+Section = Tuple[Tuple[str, ...], Optional[int], str]
+
+MD_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*#*\s*$')
+MD_FENCE_RE = re.compile(r'^\s*(```|~~~)')
+# Built-in DOCX heading styles; localized Word saves "Заголовок N"
+DOCX_HEADING_RE = re.compile(r'^(?:Heading|Заголовок)\s+(\d)$')
+
 class DocumentParser:
     @staticmethod
-    def parse_pdf(file_path: str) -> str:
-        """Parse PDF file and extract text"""
-        text = ""
+    def iter_pdf_pages(file_path: str) -> Iterator[Segment]:
+        """Yield (page number, text) for each PDF page"""
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
+                for number, page in enumerate(pdf_reader.pages, start=1):
+                    yield number, page.extract_text() or ""
         except Exception as e:
             raise ValueError(f"Error parsing PDF: {str(e)}")
-        return text
     
     @staticmethod
-    def parse_docx(file_path: str) -> str:
-        """Parse DOCX file and extract text"""
+    def iter_docx_paragraphs(file_path: str) -> Iterator[Segment]:
+        """Yield (None, text) for each DOCX paragraph"""
         try:
             doc = docx.Document(file_path)
-            text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            for paragraph in doc.paragraphs:
+                yield None, paragraph.text
         except Exception as e:
             raise ValueError(f"Error parsing DOCX: {str(e)}")
-        return text
+    
+    @staticmethod
+    def iter_txt_paragraphs(file_path: str) -> Iterator[Segment]:
+        """Yield (None, text) for each blank-line separated paragraph"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                lines = []
+                size = 0
+                for line in file:
+                    if line.strip():
+                        lines.append(line)
+                        size += len(line)
+                    if lines and (not line.strip() or size >= MAX_SEGMENT_CHARS):
+                        yield None, "".join(lines)
+                        lines = []
+                        size = 0
+                if lines:
+                    yield None, "".join(lines)
+        except Exception as e:
+            raise ValueError(f"Error parsing TXT: {str(e)}")
+    
+    @classmethod
+    def iter_segments(cls, file_path: str) -> Iterator[Segment]:
+        """Yield raw text segments based on extension"""
+        if file_path.endswith('.pdf'):
+            return cls.iter_pdf_pages(file_path)
+        elif file_path.endswith('.docx'):
+            return cls.iter_docx_paragraphs(file_path)
+        elif file_path.endswith(('.txt', '.md')):
+            return cls.iter_txt_paragraphs(file_path)
+        else:
+            raise ValueError(f"Unsupported file format: {file_path}")
+    
+    @classmethod
+    def clean_segments(cls, segments: Iterable[Segment]) -> Iterator[Segment]:
+        """Clean segments one at a time, dropping empty ones"""
+        for page, text in segments:
+            text = cls.clean_text(text)
+            if text:
+                yield page, text
+    
+    @classmethod
+    def iter_clean(cls, file_path: str) -> Iterator[Segment]:
+        """Yield cleaned segments of a file without loading it whole"""
+        return cls.clean_segments(cls.iter_segments(file_path))
+    
+    @staticmethod
+    def _push_heading(headings: list, level: int, title: str) -> list:
+        """Heading stack after a heading of level: deeper and same levels close"""
+        return [(l, t) for l, t in headings if l < level] + [(level, title)]
+    
+    @classmethod
+    def iter_markdown_sections(cls, file_path: str) -> Iterator[Section]:
+        """
+        Yield (heading path, None, text) for each Markdown paragraph
+        
+        ATX headings ("#" to "######") open a section; a heading line is
+        the first segment of its own section. Lines inside fenced code
+        blocks are never headings.
+        """
+        try:
+            with open(file_path, 'r', encoding='utf-8') as file:
+                headings = []
+                lines = []
+                size = 0
+                in_fence = False
+                
+                def path():
+                    return tuple(title for _, title in headings)
+                
+                for line in file:
+                    if MD_FENCE_RE.match(line):
+                        in_fence = not in_fence
+                    match = None if in_fence else MD_HEADING_RE.match(line)
+                    
+                    if lines and (match or not line.strip() or size >= MAX_SEGMENT_CHARS):
+                        yield path(), None, "".join(lines)
+                        lines = []
+                        size = 0
+                    
+                    if match:
+                        headings = cls._push_heading(headings, len(match.group(1)), match.group(2))
+                        yield path(), None, match.group(2)
+                    elif line.strip():
+                        lines.append(line)
+                        size += len(line)
+                if lines:
+                    yield path(), None, "".join(lines)
+        except Exception as e:
+            raise ValueError(f"Error parsing Markdown: {str(e)}")
+    
+    @classmethod
+    def iter_docx_sections(cls, file_path: str) -> Iterator[Section]:
+        """Yield (heading path, None, text) for each DOCX paragraph"""
+        try:
+            doc = docx.Document(file_path)
+            headings = []
+            for paragraph in doc.paragraphs:
+                style = paragraph.style.name if paragraph.style is not None else ""
+                match = DOCX_HEADING_RE.match(style)
+                level = 0 if style == "Title" else (int(match.group(1)) if match else None)
+                if level is not None and paragraph.text.strip():
+                    headings = cls._push_heading(headings, level, paragraph.text.strip())
+                yield tuple(title for _, title in headings), None, paragraph.text
+        except Exception as e:
+            raise ValueError(f"Error parsing DOCX: {str(e)}")
+    
+    @classmethod
+    def iter_sections(cls, file_path: str) -> Iterator[Section]:
+        """
+        Yield raw segments with their heading path
+        
+        Markdown and DOCX keep their heading structure; PDF and TXT have
+        none, so every segment gets an empty path.
+        """
+        if file_path.endswith('.md'):
+            return cls.iter_markdown_sections(file_path)
+        elif file_path.endswith('.docx'):
+            return cls.iter_docx_sections(file_path)
+        return (((), page, text) for page, text in cls.iter_segments(file_path))
+    
+    @classmethod
+    def iter_clean_sections(cls, file_path: str) -> Iterator[Section]:
+        """Cleaned iter_sections: text and heading titles, empty text dropped"""
+        for headings, page, text in cls.iter_sections(file_path):
+            text = cls.clean_text(text)
+            if text:
+                yield tuple(filter(None, map(cls.clean_text, headings))), page, text
+    
+    @classmethod
+    def parse_pdf(cls, file_path: str) -> str:
+        """Parse PDF file and extract text"""
+        return "\n".join(text for _, text in cls.iter_pdf_pages(file_path))
+    
+    @classmethod
+    def parse_docx(cls, file_path: str) -> str:
+        """Parse DOCX file and extract text"""
+        return "\n".join(text for _, text in cls.iter_docx_paragraphs(file_path))
     
     @staticmethod
     def parse_txt(file_path: str) -> str:
@@ -44,9 +197,9 @@ class DocumentParser:
     def clean_text(text: str) -> str:
         """Clean and normalize text"""
         # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = WHITESPACE_RE.sub(' ', text)
         # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s\.,!?;:()\-—]', '', text)
+        text = SPECIAL_CHARS_RE.sub('', text)
         # Strip leading/trailing whitespace
         text = text.strip()
         return text
@@ -54,14 +207,5 @@ class DocumentParser:
     @classmethod
     def parse(cls, file_path: str) -> str:
         """Parse file based on extension"""
-        if file_path.endswith('.pdf'):
-            text = cls.parse_pdf(file_path)
-        elif file_path.endswith('.docx'):
-            text = cls.parse_docx(file_path)
-        elif file_path.endswith('.txt'):
-            text = cls.parse_txt(file_path)
-        else:
-            raise ValueError(f"Unsupported file format: {file_path}")
-        
-        return cls.clean_text(text)
+        return " ".join(text for _, text in cls.iter_clean(file_path))
 
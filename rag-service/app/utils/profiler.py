@@ -0,0 +1,366 @@
+"""
+Sampling profiler for slow or randomly picked requests
+
+A background thread samples the asyncio tasks of profiled requests every
+PROFILING_INTERVAL_MS: the running task from its live frames, suspended
+tasks from their await chains, so time spent waiting on YandexGPT or the
+vector store shows up where it was awaited. Tasks created while a request
+is handled (gather, streaming responses) count as part of it. Sample
+weights are wall-clock microseconds split between the request's tasks.
+
+Profiles are written as speedscope JSON or collapsed stacks (flamegraph.pl,
+speedscope) with a metadata file holding request ID, course, status and
+stage timings, in PROFILING_DIR, keeping the newest PROFILING_MAX_FILES.
+"""
+import asyncio
+import gc
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from app.config import settings
+from app.utils.metrics import current_timer
+
+# Never profiled: probes, scrapes and profile downloads
+EXCLUDED_PATHS = ("/health", "/metrics", "/admin/profiles")
+
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+$')
+
+_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+class ProfileSession:
+    """Samples of one request"""
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        self.loop = loop
+        self.thread_id = threading.get_ident()
+        self.tasks = weakref.WeakSet([task])
+        self.samples: Counter = Counter()  # stack tuple -> microseconds
+
+def _coroutine_frame(obj):
+    for attr in ("cr_frame", "ag_frame", "gi_frame"):
+        frame = getattr(obj, attr, None)
+        if frame is not None:
+            return frame
+    return None
+
+def _awaited(obj):
+    for attr in ("cr_await", "ag_await", "gi_yieldfrom"):
+        awaited = getattr(obj, attr, None)
+        if awaited is not None:
+            return awaited
+    return None
+
+def _async_gen(obj):
+    """Async generator behind an "async for" step (not exposed as attribute)"""
+    for referent in gc.get_referents(obj):
+        if hasattr(referent, "ag_frame"):
+            return referent
+    return None
+
+def _await_stack(task: asyncio.Task) -> tuple:
+    """Code objects along a suspended task's await chain, outermost first"""
+    stack = []
+    obj = task.get_coro()
+    while obj is not None:
+        frame = _coroutine_frame(obj)
+        if frame is None:
+            if type(obj).__name__.startswith("async_generator_"):
+                obj = _async_gen(obj)
+                continue
+            stack.append(f"<await {type(obj).__name__}>")
+            break
+        stack.append(frame.f_code)
+        obj = _awaited(obj)
+    return tuple(stack)
+
+def _running_stack(frame, task: asyncio.Task) -> tuple:
+    """Code objects of the running task, without event loop frames"""
+    root = _coroutine_frame(task.get_coro())
+    stack = []
+    while frame is not None:
+        stack.append(frame.f_code)
+        if frame is root:
+            break
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+class RequestProfiler:
+    """Background stack sampler for the sessions of profiled requests"""
+    
+    def __init__(self, interval_ms: float = None):
+        self.interval = (interval_ms or settings.PROFILING_INTERVAL_MS) / 1000
+        self._sessions: List[ProfileSession] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._loops = weakref.WeakSet()
+    
+    def _install_task_factory(self, loop: asyncio.AbstractEventLoop):
+        """Make tasks created inside a profiled request part of its session"""
+        if loop in self._loops:
+            return
+        self._loops.add(loop)
+        previous = loop.get_task_factory()
+        
+        def factory(loop, coro, **kwargs):
+            if previous is not None:
+                task = previous(loop, coro, **kwargs)
+            else:
+                task = asyncio.Task(coro, loop=loop, **kwargs)
+            session = _session.get()
+            if session is not None:
+                with self._lock:
+                    session.tasks.add(task)
+            return task
+        
+        loop.set_task_factory(factory)
+    
+    def start(self) -> ProfileSession:
+        """Profile the current task and tasks it creates until stop()"""
+        loop = asyncio.get_running_loop()
+        self._install_task_factory(loop)
+        session = ProfileSession(loop, asyncio.current_task())
+        _session.set(session)
+        with self._lock:
+            self._sessions.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return session
+    
+    def stop(self, session: ProfileSession):
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+            if not self._sessions:
+                self._wake.clear()
+    
+    def _run(self):
+        last = time.perf_counter()
+        while True:
+            if not self._wake.is_set():
+                self._wake.wait()
+                last = time.perf_counter()
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            self._sample((now - last) * 1e6)
+            last = now
+    
+    def _sample(self, elapsed_us: float):
+        # Held throughout, so stop() returns only after the last sample
+        with self._lock:
+            if not self._sessions:
+                return
+            frames = sys._current_frames()
+            for session in self._sessions:
+                self._sample_session(session, frames.get(session.thread_id), elapsed_us)
+    
+    @staticmethod
+    def _sample_session(session: ProfileSession, frame, elapsed_us: float):
+        tasks = [task for task in session.tasks if not task.done()]
+        if not tasks:
+            return
+        running = asyncio.current_task(session.loop)
+        weight = elapsed_us / len(tasks)
+        for task in tasks:
+            try:
+                if task is running:
+                    stack = _running_stack(frame, task)
+                else:
+                    stack = _await_stack(task)
+            except Exception:
+                # The loop thread moved on while we were reading
+                continue
+            session.samples[stack] += weight
+
+def _frame_info(item) -> Dict:
+    if isinstance(item, str):
+        return {"name": item}
+    path = item.co_filename
+    for marker in ("site-packages" + os.sep, os.path.dirname(os.__file__) + os.sep, os.getcwd() + os.sep):
+        if marker in path:
+            path = path.split(marker, 1)[1]
+            break
+    # co_qualname is new in Python 3.11
+    name = getattr(item, "co_qualname", item.co_name)
+    return {"name": f"{name} ({path}:{item.co_firstlineno})", "file": path, "line": item.co_firstlineno}
+
+def to_collapsed(samples: Counter) -> str:
+    """Collapsed stacks: "outer;inner microseconds" per line"""
+    lines = []
+    for stack, weight in samples.most_common():
+        if stack and round(weight):
+            lines.append(";".join(_frame_info(item)["name"] for item in stack) + f" {round(weight)}")
+    return "\n".join(lines) + "\n"
+
+def to_speedscope(samples: Counter, name: str) -> Dict:
+    """Speedscope sampled profile in microseconds"""
+    frames, index, stacks, weights = [], {}, [], []
+    for stack, weight in samples.most_common():
+        if not stack:
+            continue
+        for item in stack:
+            if item not in index:
+                index[item] = len(frames)
+                frames.append(_frame_info(item))
+        stacks.append([index[item] for item in stack])
+        weights.append(round(weight))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "microseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": stacks,
+            "weights": weights
+        }],
+        "name": name,
+        "activeProfileIndex": 0,
+        "exporter": "rag-service"
+    }
+
+class ProfileStore:
+    """Rotating directory of profiles and their metadata"""
+    
+    EXTENSIONS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed"}
+    
+    def __init__(self, path: str = None, max_files: int = None, fmt: str = None):
+        self.path = path or settings.PROFILING_DIR
+        self.max_files = max_files or settings.PROFILING_MAX_FILES
+        self.format = fmt or settings.PROFILING_FORMAT
+        if self.format not in self.EXTENSIONS:
+            raise ValueError(f"Unknown profile format: {self.format}")
+    
+    def save(self, samples: Counter, meta: Dict) -> str:
+        """Write profile and metadata, drop the oldest over max_files; returns file name"""
+        os.makedirs(self.path, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        request_id = re.sub(r'[^\w-]', "_", meta["request_id"])[:64]
+        name = f"{stamp}_{request_id}{self.EXTENSIONS[self.format]}"
+        
+        if self.format == "speedscope":
+            title = f"{meta['method']} {meta['path']} {meta['request_id']}"
+            content = json.dumps(to_speedscope(samples, title), ensure_ascii=False)
+        else:
+            content = to_collapsed(samples)
+        with open(os.path.join(self.path, name), "w", encoding="utf-8") as f:
+            f.write(content)
+        with open(os.path.join(self.path, f"{stamp}_{request_id}.meta.json"), "w", encoding="utf-8") as f:
+            json.dump({**meta, "file": name}, f, ensure_ascii=False)
+        
+        self._rotate()
+        return name
+    
+    def _meta_files(self) -> List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if name.endswith(".meta.json"))
+    
+    def _rotate(self):
+        meta_files = self._meta_files()
+        for meta_name in meta_files[:max(0, len(meta_files) - self.max_files)]:
+            prefix = meta_name[:-len(".meta.json")]
+            for name in os.listdir(self.path):
+                if name.startswith(prefix):
+                    os.unlink(os.path.join(self.path, name))
+    
+    def list(self) -> List[Dict]:
+        """Metadata of stored profiles, newest first"""
+        profiles = []
+        for meta_name in reversed(self._meta_files()):
+            try:
+                with open(os.path.join(self.path, meta_name), encoding="utf-8") as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return profiles
+    
+    def file_path(self, name: str) -> Optional[str]:
+        """Path of a stored profile file, None if there is no such file"""
+        if not PROFILE_NAME_RE.match(name) or name.endswith(".meta.json"):
+            return None
+        path = os.path.join(self.path, name)
+        return path if os.path.isfile(path) else None
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling a PROFILING_SAMPLE_RATE share of requests
+    and keeping profiles of requests slower than PROFILING_SLOW_MS
+    
+    With a slow threshold every request is sampled and profiles of fast
+    ones are discarded. Responses of profiled requests carry X-Request-ID
+    (taken from the request header when present).
+    """
+    
+    def __init__(self, app, profiler: RequestProfiler = None, store: ProfileStore = None):
+        self.app = app
+        self.profiler = profiler or request_profiler
+        self.store = store or profile_store
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PATHS):
+            await self.app(scope, receive, send)
+            return
+        
+        sampled = random.random() < settings.PROFILING_SAMPLE_RATE
+        if not sampled and not settings.PROFILING_SLOW_MS:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or uuid.uuid4().hex
+        response = {"status": None}
+        
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+        
+        start_time = time.perf_counter()
+        session = self.profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.profiler.stop(session)
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            slow = bool(settings.PROFILING_SLOW_MS) and duration_ms >= settings.PROFILING_SLOW_MS
+            if (sampled or slow) and session.samples:
+                await self._save(session, scope, request_id, response["status"], duration_ms, "slow" if slow else "sampled")
+    
+    async def _save(self, session: ProfileSession, scope, request_id: str, status: int, duration_ms: float, reason: str):
+        # The endpoint's RequestTimer is visible here: same task and context
+        timer = current_timer()
+        meta = {
+            "request_id": request_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "reason": reason,
+            "duration_ms": round(duration_ms, 1),
+            "course_id": int(timer.course_id) if timer else None,
+            "cache": timer.cache if timer else None,
+            "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timer.stages.items()} if timer else {},
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        try:
+            await asyncio.to_thread(self.store.save, session.samples, meta)
+        except Exception as e:
+            print(f"Profile save error: {e}")
+
+request_profiler = RequestProfiler()
+profile_store = ProfileStore()
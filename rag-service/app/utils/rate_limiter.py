@@ -2,63 +2,175 @@
 Rate limiting middleware using Redis
 """
 from fastapi import HTTPException, Request
-from redis import Redis
+from redis.asyncio import ConnectionPool, Redis
 from app.config import settings
-import time
+from typing import Tuple
+import uuid
+
+# Each script does the whole check in one atomic round trip and uses the
+# Redis server clock, so API workers with skewed clocks agree.
+# All return {allowed, retry_after_ms}.
+
+# Exact sliding log: one ZSET member per request, O(limit) memory per key
+SLIDING_LOG_SCRIPT = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, math.max(0, tonumber(oldest[2]) + window - now)}
+end
+
+redis.call('ZADD', KEYS[1], now, ARGV[3])
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+"""
+
+# Sliding window counter: previous and current fixed-window counts
+# weighted by overlap, O(1) memory per key
+SLIDING_WINDOW_SCRIPT = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local current = math.floor(now / window)
+
+local data = redis.call('HMGET', KEYS[1], 'w', 'c', 'p')
+local w = tonumber(data[1])
+local count = tonumber(data[2]) or 0
+local previous = tonumber(data[3]) or 0
+if w == nil or w < current - 1 then
+    count = 0
+    previous = 0
+elseif w == current - 1 then
+    previous = count
+    count = 0
+end
+
+local elapsed = (now % window) / window
+local allowed = previous * (1 - elapsed) + count < limit
+if allowed then
+    count = count + 1
+end
+
+redis.call('HSET', KEYS[1], 'w', current, 'c', count, 'p', previous)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+if allowed then
+    return {1, 0}
+end
+return {0, window - (now % window)}
+"""
+
+# GCRA: single theoretical arrival time per key, O(1) memory,
+# allows bursts up to the full limit
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local interval = window / limit
+
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+
+local new_tat = tat + interval
+if new_tat - now > window then
+    return {0, math.ceil(new_tat - now - window)}
+end
+
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, 0}
+"""
+
+SCRIPTS = {
+    "sliding_log": SLIDING_LOG_SCRIPT,
+    "sliding_window": SLIDING_WINDOW_SCRIPT,
+    "gcra": GCRA_SCRIPT
+}
 
 class RateLimiter:
-    def __init__(self):
-        self.redis = Redis(
+    def __init__(self, mode: str = None):
+        self.mode = mode or settings.RATE_LIMIT_MODE
+        if self.mode not in SCRIPTS:
+            raise ValueError(f"Unknown rate limit mode: {self.mode}")
+        
+        self.pool = ConnectionPool(
             host=getattr(settings, 'REDIS_HOST', 'localhost'),
             port=getattr(settings, 'REDIS_PORT', 6379),
             db=0,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
             decode_responses=True
         )
-        self.max_requests = 10  # requests per window
+        self.redis = Redis(connection_pool=self.pool)
+        self.script = self.redis.register_script(SCRIPTS[self.mode])
+        self.max_requests = settings.RATE_LIMIT_PER_MINUTE  # requests per window
+        self.course_max_requests = settings.RATE_LIMIT_COURSE_PER_MINUTE
         self.window_seconds = 60  # time window
     
-    def check_rate_limit(self, key: str) -> bool:
-        """Check if request is within rate limit"""
+    async def check(self, key: str, max_requests: int = None) -> Tuple[bool, int]:
+        """
+        Check and count request in one round trip
+        
+        Returns: (allowed, retry_after_ms)
+        """
         try:
-            current = int(time.time())
-            window_start = current - self.window_seconds
-            
-            # Remove old entries
-            self.redis.zremrangebyscore(key, 0, window_start)
-            
-            # Count requests in current window
-            request_count = self.redis.zcard(key)
-            
-            if request_count >= self.max_requests:
-                return False
-            
-            # Add current request
-            self.redis.zadd(key, {str(current): current})
-            self.redis.expire(key, self.window_seconds)
-            
-            return True
+            allowed, retry_after_ms = await self.script(
+                keys=[key],
+                args=[
+                    max_requests or self.max_requests,
+                    self.window_seconds * 1000,
+                    uuid.uuid4().hex
+                ]
+            )
+            return bool(allowed), int(retry_after_ms)
         except Exception as e:
             # If Redis fails, allow request
             print(f"Rate limit check failed: {e}")
-            return True
+            return True, 0
+    
+    async def check_rate_limit(self, key: str, max_requests: int = None) -> bool:
+        """Check if request is within rate limit"""
+        allowed, _ = await self.check(key, max_requests)
+        return allowed
     
     def get_user_key(self, user_id: int) -> str:
         """Get rate limit key for user"""
-        return f"ratelimit:user:{user_id}"
+        return f"ratelimit:{self.mode}:user:{user_id}"
     
     def get_course_key(self, course_id: int) -> str:
         """Get rate limit key for course"""
-        return f"ratelimit:course:{course_id}"
+        return f"ratelimit:{self.mode}:course:{course_id}"
+    
+    async def close(self):
+        """Close connection pool"""
+        await self.pool.disconnect()
 
 rate_limiter = RateLimiter()
 
+def _too_many_requests(retry_after_ms: int) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests. Please try again later.",
+        headers={"Retry-After": str(max(1, -(-retry_after_ms // 1000)))}
+    )
+
 async def rate_limit_user(request: Request, user_id: int):
     """Rate limit middleware for user"""
     key = rate_limiter.get_user_key(user_id)
+    allowed, retry_after_ms = await rate_limiter.check(key)
     
-    if not rate_limiter.check_rate_limit(key):
-        raise HTTPException(
-            status_code=429,
-            detail="Too many requests. Please try again later."
-        )
+    if not allowed:
+        raise _too_many_requests(retry_after_ms)
 
+async def rate_limit_course(request: Request, course_id: int):
+    """Rate limit middleware for course"""
+    key = rate_limiter.get_course_key(course_id)
+    allowed, retry_after_ms = await rate_limiter.check(key, rate_limiter.course_max_requests)
+    
+    if not allowed:
+        raise _too_many_requests(retry_after_ms)
@@ -0,0 +1,188 @@
+"""
+Semantic answer cache keyed by question embedding similarity
+"""
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from app.config import settings
+from app.utils.cache import cache_service
+
+class _CourseEntries:
+    """Cached questions of one course: embedding matrix + LRU order"""
+    
+    def __init__(self, dimension: int, capacity: int):
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self.slots: "OrderedDict[int, Dict]" = OrderedDict()  # slot -> entry, LRU first
+        self.free = list(range(capacity - 1, -1, -1))
+        self.generation = None
+
+class SemanticCache:
+    """
+    Per-course cache of answers looked up by nearest cached question
+    
+    Vectors live in process memory (cosine over a small matrix costs well
+    under a millisecond). Reindexing bumps a per-course generation counter
+    in Redis, so every API process drops stale answers, including after
+    indexing from the CLI. The counter is read at most once per
+    SEMANTIC_CACHE_GENERATION_TTL seconds per course, keeping Redis off
+    the request path; other processes see a reindex that much later.
+    """
+    
+    def __init__(
+        self,
+        redis_client=None,
+        threshold: float = None,
+        max_entries: int = None,
+        ttl: int = None
+    ):
+        self.redis = redis_client
+        self.threshold = threshold if threshold is not None else settings.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl = ttl or settings.SEMANTIC_CACHE_TTL
+        self.generation_ttl = settings.SEMANTIC_CACHE_GENERATION_TTL
+        self._courses: Dict[int, _CourseEntries] = {}
+        self._generations: Dict[int, tuple] = {}  # course_id -> (generation, read at)
+        
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.hit_similarity_sum = 0.0
+        self.similarity_buckets = {"<0.80": 0, "0.80-0.90": 0, "0.90-0.95": 0, "0.95-0.98": 0, ">=0.98": 0}
+    
+    def _generation_key(self, course_id: int) -> str:
+        return f"semcache:generation:{course_id}"
+    
+    def _get_generation(self, course_id: int):
+        if self.redis is None:
+            return None
+        now = time.monotonic()
+        cached = self._generations.get(course_id)
+        if cached is not None and now - cached[1] < self.generation_ttl:
+            return cached[0]
+        try:
+            generation = self.redis.get(self._generation_key(course_id))
+        except Exception as e:
+            print(f"Semantic cache generation error: {e}")
+            return None
+        self._generations[course_id] = (generation, now)
+        return generation
+    
+    def _course(self, course_id: int, dimension: int) -> _CourseEntries:
+        """Get course entries, dropping them if the course was reindexed"""
+        generation = self._get_generation(course_id)
+        entries = self._courses.get(course_id)
+        if entries is not None and (
+            entries.vectors.shape[1] != dimension
+            or (generation is not None and generation != entries.generation)
+        ):
+            entries = None
+        if entries is None:
+            entries = _CourseEntries(dimension, self.max_entries)
+            entries.generation = generation
+            self._courses[course_id] = entries
+        return entries
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def _record_similarity(self, similarity: float):
+        if similarity < 0.80:
+            bucket = "<0.80"
+        elif similarity < 0.90:
+            bucket = "0.80-0.90"
+        elif similarity < 0.95:
+            bucket = "0.90-0.95"
+        elif similarity < 0.98:
+            bucket = "0.95-0.98"
+        else:
+            bucket = ">=0.98"
+        self.similarity_buckets[bucket] += 1
+    
+    def _remove(self, entries: _CourseEntries, slot: int):
+        entries.slots.pop(slot, None)
+        entries.free.append(slot)
+    
+    def get(self, embedding: List[float], course_id: int) -> Optional[Dict]:
+        """Get answer of the most similar cached question above threshold"""
+        query = self._normalize(embedding)
+        entries = self._course(course_id, len(query))
+        
+        # Drop expired entries (oldest access first)
+        now = time.time()
+        for slot in [s for s, e in entries.slots.items() if e["expires_at"] <= now]:
+            self._remove(entries, slot)
+        
+        if not entries.slots:
+            self.misses += 1
+            return None
+        
+        slots = np.fromiter(entries.slots.keys(), dtype=np.int64, count=len(entries.slots))
+        similarities = entries.vectors[slots] @ query
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        self._record_similarity(similarity)
+        
+        if similarity < self.threshold:
+            self.misses += 1
+            return None
+        
+        slot = int(slots[best])
+        entries.slots.move_to_end(slot)
+        self.hits += 1
+        self.hit_similarity_sum += similarity
+        return entries.slots[slot]["answer"]
+    
+    def set(self, embedding: List[float], course_id: int, question: str, answer: Dict):
+        """Cache answer under question embedding"""
+        vector = self._normalize(embedding)
+        entries = self._course(course_id, len(vector))
+        
+        if not entries.free:
+            # Evict least recently used
+            slot, _ = entries.slots.popitem(last=False)
+            entries.free.append(slot)
+            self.evictions += 1
+        
+        slot = entries.free.pop()
+        entries.vectors[slot] = vector
+        entries.slots[slot] = {
+            "question": question,
+            "answer": answer,
+            "expires_at": time.time() + self.ttl
+        }
+    
+    def invalidate_course(self, course_id: int):
+        """Drop cached answers of course in every process"""
+        self._courses.pop(course_id, None)
+        self._generations.pop(course_id, None)
+        self.invalidations += 1
+        if self.redis is not None:
+            try:
+                self.redis.incr(self._generation_key(course_id))
+            except Exception as e:
+                print(f"Semantic cache invalidate error: {e}")
+    
+    def stats(self) -> Dict:
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.SEMANTIC_CACHE_ENABLED,
+            "threshold": self.threshold,
+            "courses": len(self._courses),
+            "entries": sum(len(e.slots) for e in self._courses.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            "avg_hit_similarity": round(self.hit_similarity_sum / self.hits, 4) if self.hits else 0,
+            "best_similarity_buckets": dict(self.similarity_buckets),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+semantic_cache = SemanticCache(redis_client=cache_service.redis)
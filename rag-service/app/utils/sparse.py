@@ -0,0 +1,133 @@
+"""
+Sparse lexical (BM25-style) vectors and rank fusion for hybrid retrieval
+"""
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Tuple
+from app.config import settings
+
+# Named sparse vector stored next to the default (unnamed) dense vector
+SPARSE_VECTOR_NAME = "text-sparse"
+
+# Words joined by - . _ / : stay one token too (API names, error codes)
+TOKEN_PATTERN = re.compile(r"\w+(?:[\-\./:]\w+)*")
+
+STOPWORDS = frozenset("""
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до
+его ее если есть еще же за здесь и из или им их к как какой когда кто ли либо мне может мы на над
+надо наш не него нее нет ни них но ну о об однако он она они оно от очень по под при с со так также
+такой такое такая такие там те тем то того тоже той только том ты у уже хотя чего чей чем что чтобы
+чье эта эти это этот я который которая которое которые можно нужно является между после через себя
+a about an and are as at be been but by can do does for from has have how i if in into is it its
+of on or so than that the their then there these they this to was were what when where which who
+why will with you your
+""".split())
+
+# Common Russian inflection endings, longest first
+RU_ENDINGS = sorted("""
+ами ями ого его ому ему ыми ими ых их ой ей ий ый ая яя ое ее ые ие ую юю ам ям ах ях ом ем ов ев
+ия ию ии ью ья ье а я о е ы и у ю ь
+""".split(), key=len, reverse=True)
+
+CYRILLIC = re.compile(r"^[а-я]+$")
+LATIN = re.compile(r"^[a-z]+$")
+
+def normalize_token(token: str) -> str:
+    """Light stemming: strip Russian case endings and English plural"""
+    if CYRILLIC.match(token) and len(token) > 3:
+        for ending in RU_ENDINGS:
+            if token.endswith(ending) and len(token) - len(ending) >= 3:
+                return token[:-len(ending)]
+    elif LATIN.match(token) and len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    # Identifiers and codes are kept verbatim
+    return token
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase Russian/English tokens without stopwords"""
+    text = text.lower().replace("ё", "е")
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if token in STOPWORDS or len(token) < 2 and not token.isdigit():
+            continue
+        tokens.append(normalize_token(token))
+        # Also index parts of compound identifiers (top_k -> top, k)
+        if any(sep in token for sep in "-./:_"):
+            tokens.extend(
+                normalize_token(part)
+                for part in re.split(r"[\-\./:_]+", token)
+                if part and part not in STOPWORDS
+            )
+    return tokens
+
+def term_index(term: str) -> int:
+    """Stable term id (same across processes and restarts)"""
+    return zlib.crc32(term.encode("utf-8")) & 0x7FFFFFFF
+
+def bm25_idf(docs: int, df: int) -> float:
+    """BM25 inverse document frequency of a term in docs chunks"""
+    return math.log(1 + (docs - df + 0.5) / (df + 0.5))
+
+class SparseEncoder:
+    """
+    BM25 weighting split between index and query time
+    
+    Documents store the saturated, length-normalized term frequency; the
+    query carries the IDF of each term. Qdrant scores the dot product.
+    Both come from per-course corpus statistics (see sparse_stats); until
+    a course has any, documents are normalized by avg_doc_length and query
+    terms weigh 1.0.
+    """
+    
+    def __init__(self, k1: float = None, b: float = None, avg_doc_length: float = None):
+        self.k1 = k1 if k1 is not None else settings.SPARSE_BM25_K1
+        self.b = b if b is not None else settings.SPARSE_BM25_B
+        self.avg_doc_length = avg_doc_length or settings.SPARSE_AVG_DOC_LENGTH
+    
+    @staticmethod
+    def _to_sparse(weights: Dict[int, float]) -> Tuple[List[int], List[float]]:
+        indices = sorted(weights)
+        return indices, [weights[i] for i in indices]
+    
+    def encode_document(self, text: str, avg_doc_length: Optional[float] = None) -> Tuple[List[int], List[float]]:
+        """Sparse vector for indexed chunk: (indices, values); avg_doc_length of its course"""
+        tokens = tokenize(text)
+        length_norm = 1 - self.b + self.b * len(tokens) / (avg_doc_length or self.avg_doc_length)
+        weights: Dict[int, float] = {}
+        for term, tf in Counter(tokens).items():
+            index = term_index(term)
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        return self._to_sparse(weights)
+    
+    @staticmethod
+    def query_indices(text: str) -> List[int]:
+        """Sparse indices of query terms"""
+        return sorted({term_index(term) for term in tokenize(text)})
+    
+    def encode_query(self, text: str, idf: Optional[Dict[int, float]] = None) -> Tuple[List[int], List[float]]:
+        """Sparse vector for query: (indices, values); idf by term index of the course"""
+        idf = idf or {}
+        return self._to_sparse({index: idf.get(index, 1.0) for index in self.query_indices(text)})
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = None) -> List[Tuple[Hashable, float]]:
+    """
+    Fuse ranked id lists: score(id) = sum 1 / (k + rank)
+    
+    Returns: (id, score) sorted by score, score scaled to 0..1
+    """
+    k = k or settings.RRF_K
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, 1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    
+    best_possible = len(rankings) / (k + 1)
+    return sorted(
+        ((item_id, score / best_possible) for item_id, score in scores.items()),
+        key=lambda item: item[1],
+        reverse=True
+    )
+
+sparse_encoder = SparseEncoder()
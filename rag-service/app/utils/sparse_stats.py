@@ -0,0 +1,123 @@
+"""
+Per-course corpus statistics for BM25 sparse vectors
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from app.utils.cache import cache_service
+from app.utils.sparse import bm25_idf, term_index, tokenize
+
+class CourseTermStats:
+    """Chunk count, total tokens and document frequency per term index"""
+    
+    def __init__(self):
+        self.docs = 0
+        self.tokens = 0
+        self.df: Counter = Counter()
+    
+    def add(self, text: str):
+        tokens = tokenize(text)
+        self.docs += 1
+        self.tokens += len(tokens)
+        self.df.update({term_index(term) for term in tokens})
+    
+    @property
+    def avg_doc_length(self) -> Optional[float]:
+        return self.tokens / self.docs if self.docs else None
+
+class SparseStats:
+    """
+    BM25 statistics of every course in Redis, shared by all processes
+    
+    One hash per course holds docs, tokens, the avgdl the stored sparse
+    vectors were last re-encoded with (encoded_avgdl) and the document
+    frequency of each term index. The vector store updates it when points
+    are added or deleted; migrate recounts it from stored content.
+    Lookups that fail fall back to no statistics.
+    """
+    
+    def __init__(self, redis_client=None, async_redis_client=None):
+        self.redis = redis_client
+        self.async_redis = async_redis_client
+    
+    def _key(self, course_id: int) -> str:
+        return f"sparse:stats:{course_id}"
+    
+    def add(self, course_id: int, texts: Iterable[str], sign: int = 1):
+        """Count chunks texts in (sign=-1: out of) the course statistics"""
+        batch = CourseTermStats()
+        for text in texts:
+            batch.add(text)
+        if not batch.docs or self.redis is None:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            key = self._key(course_id)
+            pipe.hincrby(key, "docs", sign * batch.docs)
+            pipe.hincrby(key, "tokens", sign * batch.tokens)
+            for index, df in batch.df.items():
+                pipe.hincrby(key, str(index), sign * df)
+            pipe.execute()
+        except Exception as e:
+            print(f"Sparse stats update error: {e}")
+    
+    def replace(self, course_id: int, stats: CourseTermStats, encoded_avgdl: Optional[float] = None):
+        """Overwrite course statistics with a full recount"""
+        if self.redis is None:
+            return
+        mapping = {"docs": stats.docs, "tokens": stats.tokens}
+        if encoded_avgdl is not None:
+            mapping["encoded_avgdl"] = encoded_avgdl
+        mapping.update({str(index): df for index, df in stats.df.items()})
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(self._key(course_id))
+            pipe.hset(self._key(course_id), mapping=mapping)
+            pipe.execute()
+        except Exception as e:
+            print(f"Sparse stats update error: {e}")
+    
+    def avg_doc_length(self, course_id: int) -> Optional[float]:
+        """Average tokens per chunk of course; None without statistics"""
+        if self.redis is None:
+            return None
+        try:
+            docs, tokens = self.redis.hmget(self._key(course_id), ["docs", "tokens"])
+        except Exception as e:
+            print(f"Sparse stats lookup error: {e}")
+            return None
+        if not docs or int(docs) <= 0:
+            return None
+        return int(tokens) / int(docs)
+    
+    def encoded_avg_doc_length(self, course_id: int) -> Optional[float]:
+        """avgdl the course vectors were last re-encoded with"""
+        if self.redis is None:
+            return None
+        try:
+            value = self.redis.hget(self._key(course_id), "encoded_avgdl")
+        except Exception as e:
+            print(f"Sparse stats lookup error: {e}")
+            return None
+        return float(value) if value else None
+    
+    async def query_idf(self, course_id: int, indices: List[int]) -> Dict[int, float]:
+        """IDF of query term indices in course (one round trip); {} without statistics"""
+        if self.async_redis is None or not indices:
+            return {}
+        try:
+            values = await self.async_redis.hmget(self._key(course_id), ["docs"] + [str(i) for i in indices])
+        except Exception as e:
+            print(f"Sparse stats lookup error: {e}")
+            return {}
+        docs = int(values[0] or 0)
+        if docs <= 0:
+            return {}
+        return {
+            index: bm25_idf(docs, min(max(int(df or 0), 0), docs))
+            for index, df in zip(indices, values[1:])
+        }
+
+sparse_stats = SparseStats(
+    redis_client=cache_service.redis,
+    async_redis_client=cache_service.async_redis
+)
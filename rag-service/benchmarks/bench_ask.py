@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of /ask: latency percentiles, RPS and cache hit rate
+
+By default the API runs in this process on uvicorn with local stand-ins:
+YandexGPT is a fake transport with configurable latency and streaming,
+Redis is an in-memory dict, Qdrant is the embedded local vector store
+filled with course materials, and request logs are discarded instead of
+written to PostgreSQL. Rate limiting is switched off. With --url the
+load goes to a running server instead (cache hits are then unknown).
+
+Questions are synthetic (built from material headings, --repeat-ratio of
+them repeat earlier ones) or replayed from a JSONL file with question and
+optional course_id, user_id, module, section per line. Load is closed-loop
+(--concurrency clients back to back) or open-loop (--rps arrivals; latency
+is measured from the scheduled start, so queueing delay is included).
+
+Usage: python benchmarks/bench_ask.py [--requests 200] [--concurrency 8]
+       [--rps 0] [--stream] [--questions log.jsonl] [--repeat-ratio 0.3]
+       [--embedder hash|model] [--llm-latency-ms 800] [--llm-token-ms 20]
+       [--url http://host:8000] [--output results.json] [--compare old.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from benchmarks.common import DEFAULT_MATERIALS, list_documents, percentile, write_json
+
+HEADING_RE = re.compile(r'^#{1,4}\s+(.+?)\s*#*\s*$', re.MULTILINE)
+
+TEMPLATES = [
+    "Что такое {topic}?",
+    "Объясни, {topic} — это что?",
+    "Расскажи подробнее про {topic}",
+    "Как на практике применяется {topic}?"
+]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="/ask load test")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    parser.add_argument("--rps", type=float, default=0, help="open-loop arrival rate (overrides --concurrency)")
+    parser.add_argument("--stream", action="store_true", help="use /ask/stream and record time to first token")
+    parser.add_argument("--questions", default="", help="JSONL question log to replay")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="synthetic: share of repeated questions")
+    parser.add_argument("--course-id", type=int, default=1)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--url", default="", help="running API instead of in-process stand-ins")
+    parser.add_argument("--token", default="", help="API token (default: settings.API_TOKEN)")
+    parser.add_argument("--materials", default=DEFAULT_MATERIALS)
+    parser.add_argument("--embedder", choices=["hash", "model"], default="hash")
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--llm-token-ms", type=float, default=20)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--output", default="")
+    parser.add_argument("--compare", default="", help="earlier results JSON to diff against")
+    return parser.parse_args()
+
+def synthetic_questions(materials: str, count: int, repeat_ratio: float, rng: random.Random) -> list:
+    """Questions about material headings; repeats reuse earlier questions verbatim"""
+    topics = []
+    for file_path in list_documents(materials):
+        with open(file_path, encoding="utf-8", errors="ignore") as f:
+            topics.extend(heading for heading in HEADING_RE.findall(f.read()) if len(heading) > 3)
+    topics = sorted(set(topics)) or ["RAG", "векторный поиск", "эмбеддинги", "YandexGPT"]
+    rng.shuffle(topics)
+    
+    questions = []
+    for i in range(count):
+        if questions and rng.random() < repeat_ratio:
+            questions.append(dict(rng.choice(questions)))
+            continue
+        template = TEMPLATES[(i // len(topics)) % len(TEMPLATES)]
+        questions.append({"question": template.format(topic=topics[i % len(topics)])})
+    return questions
+
+def load_questions(path: str, count: int) -> list:
+    """Question log records, cycled to count"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("question"):
+                records.append({
+                    key: record[key]
+                    for key in ("question", "course_id", "user_id", "module", "section")
+                    if record.get(key) is not None
+                })
+    if not records:
+        raise SystemExit(f"❌ No questions in {path}")
+    return [dict(records[i % len(records)]) for i in range(count)]
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class StandinServer:
+    """The API in this process on uvicorn, with external services replaced"""
+    
+    def __init__(self, args):
+        self.args = args
+        self.tmp = tempfile.TemporaryDirectory()
+        import structlog
+        from app.config import settings
+        # Services copy settings when created, so set them before importing
+        settings.VECTOR_STORE_BACKEND = "local"
+        settings.VECTOR_STORE_PATH = self.tmp.name
+        settings.YANDEX_API_KEY = "standin"
+        settings.YANDEX_FOLDER_ID = "standin"
+        
+        from benchmarks.standins import HashEmbeddingBackend
+        if args.embedder == "hash":
+            import app.services.embedding_backends as embedding_backends
+            embedding_backends.get_backend = lambda name=None: HashEmbeddingBackend()
+        
+        from app.main import app
+        # Keep log rendering cost, drop the output
+        structlog.configure(logger_factory=structlog.PrintLoggerFactory(open(os.devnull, "w")))
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        self.app = app
+        self.server = None
+        self.task = None
+    
+    async def start(self) -> str:
+        import uvicorn
+        from benchmarks.standins import FakeRedis, fake_yandex_transport
+        from app.database.log_writer import request_log_writer
+        from app.services.indexer import indexer_service
+        from app.services.llm_client import llm_client
+        from app.utils.cache import cache_service
+        from app.utils.rate_limiter import rate_limiter
+        from app.utils.semantic_cache import semantic_cache
+        from cli_indexer import module_from_path
+        
+        self.redis = FakeRedis()
+        cache_service.redis = self.redis
+        semantic_cache.redis = self.redis
+        
+        async def allow(key, max_requests=None):
+            return True, 0
+        rate_limiter.check = allow
+        
+        llm_client._client = httpx.AsyncClient(transport=fake_yandex_transport(
+            self.args.llm_latency_ms, self.args.llm_token_ms, self.args.answer_tokens
+        ))
+        request_log_writer.write_fn = len
+        await request_log_writer.start()
+        
+        start = time.perf_counter()
+        chunks = 0
+        for file_path in list_documents(self.args.materials):
+            rel_path = os.path.relpath(file_path, self.args.materials).replace(os.sep, "/")
+            metadata = {"source": rel_path}
+            module = module_from_path(rel_path)
+            if module is not None:
+                metadata["module"] = module
+            result = await indexer_service.index_document(file_path, self.args.course_id, metadata)
+            chunks += result["chunks_created"]
+        print(f"✅ Indexed {chunks} chunks in {time.perf_counter() - start:.1f}s ({self.args.embedder} embedder)")
+        
+        port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(
+            self.app, host="127.0.0.1", port=port, lifespan="off", log_level="warning", access_log=False
+        ))
+        self.task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            if self.task.done():
+                self.task.result()
+            await asyncio.sleep(0.05)
+        return f"http://127.0.0.1:{port}"
+    
+    def cache_stats(self) -> dict:
+        from app.utils.semantic_cache import semantic_cache
+        return {"exact": self.redis.hits.get("answer", 0), "semantic": semantic_cache.hits}
+    
+    async def stop(self):
+        from app.database.log_writer import request_log_writer
+        from app.main import vector_store
+        from app.services.embedder import embedding_scheduler
+        from app.services.llm_client import llm_client
+        
+        self.server.should_exit = True
+        await self.task
+        await request_log_writer.stop()
+        await embedding_scheduler.close()
+        await llm_client.close()
+        await vector_store.close()
+        self.tmp.cleanup()
+
+async def send(client: httpx.AsyncClient, record: dict, args, samples: dict, started: float = None):
+    """One /ask call; started is the scheduled start in open-loop runs"""
+    started = started or time.perf_counter()
+    ttft = None
+    body = {
+        "course_id": args.course_id,
+        "user_id": random.randint(1, args.users),
+        **record
+    }
+    try:
+        if not args.stream:
+            response = await client.post("/ask", json=body)
+            status = response.status_code
+        else:
+            async with client.stream("POST", "/ask/stream", json=body) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if line == "event: token" and ttft is None:
+                        ttft = (time.perf_counter() - started) * 1000
+                    elif line == "event: error":
+                        status = "stream_error"
+    except Exception as e:
+        status = type(e).__name__
+    
+    samples["status"][str(status)] = samples["status"].get(str(status), 0) + 1
+    if status == 200:
+        samples["latency"].append((time.perf_counter() - started) * 1000)
+        if ttft is not None:
+            samples["ttft"].append(ttft)
+
+async def run_load(base_url: str, questions: list, args, token: str) -> tuple:
+    """Send all questions; returns (samples, duration_s)"""
+    samples = {"latency": [], "ttft": [], "status": {}}
+    limits = httpx.Limits(max_connections=None if args.rps else args.concurrency, max_keepalive_connections=None)
+    async with httpx.AsyncClient(
+        base_url=base_url,
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=args.timeout,
+        limits=limits
+    ) as client:
+        start = time.perf_counter()
+        if args.rps:
+            tasks = []
+            for i, record in enumerate(questions):
+                scheduled = start + i / args.rps
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(send(client, record, args, samples, scheduled)))
+            await asyncio.gather(*tasks)
+        else:
+            pending = iter(questions)
+            
+            async def worker():
+                for record in pending:
+                    await send(client, record, args, samples)
+            
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return samples, time.perf_counter() - start
+
+def distribution(values: list) -> dict:
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50), 1),
+        "p95": round(percentile(values, 95), 1),
+        "p99": round(percentile(values, 99), 1),
+        "mean": round(sum(values) / len(values), 1),
+        "max": round(max(values), 1)
+    }
+
+def print_comparison(results: dict, path: str):
+    with open(path, encoding="utf-8") as f:
+        old = json.load(f)
+    print(f"\n📊 vs {path} ({old.get('commit')})")
+    rows = [("rps", old["rps"], results["rps"])]
+    for key in ("latency_ms", "ttft_ms"):
+        if old.get(key) and results.get(key):
+            rows.extend((f"{key} {q}", old[key][q], results[key][q]) for q in ("p50", "p95", "p99"))
+    if old["cache"]["hit_rate"] is not None and results["cache"]["hit_rate"] is not None:
+        rows.append(("cache hit rate", old["cache"]["hit_rate"], results["cache"]["hit_rate"]))
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"   {name:<16}{before:>10}{after:>10}{change:>10}")
+
+async def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    
+    if args.questions:
+        questions = load_questions(args.questions, args.requests)
+    else:
+        questions = synthetic_questions(args.materials, args.requests, args.repeat_ratio, rng)
+    print(f"📋 {len(questions)} questions, {len({q['question'] for q in questions})} unique")
+    
+    server = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        token = args.token or os.environ.get("API_TOKEN", "changeme")
+    else:
+        server = StandinServer(args)
+        from app.config import settings
+        token = args.token or settings.API_TOKEN
+        base_url = await server.start()
+        cache_before = server.cache_stats()
+    
+    mode = f"{args.rps:g} rps open-loop" if args.rps else f"{args.concurrency} clients"
+    print(f"🚀 {'/ask/stream' if args.stream else '/ask'} against {base_url}, {mode}")
+    try:
+        samples, duration = await run_load(base_url, questions, args, token)
+        cache = {"exact_hits": None, "semantic_hits": None, "hit_rate": None}
+        if server:
+            cache_after = server.cache_stats()
+            cache["exact_hits"] = cache_after["exact"] - cache_before["exact"]
+            cache["semantic_hits"] = cache_after["semantic"] - cache_before["semantic"]
+            if samples["latency"]:
+                cache["hit_rate"] = round((cache["exact_hits"] + cache["semantic_hits"]) / len(samples["latency"]), 4)
+    finally:
+        if server:
+            await server.stop()
+    
+    config = {
+        key: value for key, value in vars(args).items()
+        if key not in ("output", "compare", "token")
+    }
+    results = {
+        "commit": git_commit(),
+        "config": config,
+        "requests": len(questions),
+        "ok": len(samples["latency"]),
+        "errors": len(questions) - len(samples["latency"]),
+        "status_codes": samples["status"],
+        "duration_s": round(duration, 2),
+        "rps": round(len(samples["latency"]) / duration, 2) if duration else 0.0,
+        "latency_ms": distribution(samples["latency"]),
+        "ttft_ms": distribution(samples["ttft"]),
+        "cache": cache
+    }
+    
+    print()
+    print(f"   requests   {results['requests']} ({results['errors']} errors, status {results['status_codes']})")
+    print(f"   throughput {results['rps']:.2f} rps over {results['duration_s']:.1f}s")
+    for key in ("latency_ms", "ttft_ms"):
+        if results[key]:
+            d = results[key]
+            print(f"   {key:<10} p50 {d['p50']:.1f}  p95 {d['p95']:.1f}  p99 {d['p99']:.1f}  max {d['max']:.1f}")
+    if cache["hit_rate"] is not None:
+        print(f"   cache      {cache['hit_rate']:.1%} ({cache['exact_hits']} exact, {cache['semantic_hits']} semantic)")
+    
+    write_json(args.output, results)
+    if args.compare:
+        print_comparison(results, args.compare)
+
+if __name__ == "__main__":
+    asyncio.run(main())
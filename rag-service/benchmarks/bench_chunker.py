@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Chunker micro-benchmark: speed and token fit of each chunking method
+
+For every method reports time per pass over the course materials,
+throughput, chunk count and chunk sizes in embedding model tokens:
+how many chunks exceed the model limit (silently truncated when
+embedded) and how much of the limit chunks use on average.
+
+Usage: python benchmarks/bench_chunker.py [--materials PATH] [--repeat 5]
+       [--output results.json]
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import DEFAULT_MATERIALS, list_documents, percentile, write_json
+from app.utils.chunker import CHUNK_METHODS, TextChunker, get_tokenizer, model_token_limit
+from app.utils.parsers import DocumentParser
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunker micro-benchmark")
+    parser.add_argument("--materials", default=DEFAULT_MATERIALS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+    
+    texts = [DocumentParser.parse(path) for path in list_documents(args.materials)]
+    if not texts:
+        print(f"❌ No documents found in {args.materials}")
+        sys.exit(1)
+    
+    tokenizer = get_tokenizer()
+    model_limit = model_token_limit(tokenizer)
+    total_mb = sum(len(text.encode("utf-8")) for text in texts) / 2 ** 20
+    print(f"📄 {len(texts)} documents, {total_mb:.2f} MB, model limit {model_limit} tokens")
+    
+    results = {"documents": len(texts), "megabytes": round(total_mb, 3), "model_limit": model_limit, "methods": []}
+    
+    for method in CHUNK_METHODS:
+        chunker = TextChunker(method=method, tokenizer=tokenizer)
+        # Warm-up (tokenizer caches, regex compilation)
+        for text in texts:
+            chunker.chunk(text, method=method)
+        
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            chunks = [chunk for text in texts for chunk in chunker.chunk(text, method=method)]
+            timings.append((time.perf_counter() - start) * 1000)
+        
+        token_counts = [
+            len(tokenizer(chunk, add_special_tokens=False, verbose=False)["input_ids"])
+            for chunk in chunks
+        ]
+        best_ms = min(timings)
+        results["methods"].append({
+            "method": method,
+            "time_ms": round(best_ms, 2),
+            "mb_per_sec": round(total_mb / (best_ms / 1000), 2) if best_ms else None,
+            "chunks": len(chunks),
+            "tokens_mean": round(sum(token_counts) / len(token_counts), 1),
+            "tokens_p95": percentile(token_counts, 95),
+            "tokens_max": max(token_counts),
+            "over_limit": sum(count > model_limit for count in token_counts),
+            "limit_fill": round(sum(min(count, model_limit) for count in token_counts) / (len(token_counts) * model_limit), 3)
+        })
+    
+    print()
+    print(f"{'method':<12}{'ms':>9}{'MB/s':>8}{'chunks':>8}{'mean tok':>10}{'p95 tok':>9}{'max tok':>9}{'>limit':>8}{'fill':>7}")
+    for row in results["methods"]:
+        print(
+            f"{row['method']:<12}{row['time_ms']:>9.2f}{row['mb_per_sec'] or 0:>8.2f}{row['chunks']:>8}"
+            f"{row['tokens_mean']:>10.1f}{row['tokens_p95']:>9}{row['tokens_max']:>9}{row['over_limit']:>8}{row['limit_fill']:>7.2f}"
+        )
+    
+    write_json(args.output, results)
+
+if __name__ == "__main__":
+    main()
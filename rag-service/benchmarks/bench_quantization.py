@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Qdrant quantization benchmark: recall@k and latency per mode
+
+Indexes course materials into one temporary collection per quantization
+mode and compares searches against exact (brute-force) fp32 results.
+
+Usage: python benchmarks/bench_quantization.py [--materials PATH] [--k 5]
+       [--oversampling 1,2,4] [--output results.json]
+"""
+import argparse
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, OptimizersConfigDiff, PointStruct, SearchParams, VectorParams
+from benchmarks.common import DEFAULT_MATERIALS, load_chunks, percentile, write_json
+from app.config import settings
+from app.services.embedder import embedder_service
+from app.services.qdrant_layout import QUANTIZATION_MODES, quantization_config, search_params
+
+def create_collection(client: QdrantClient, name: str, mode: str, dimension: int, vectors: list, timeout: float):
+    """Create collection for mode and wait until it is indexed"""
+    client.recreate_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=dimension, distance=Distance.COSINE, on_disk=mode != "none"),
+        quantization_config=quantization_config(mode),
+        # Build HNSW and quantized segments even for a small collection
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=1)
+    )
+    for start in range(0, len(vectors), 256):
+        client.upsert(
+            collection_name=name,
+            points=[
+                PointStruct(id=start + i, vector=vector)
+                for i, vector in enumerate(vectors[start:start + 256])
+            ]
+        )
+    
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = client.get_collection(collection_name=name)
+        if info.status == "green" and (info.indexed_vectors_count or 0) >= len(vectors):
+            return
+        time.sleep(0.5)
+    print(f"⚠️  {name} not fully indexed after {timeout:.0f} s, results may be brute-force")
+
+def run_queries(client: QdrantClient, name: str, queries: list, k: int, params) -> tuple:
+    """Search all queries; returns (result ids, latencies in ms)"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = client.search(collection_name=name, query_vector=query, limit=k, search_params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([r.id for r in results])
+    return ids, latencies
+
+def recall_at_k(results: list, truth: list) -> float:
+    hits = sum(len(set(r) & set(t)) for r, t in zip(results, truth))
+    total = sum(len(t) for t in truth)
+    return hits / total if total else 0.0
+
+def memory_mb(mode: str, count: int, dimension: int) -> dict:
+    """Estimated vector memory: RAM for search structures, disk for originals"""
+    original = count * dimension * 4 / 2 ** 20
+    if mode == "none":
+        return {"ram_mb": round(original, 2), "disk_mb": 0.0}
+    quantized = count * dimension * (1 if mode == "scalar" else 1 / 8) / 2 ** 20
+    return {"ram_mb": round(quantized, 2), "disk_mb": round(original, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Qdrant quantization benchmark")
+    parser.add_argument("--materials", default=DEFAULT_MATERIALS)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=100, help="number of query chunks")
+    parser.add_argument("--oversampling", default="1,2,4")
+    parser.add_argument("--index-timeout", type=float, default=300, help="seconds to wait for indexing")
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+    
+    chunks = load_chunks(args.materials)
+    if not chunks:
+        print(f"❌ No documents found in {args.materials}")
+        sys.exit(1)
+    
+    print(f"📄 {len(chunks)} chunks, embedding with {settings.EMBEDDING_MODEL}")
+    vectors = embedder_service.embed_batch(chunks)
+    # Queries: first sentence of evenly spaced chunks
+    step = max(1, len(chunks) // args.queries)
+    query_texts = [chunks[i].split(". ")[0] for i in range(0, len(chunks), step)][:args.queries]
+    queries = embedder_service.embed_batch(query_texts)
+    
+    client = QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    dimension = embedder_service.dimension
+    oversampling_values = [float(v) for v in args.oversampling.split(",")]
+    
+    results = {
+        "chunks": len(chunks),
+        "queries": len(queries),
+        "k": args.k,
+        "dimension": dimension,
+        "modes": []
+    }
+    truth = None
+    
+    for mode in QUANTIZATION_MODES:
+        name = f"{settings.QDRANT_COLLECTION}_bench_{mode}"
+        print(f"🔧 Building {name}")
+        create_collection(client, name, mode, dimension, vectors, args.index_timeout)
+        
+        if truth is None:
+            truth, _ = run_queries(client, name, queries, args.k, SearchParams(exact=True))
+        
+        variants = [(None, None)] if mode == "none" else [(o, True) for o in oversampling_values] + [(1.0, False)]
+        for oversampling, rescore in variants:
+            params = search_params(mode, oversampling=oversampling, rescore=rescore)
+            ids, latencies = run_queries(client, name, queries, args.k, params)
+            row = {
+                "mode": mode,
+                "oversampling": oversampling,
+                "rescore": rescore,
+                f"recall@{args.k}": round(recall_at_k(ids, truth), 4),
+                "latency_p50_ms": round(percentile(latencies, 50), 2),
+                "latency_p95_ms": round(percentile(latencies, 95), 2),
+                **memory_mb(mode, len(vectors), dimension)
+            }
+            results["modes"].append(row)
+        
+        client.delete_collection(collection_name=name)
+    
+    print()
+    print(f"{'mode':<8}{'overs.':>8}{'rescore':>9}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}{'RAM MB':>9}{'disk MB':>9}")
+    for row in results["modes"]:
+        print(
+            f"{row['mode']:<8}{str(row['oversampling'] or '-'):>8}{str(row['rescore'] if row['rescore'] is not None else '-'):>9}"
+            f"{row[f'recall@{args.k}']:>9.3f}{row['latency_p50_ms']:>9.2f}{row['latency_p95_ms']:>9.2f}"
+            f"{row['ram_mb']:>9.2f}{row['disk_mb']:>9.2f}"
+        )
+    
+    write_json(args.output, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Embedded vector store benchmark: brute-force search latency and recall
+
+Fills a temporary LocalVectorStore with random unit vectors per size and
+dtype, then reports insert time and search latency (p50/p95, unfiltered
+and with a module filter selecting a fifth of the points). Recall@k is
+measured against exact float64 scores, so float16 precision loss shows.
+
+Usage: python benchmarks/bench_vector_store.py [--sizes 10000 50000]
+       [--dim 1024] [--queries 100] [--top-k 5] [--output results.json]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from benchmarks.common import percentile, write_json
+from app.services.local_vector_store import LocalVectorStore
+
+DTYPES = ("float32", "float16")
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedded vector store benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    results = {"dim": args.dim, "top_k": args.top_k, "runs": []}
+    
+    for size in args.sizes:
+        vectors = rng.normal(size=(size, args.dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        queries = rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+        exact = np.argsort(-(vectors.astype(np.float64) @ queries.T.astype(np.float64)), axis=0)[:args.top_k].T
+        
+        for dtype in DTYPES:
+            with tempfile.TemporaryDirectory() as path:
+                store = LocalVectorStore(path, dtype=dtype)
+                start = time.perf_counter()
+                for offset in range(0, size, 5000):
+                    store.insert_many([
+                        {
+                            "id": f"00000000-0000-0000-0000-{i:012d}",
+                            "vector": vectors[i],
+                            "course_id": 1,
+                            "content": "",
+                            "metadata": {"source": f"doc-{i % 100}", "module": i % 5, "chunk_index": i}
+                        }
+                        for i in range(offset, min(size, offset + 5000))
+                    ])
+                insert_s = time.perf_counter() - start
+                
+                timings = {"all": [], "module": []}
+                hits = 0
+                for query, expected in zip(queries, exact):
+                    start = time.perf_counter()
+                    found = store.search(query, 1, args.top_k)
+                    timings["all"].append((time.perf_counter() - start) * 1000)
+                    hits += len({p.payload["metadata"]["chunk_index"] for p in found} & set(expected.tolist()))
+                    
+                    start = time.perf_counter()
+                    store.search(query, 1, args.top_k, module=2)
+                    timings["module"].append((time.perf_counter() - start) * 1000)
+            
+            results["runs"].append({
+                "size": size,
+                "dtype": dtype,
+                "insert_s": round(insert_s, 2),
+                "search_p50_ms": round(percentile(timings["all"], 50), 2),
+                "search_p95_ms": round(percentile(timings["all"], 95), 2),
+                "filtered_p50_ms": round(percentile(timings["module"], 50), 2),
+                "recall": round(hits / (args.queries * args.top_k), 4)
+            })
+            print(f"✅ {size} x {args.dim} {dtype} done")
+    
+    print()
+    print(f"{'size':>8}{'dtype':>9}{'insert s':>10}{'p50 ms':>9}{'p95 ms':>9}{'filt p50':>10}{'recall':>8}")
+    for row in results["runs"]:
+        print(
+            f"{row['size']:>8}{row['dtype']:>9}{row['insert_s']:>10.2f}{row['search_p50_ms']:>9.2f}"
+            f"{row['search_p95_ms']:>9.2f}{row['filtered_p50_ms']:>10.2f}{row['recall']:>8.4f}"
+        )
+    
+    write_json(args.output, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Shared helpers for benchmarks
+"""
+import json
+import math
+import os
+import sys
+from typing import Dict, List
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.chunker import chunker
+from app.utils.parsers import DocumentParser
+
+DEFAULT_MATERIALS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "course-materials"
+)
+
+def list_documents(path: str = DEFAULT_MATERIALS) -> List[str]:
+    """All text documents under path"""
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(path)
+        for name in names
+        if name.endswith(('.md', '.txt'))
+    )
+
+def load_texts(path: str = DEFAULT_MATERIALS) -> Dict[str, str]:
+    """Raw text of each document"""
+    return {file_path: DocumentParser.parse_txt(file_path) for file_path in list_documents(path)}
+
+def load_chunks(path: str = DEFAULT_MATERIALS) -> List[str]:
+    """Chunks of course materials using default chunking"""
+    chunks = []
+    for text in load_texts(path).values():
+        chunks.extend(chunker.chunk(DocumentParser.clean_text(text), method="sentences"))
+    return chunks
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def write_json(path: str, data: Dict):
+    """Write benchmark results"""
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"📝 Results written to {path}")
@@ -0,0 +1,162 @@
+"""
+Local stand-ins for external services used by load tests
+
+- FakeRedis: in-memory replacement of the sync Redis client used by the
+  answer and semantic caches, counting answer cache hits
+- HashEmbeddingBackend: deterministic bag-of-words vectors instead of the
+  embedding model, for runs that should measure everything but the model
+- fake_yandex_transport: httpx transport answering YandexGPT completion
+  requests after a configurable latency, optionally streaming
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Dict, List
+import httpx
+import numpy as np
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+class FakeRedis:
+    """Subset of redis.Redis (decode_responses=True) used by the caches"""
+    
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}  # key -> (value, expires_at or None)
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+    
+    def _count(self, key: str, found: bool):
+        prefix = key.split(":", 1)[0]
+        counter = self.hits if found else self.misses
+        counter[prefix] = counter.get(prefix, 0) + 1
+    
+    def get(self, key: str):
+        value, expires_at = self._data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            value = None
+        self._count(key, value is not None)
+        return value
+    
+    def set(self, key: str, value, ex: int = None):
+        expires_at = time.monotonic() + ex if ex else None
+        self._data[key] = (str(value), expires_at)
+        return True
+    
+    def setex(self, key: str, ttl: int, value):
+        return self.set(key, value, ex=ttl)
+    
+    def incr(self, key: str) -> int:
+        value, expires_at = self._data.get(key, ("0", None))
+        value = int(value) + 1
+        self._data[key] = (str(value), expires_at)
+        return value
+    
+    def delete(self, *keys) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+    
+    def expire(self, key: str, ttl: int) -> bool:
+        if key not in self._data:
+            return False
+        self._data[key] = (self._data[key][0], time.monotonic() + ttl)
+        return True
+    
+    def sadd(self, key: str, *members) -> int:
+        value, expires_at = self._data.get(key, (set(), None))
+        added = len(set(members) - value)
+        self._data[key] = (value | set(members), expires_at)
+        return added
+    
+    def smembers(self, key: str) -> set:
+        value, expires_at = self._data.get(key, (set(), None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return set()
+        return set(value)
+    
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+    
+    def ping(self) -> bool:
+        return True
+
+class FakePipeline:
+    """Queued FakeRedis calls, run by execute"""
+    
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.calls = []
+    
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self.calls.append((getattr(self.redis, name), args, kwargs))
+            return self
+        return queue
+    
+    def execute(self) -> list:
+        results = [method(*args, **kwargs) for method, args, kwargs in self.calls]
+        self.calls = []
+        return results
+
+class HashEmbeddingBackend:
+    """
+    Embedding backend hashing words into a fixed number of dimensions
+    
+    Texts sharing words get similar vectors, so retrieval and the semantic
+    cache behave plausibly, while encoding costs microseconds.
+    """
+    
+    name = "hash"
+    
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+    
+    def _bucket(self, word: str) -> int:
+        return int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little") % self.dimension
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in WORD_RE.findall(text.lower()):
+                vectors[row, self._bucket(word)] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+def _completion(text: str) -> bytes:
+    return json.dumps({
+        "result": {
+            "alternatives": [{"message": {"role": "assistant", "text": text}, "status": "ALTERNATIVE_STATUS_FINAL"}],
+            "modelVersion": "standin"
+        }
+    }, ensure_ascii=False).encode()
+
+def fake_yandex_transport(latency_ms: float = 800, token_ms: float = 20, answer_tokens: int = 60) -> httpx.MockTransport:
+    """
+    Transport answering completion requests like YandexGPT
+    
+    Non-streaming answers arrive after latency_ms plus token_ms per answer
+    token. Streaming answers send the first line after latency_ms and one
+    line with the cumulative text per token_ms.
+    """
+    async def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        question = payload["messages"][-1]["text"]
+        words = WORD_RE.findall(question)[-answer_tokens:] or ["ответ"]
+        tokens = [words[i % len(words)] for i in range(answer_tokens)]
+        
+        await asyncio.sleep(latency_ms / 1000)
+        if not payload["completionOptions"].get("stream"):
+            await asyncio.sleep(token_ms * answer_tokens / 1000)
+            return httpx.Response(200, content=_completion(" ".join(tokens)))
+        
+        async def lines():
+            for i in range(1, answer_tokens + 1):
+                if i > 1:
+                    await asyncio.sleep(token_ms / 1000)
+                yield _completion(" ".join(tokens[:i])) + b"\n"
+        
+        return httpx.Response(200, content=lines())
+    
+    return httpx.MockTransport(handler)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+CLI tool for embedding backends: ONNX export, int8 quantization, parity check
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.embedding_backends import (
+    OnnxBackend,
+    TorchBackend,
+    export_onnx,
+    quantize_onnx,
+    parity_check
+)
+from app.utils.parsers import DocumentParser
+from app.utils.chunker import chunker
+
+def load_texts(path: str, limit: int = 500) -> list:
+    """Load sample chunks from a file or directory"""
+    if os.path.isdir(path):
+        files = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in sorted(names)
+            if name.endswith(('.pdf', '.docx', '.txt', '.md'))
+        ]
+    else:
+        files = [path]
+    
+    texts = []
+    for file_path in files:
+        text = DocumentParser.parse(file_path)
+        texts.extend(chunker.chunk(text, method="sentences"))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  Export ONNX:     python cli_embedder.py export [output_dir]")
+        print("  Quantize int8:   python cli_embedder.py quantize [model_dir]")
+        print("  Parity check:    python cli_embedder.py parity <file_or_dir> [onnx|onnx-int8]")
+        sys.exit(1)
+    
+    command = sys.argv[1]
+    
+    if command == "export":
+        output_dir = sys.argv[2] if len(sys.argv) > 2 else settings.EMBEDDING_ONNX_DIR
+        print(f"📦 Exporting {settings.EMBEDDING_MODEL} to {output_dir}")
+        path = export_onnx(output_dir)
+        print(f"✅ Exported: {path}")
+    
+    elif command == "quantize":
+        model_dir = sys.argv[2] if len(sys.argv) > 2 else settings.EMBEDDING_ONNX_DIR
+        print(f"🗜  Quantizing {model_dir} to int8")
+        path = quantize_onnx(model_dir)
+        print(f"✅ Quantized: {path}")
+    
+    elif command == "parity":
+        if len(sys.argv) < 3:
+            print("Usage: python cli_embedder.py parity <file_or_dir> [onnx|onnx-int8]")
+            sys.exit(1)
+        
+        backend_name = sys.argv[3] if len(sys.argv) > 3 else "onnx-int8"
+        texts = load_texts(sys.argv[2])
+        if not texts:
+            print(f"❌ No texts found in {sys.argv[2]}")
+            sys.exit(1)
+        
+        print(f"🔍 Comparing torch fp32 vs {backend_name} on {len(texts)} chunks")
+        result = parity_check(
+            texts,
+            TorchBackend(),
+            OnnxBackend(quantized=backend_name == "onnx-int8")
+        )
+        
+        print(f"   Cosine drift mean: {result['cosine_drift_mean']:.6f}")
+        print(f"   Cosine drift p95:  {result['cosine_drift_p95']:.6f}")
+        print(f"   Cosine drift max:  {result['cosine_drift_max']:.6f}")
+        print(f"   torch: {result['reference_ms']} ms, {backend_name}: {result['candidate_ms']} ms")
+    
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
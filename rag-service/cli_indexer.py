@@ -1,16 +1,49 @@
 #!/usr/bin/env python3
 """
 CLI tool for indexing documents
+
+Directory indexing is pipelined: files are parsed and chunked in a
+process pool, chunks from all in-flight documents share one batched
+embedder, and Qdrant upserts run concurrently. Finished files are
+recorded in a checkpoint, so an interrupted run resumes where it stopped.
+Sources are paths relative to MATERIALS_ROOT, as in the admin API.
+The module number of a file is taken from its full path
+(".../module-3/lectures/..."), unless --module sets it.
 """
+import argparse
 import asyncio
+import fnmatch
+import hashlib
+import json
+import multiprocessing
 import sys
 import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.indexer import indexer_service
+# spawn workers re-import this module: keep the model and the vector
+# store out of the top level, they are imported where they are used
+from app.utils.chunker import chunk_file
+
+DEFAULT_INCLUDE = ["*.pdf", "*.docx", "*.txt", "*.md"]
+
+# "module-3/", "Module_03.md", "модуль 3" -> 3
+MODULE_RE = re.compile(r'(?:module|модуль)[-_ ]?(\d+)', re.IGNORECASE)
 
-async def index_file(file_path: str, course_id: int, title: str):
+def module_from_path(path: str):
+    """Module number from the deepest path part that names one"""
+    for part in reversed(path.replace(os.sep, "/").split("/")):
+        match = MODULE_RE.search(part)
+        if match:
+            return int(match.group(1))
+    return None
+
+async def index_file(file_path: str, course_id: int, title: str, module: int = None):
     """Index a single file"""
+    from app.services.indexer import document_source, indexer_service
+    
     if not os.path.exists(file_path):
         print(f"❌ File not found: {file_path}")
         return
@@ -19,75 +52,251 @@ async def index_file(file_path: str, course_id: int, title: str):
     print(f"   Course ID: {course_id}")
     print(f"   Title: {title}")
     
+    metadata = {"title": title, "source": document_source(file_path)}
+    if module is not None:
+        metadata["module"] = module
+    
     try:
         result = await indexer_service.index_document(
             file_path=file_path,
             course_id=course_id,
-            metadata={"title": title}
+            metadata=metadata
         )
         
-        print(f"✅ Success!")
-        print(f"   Chunks created: {result['chunks_created']}")
+        if result["status"] == "unchanged":
+            print(f"⏭️  Unchanged, skipped ({result['chunks_created']} chunks)")
+            return
+        
+        print(f"✅ Success! ({result['status']})")
+        print(f"   Chunks: {result['chunks_created']}")
+        print(f"   Embedded: {result['chunks_embedded']}, reused: {result['chunks_reused']}, deleted: {result['chunks_deleted']}")
         print(f"   Characters: {result['total_characters']}")
     
     except Exception as e:
         print(f"❌ Error: {str(e)}")
 
-async def index_directory(dir_path: str, course_id: int):
-    """Index all documents in a directory"""
+def find_documents(dir_path: str, include: list, exclude: list) -> list:
+    """
+    Recursively list documents matching include and not exclude patterns
+    
+    Patterns are matched against the path relative to dir_path and
+    against the bare file name, so "*.md" and "lectures/*.md" both work.
+    Returns: sorted relative paths
+    """
+    found = []
+    for root, dirs, names in os.walk(dir_path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in names:
+            rel_path = os.path.relpath(os.path.join(root, name), dir_path).replace(os.sep, "/")
+            
+            def matches(patterns):
+                return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+            
+            if matches(include) and not matches(exclude):
+                found.append(rel_path)
+    return sorted(found)
+
+class Checkpoint:
+    """Finished files of a directory run: {relative path: doc hash}"""
+    
+    def __init__(self, path: str, dir_path: str, course_id: int):
+        self.path = path
+        self.key = {"root": os.path.abspath(dir_path), "course_id": course_id}
+        self.files = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if {k: data.get(k) for k in self.key} == self.key:
+                self.files = data.get("files", {})
+    
+    def is_done(self, rel_path: str, doc_hash: str) -> bool:
+        return self.files.get(rel_path) == doc_hash
+    
+    def mark_done(self, rel_path: str, doc_hash: str):
+        self.files[rel_path] = doc_hash
+        if not self.path:
+            return
+        # Write-then-rename so an interrupted run never leaves a torn file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**self.key, "files": self.files}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+class Progress:
+    """Single-line progress with throughput"""
+    
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.start_time = time.time()
+    
+    def update(self, chunks: int = 0, embedded: int = 0, skipped: bool = False, failed: bool = False):
+        self.done += 1
+        self.chunks += chunks
+        self.embedded += embedded
+        self.skipped += skipped
+        self.failed += failed
+        self.render()
+    
+    def rates(self) -> tuple:
+        elapsed = max(time.time() - self.start_time, 1e-6)
+        return self.done / elapsed, self.chunks / elapsed
+    
+    def render(self, final: bool = False):
+        docs_per_sec, chunks_per_sec = self.rates()
+        line = (
+            f"\r📊 [{self.done}/{self.total}] {docs_per_sec:.1f} docs/s, {chunks_per_sec:.1f} chunks/s"
+            f" | chunks: {self.chunks}, embedded: {self.embedded}, skipped: {self.skipped}, errors: {self.failed}"
+        )
+        print(line, end="\n" if final else "", flush=True)
+
+async def index_directory(
+    dir_path: str,
+    course_id: int,
+    include: list = None,
+    exclude: list = None,
+    workers: int = None,
+    concurrency: int = 8,
+    embed_batch: int = 64,
+    checkpoint_path: str = None,
+    module: int = None
+):
+    """Index all documents in a directory tree; module overrides the one in their paths"""
+    from app.services.embedder import embedder_service
+    from app.config import settings
+    from app.services.indexer import document_source, indexer_service, file_document_hash
+    from app.utils.batcher import MicroBatcher
+    
     if not os.path.isdir(dir_path):
         print(f"❌ Directory not found: {dir_path}")
         return
     
-    files = [f for f in os.listdir(dir_path) 
-             if f.endswith(('.pdf', '.docx', '.txt'))]
+    files = find_documents(dir_path, include or DEFAULT_INCLUDE, exclude or [])
     
     if not files:
         print(f"❌ No documents found in {dir_path}")
         return
     
-    print(f"📁 Found {len(files)} documents")
+    root = os.path.abspath(settings.MATERIALS_ROOT)
+    if os.path.commonpath([root, os.path.abspath(dir_path)]) != root:
+        print(f"⚠️  {dir_path} is outside MATERIALS_ROOT ({root}): sources are bare file names")
     
-    for filename in files:
-        file_path = os.path.join(dir_path, filename)
-        title = os.path.splitext(filename)[0]
-        await index_file(file_path, course_id, title)
-        print()
-
-def main():
-    if len(sys.argv) < 3:
-        print("Usage:")
-        print("  Index file:      python cli_indexer.py file <path> <course_id> <title>")
-        print("  Index directory: python cli_indexer.py dir <path> <course_id>")
-        sys.exit(1)
-    
-    command = sys.argv[1]
-    
-    if command == "file":
-        if len(sys.argv) < 5:
-            print("Usage: python cli_indexer.py file <path> <course_id> <title>")
-            sys.exit(1)
-        
-        file_path = sys.argv[2]
-        course_id = int(sys.argv[3])
-        title = sys.argv[4]
-        
-        asyncio.run(index_file(file_path, course_id, title))
+    checkpoint = Checkpoint(checkpoint_path, dir_path, course_id)
+    print(f"📁 Found {len(files)} documents ({len(checkpoint.files)} in checkpoint)")
+    
+    # Passage embeddings in larger batches than the interactive query path
+    batcher = MicroBatcher(embedder_service.embed_batch, max_batch_size=embed_batch, max_wait_ms=20)
+    progress = Progress(len(files))
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = []
+    loop = asyncio.get_running_loop()
     
-    elif command == "dir":
-        if len(sys.argv) < 4:
-            print("Usage: python cli_indexer.py dir <path> <course_id>")
-            sys.exit(1)
+    # spawn: workers import only parsers and chunker (see imports above)
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
         
-        dir_path = sys.argv[2]
-        course_id = int(sys.argv[3])
+        async def process(rel_path: str):
+            async with semaphore:
+                file_path = os.path.join(dir_path, rel_path)
+                source = document_source(file_path)
+                metadata = {
+                    "title": os.path.splitext(os.path.basename(rel_path))[0],
+                    "source": source
+                }
+                file_module = module if module is not None else module_from_path(os.path.abspath(file_path))
+                if file_module is not None:
+                    metadata["module"] = file_module
+                try:
+                    doc_hash = await asyncio.to_thread(file_document_hash, file_path, metadata)
+                    if checkpoint.is_done(rel_path, doc_hash):
+                        progress.update(skipped=True)
+                        return
+                    
+                    existing, unchanged = await asyncio.to_thread(
+                        indexer_service.source_state, course_id, source, doc_hash
+                    )
+                    if unchanged:
+                        checkpoint.mark_done(rel_path, doc_hash)
+                        progress.update(skipped=True)
+                        return
+                    
+                    _, chunks = await loop.run_in_executor(pool, chunk_file, file_path)
+                    result = await indexer_service.index_chunks(
+                        chunks, course_id, source, doc_hash,
+                        {**metadata, "filename": os.path.basename(rel_path)},
+                        existing=existing,
+                        batcher=batcher
+                    )
+                    checkpoint.mark_done(rel_path, doc_hash)
+                    progress.update(chunks=result["chunks_created"], embedded=result["chunks_embedded"])
+                except Exception as e:
+                    errors.append((rel_path, str(e)))
+                    progress.update(failed=True)
         
-        asyncio.run(index_directory(dir_path, course_id))
+        try:
+            await asyncio.gather(*(process(rel_path) for rel_path in files))
+        finally:
+            await batcher.close()
     
-    else:
-        print(f"Unknown command: {command}")
-        sys.exit(1)
+    progress.render(final=True)
+    docs_per_sec, chunks_per_sec = progress.rates()
+    print(f"✅ Done in {time.time() - progress.start_time:.1f}s ({docs_per_sec:.1f} docs/s, {chunks_per_sec:.1f} chunks/s)")
+    for rel_path, error in errors:
+        print(f"❌ {rel_path}: {error}")
+
+def default_checkpoint_path(dir_path: str, course_id: int) -> str:
+    """Checkpoint file of a directory run, one per course and directory"""
+    root_hash = hashlib.sha1(os.path.abspath(dir_path).encode("utf-8")).hexdigest()[:8]
+    return f".index_checkpoint_{course_id}_{root_hash}.json"
+
+def main():
+    parser = argparse.ArgumentParser(description="Index course documents")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    file_parser = commands.add_parser("file", help="index a single file")
+    file_parser.add_argument("path")
+    file_parser.add_argument("course_id", type=int)
+    file_parser.add_argument("title")
+    file_parser.add_argument("--module", type=int, default=None, help="course module number")
+    
+    dir_parser = commands.add_parser("dir", help="index a directory tree")
+    dir_parser.add_argument("path")
+    dir_parser.add_argument("course_id", type=int)
+    dir_parser.add_argument("--module", type=int, default=None, help="module number of all files (default: from their paths)")
+    dir_parser.add_argument("--include", action="append", help=f"glob pattern, repeatable (default: {' '.join(DEFAULT_INCLUDE)})")
+    dir_parser.add_argument("--exclude", action="append", default=[], help="glob pattern, repeatable")
+    dir_parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    dir_parser.add_argument("--concurrency", type=int, default=8, help="documents in flight")
+    dir_parser.add_argument("--embed-batch", type=int, default=64, help="embedding batch size")
+    dir_parser.add_argument("--checkpoint", default=None, help="checkpoint file (default: .index_checkpoint_<course_id>_<directory hash>.json)")
+    dir_parser.add_argument("--no-checkpoint", action="store_true", help="ignore and do not write a checkpoint")
+    
+    args = parser.parse_args()
+    
+    if args.command == "file":
+        asyncio.run(index_file(args.path, args.course_id, args.title, args.module))
+    
+    elif args.command == "dir":
+        checkpoint_path = None if args.no_checkpoint else (
+            args.checkpoint or default_checkpoint_path(args.path, args.course_id)
+        )
+        asyncio.run(index_directory(
+            args.path,
+            args.course_id,
+            include=args.include,
+            exclude=args.exclude,
+            workers=args.workers,
+            concurrency=args.concurrency,
+            embed_batch=args.embed_batch,
+            checkpoint_path=checkpoint_path,
+            module=args.module
+        ))
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+CLI tool for Qdrant collection maintenance
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.qdrant_service import qdrant_service
+
+def show_info():
+    """Print collection layout"""
+    info = qdrant_service.client.get_collection(
+        collection_name=qdrant_service.collection_name
+    )
+    hnsw = info.config.hnsw_config
+    
+    print(f"📦 Collection: {qdrant_service.collection_name}")
+    print(f"   Points: {info.points_count}")
+    print(f"   Status: {info.status}")
+    print(f"   HNSW: m={hnsw.m}, payload_m={hnsw.payload_m}, ef_construct={hnsw.ef_construct}")
+    print(f"   Quantization: {qdrant_service._quantization_mode(info.config.quantization_config)}")
+    print(f"   Vectors on disk: {bool(info.config.params.vectors.on_disk)}")
+    print(f"   Sparse vectors: {', '.join((info.config.params.sparse_vectors or {}).keys()) or 'none'}")
+    print(f"   Payload indexes: {', '.join(sorted((info.payload_schema or {}).keys())) or 'none'}")
+
+def migrate():
+    """Apply current layout settings to existing collection"""
+    print(
+        f"🔧 Migrating {qdrant_service.collection_name} "
+        f"(tenancy: {settings.QDRANT_TENANCY_MODE}, quantization: {settings.QDRANT_QUANTIZATION})"
+    )
+    if not qdrant_service.has_sparse:
+        print("   Adding sparse vectors copies the collection: stop indexing until this finishes")
+    else:
+        print("   BM25 statistics are recounted: stop indexing until this finishes")
+    changes = qdrant_service.migrate()
+    
+    if not changes:
+        print("✅ Already up to date")
+        return
+    
+    for change in changes:
+        print(f"   {change}")
+    print("✅ Done. Qdrant rebuilds indexes in the background; check status with: python cli_qdrant.py info")
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  Show layout:     python cli_qdrant.py info")
+        print("  Migrate layout:  python cli_qdrant.py migrate")
+        sys.exit(1)
+    
+    command = sys.argv[1]
+    
+    if command == "info":
+        show_info()
+    
+    elif command == "migrate":
+        migrate()
+    
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
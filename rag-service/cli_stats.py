@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+CLI tool for request statistics maintenance
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.crud import rebuild_course_daily_stats
+from app.database.db import SessionLocal, init_db
+
+def rebuild():
+    """Recompute per-day course aggregates from the request log"""
+    init_db()
+    print("🔧 Rebuilding course_daily_stats from requests_log (log flushes wait until this finishes)")
+    db = SessionLocal()
+    try:
+        counted = rebuild_course_daily_stats(db)
+    finally:
+        db.close()
+    print(f"✅ Done. Counted {counted} requests")
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage:")
+        print("  Rebuild daily stats:  python cli_stats.py rebuild")
+        sys.exit(1)
+    
+    command = sys.argv[1]
+    
+    if command == "rebuild":
+        rebuild()
+    
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
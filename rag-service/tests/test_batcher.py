@@ -0,0 +1,74 @@
+"""
+Tests for micro-batching
+"""
+import asyncio
+import pytest
+from app.utils.batcher import MicroBatcher, iterate_in_thread
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_are_batched():
+    """Concurrent items go through one batch call"""
+    calls = []
+    
+    def batch_fn(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+    
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=50)
+    results = await asyncio.gather(*[batcher.submit(i) for i in range(5)])
+    
+    await batcher.close()
+    
+    assert results == [0, 2, 4, 6, 8]
+    assert len(calls) == 1
+    assert batcher.stats()["max_batch_seen"] == 5
+
+@pytest.mark.asyncio
+async def test_max_batch_size_respected():
+    """Batches never exceed max_batch_size"""
+    sizes = []
+    
+    def batch_fn(items):
+        sizes.append(len(items))
+        return items
+    
+    batcher = MicroBatcher(batch_fn, max_batch_size=3, max_wait_ms=50)
+    results = await asyncio.gather(*[batcher.submit(i) for i in range(7)])
+    
+    await batcher.close()
+    
+    assert results == list(range(7))
+    assert max(sizes) <= 3
+    assert batcher.stats()["items_total"] == 7
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_callers():
+    """Batch failure is raised in every waiting caller"""
+    def batch_fn(items):
+        raise RuntimeError("encode failed")
+    
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=5)
+    
+    with pytest.raises(RuntimeError):
+        await batcher.submit("text")
+    await batcher.close()
+
+@pytest.mark.asyncio
+async def test_iterate_in_thread_bounds_read_ahead():
+    """Producer runs at most depth batches ahead and stops when consumer stops"""
+    produced = []
+    
+    def generate():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+    
+    batches = []
+    async for batch in iterate_in_thread(generate(), batch_size=10, depth=2):
+        batches.append(batch)
+        if len(batches) == 3:
+            break
+    await asyncio.sleep(0.1)
+    
+    assert batches[0] == list(range(10))
+    assert len(produced) < 100
@@ -0,0 +1,16 @@
+"""
+Tests for benchmark helpers
+"""
+from benchmarks.common import percentile
+
+def test_percentile_is_nearest_rank():
+    """The q-th percentile is the smallest value with at least q% at or below it"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile(list(range(1, 11)), 50) == 5
+    assert percentile([2.0, 1.0], 50) == 1.0
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) == 0.0
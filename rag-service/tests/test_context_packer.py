@@ -0,0 +1,61 @@
+"""
+Tests for prompt context packing
+"""
+from app.models.response import Chunk
+from app.utils.context_packer import ContextPacker
+
+def chunk(content, score, source="lecture.md", **metadata):
+    return Chunk(content=content, score=score, source=source, metadata=metadata)
+
+def test_adjacent_chunks_merge_without_overlap():
+    """Consecutive chunks of a source become one passage, overlap sent once"""
+    packer = ContextPacker(max_tokens=1000, max_passages=5)
+    chunks = [
+        chunk("Второе предложение. Третье предложение.", 0.8, chunk_index=1),
+        chunk("Первое предложение. Второе предложение.", 0.9, chunk_index=0),
+        chunk("Другой документ.", 0.5, source="other.md", chunk_index=0)
+    ]
+    
+    packed, stats = packer.pack(chunks)
+    
+    assert [p.content for p in packed] == [
+        "Первое предложение. Второе предложение. Третье предложение.",
+        "Другой документ."
+    ]
+    assert packed[0].score == 0.9
+    assert packed[0].metadata["chunk_index_end"] == 1
+    assert stats["passages"] == 2 and stats["tokens_saved"] > 0
+
+def test_offset_chunks_merge_and_duplicates_drop():
+    """Token chunks merge by offsets; near-duplicates of other sources drop"""
+    packer = ContextPacker(max_tokens=1000, max_passages=5)
+    text = "HNSW строит граф близости. Поиск идет жадно по слоям графа."
+    chunks = [
+        chunk(text[:40], 0.9, chunk_index=3, char_start=100, char_end=140),
+        chunk(text[30:], 0.7, chunk_index=4, char_start=130, char_end=100 + len(text)),
+        chunk(text, 0.6, source="copy.md", chunk_index=0)
+    ]
+    
+    packed, _ = packer.pack(chunks)
+    
+    assert [p.content for p in packed] == [text]
+    assert packed[0].metadata["char_end"] == 100 + len(text)
+
+def test_budget_keeps_most_relevant():
+    """Passages are taken by relevance within the token budget"""
+    packer = ContextPacker(max_tokens=60, max_passages=5, count_tokens=lambda text: len(text.split()))
+    chunks = [
+        chunk("низкая " * 10, 0.2, source="a.md"),
+        chunk("высокая релевантность " * 10, 0.9, source="b.md"),
+        chunk("средняя " * 40, 0.5, source="c.md"),
+        chunk("огромный " * 500, 0.95, source="d.md")
+    ]
+    
+    packed, stats = packer.pack(chunks)
+    
+    assert [p.source for p in packed] == ["d.md"]
+    assert stats["tokens_after"] <= 60
+    
+    packed, stats = packer.pack(chunks[:3])
+    assert [p.source for p in packed] == ["b.md", "a.md"]
+    assert stats["tokens_after"] <= 60
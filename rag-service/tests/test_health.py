@@ -0,0 +1,69 @@
+"""
+Tests for background health checks
+"""
+import asyncio
+import time
+from app.services.health import HealthMonitor
+
+def make_monitor(**kwargs):
+    calls = []
+    
+    async def ok():
+        calls.append("ok")
+        return True
+    
+    async def broken():
+        raise ConnectionError("connection refused")
+    
+    async def slow():
+        await asyncio.sleep(1)
+        return True
+    
+    async def unconfigured():
+        return None
+    
+    monitor = HealthMonitor(interval=60, timeout=0.05, **kwargs)
+    monitor.register("store", ok, required=True)
+    monitor.register("redis", broken)
+    monitor.register("llm", slow)
+    monitor.register("extra", unconfigured)
+    return monitor, calls
+
+def test_results_cached_until_next_round():
+    """Reads never run probes; failures are reported with their reason"""
+    monitor, calls = make_monitor()
+    assert monitor.services() == {"store": "unknown", "redis": "unknown", "llm": "unknown", "extra": "unknown"}
+    assert monitor.not_ready() == ["store"]
+    
+    asyncio.run(monitor.check_all())
+    for _ in range(100):
+        monitor.services()
+        monitor.not_ready()
+    
+    assert calls == ["ok"]
+    assert monitor.services() == {"store": "ok", "redis": "error", "llm": "error", "extra": "not_configured"}
+    checks = monitor.checks()
+    assert checks["redis"]["error"] == "connection refused"
+    assert checks["llm"]["error"].startswith("timeout")
+    assert checks["store"]["required"] and checks["store"]["checked_at"]
+    assert monitor.not_ready() == []
+
+def test_stale_results_are_not_ready():
+    monitor, _ = make_monitor(stale_after=0.01)
+    asyncio.run(monitor.check_all())
+    time.sleep(0.02)
+    
+    assert monitor.services()["store"] == "stale"
+    assert monitor.not_ready() == ["store"]
+
+def test_background_probing_starts_and_stops():
+    monitor, calls = make_monitor()
+    
+    async def run():
+        await monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+    
+    asyncio.run(run())
+    assert calls == ["ok"]
+    assert monitor.services()["store"] == "ok"
@@ -3,9 +3,17 @@ Tests for indexing
 """
 import pytest
 import os
+import re
 from app.services.indexer import indexer_service
 from app.utils.parsers import DocumentParser
-from app.utils.chunker import chunker
+from app.utils.chunker import TextChunker, chunker
+
+class WordTokenizer:
+    """Stand-in for the model tokenizer: one token per word or sign"""
+    model_max_length = 512
+    
+    def __call__(self, text, **kwargs):
+        return {"offset_mapping": [(m.start(), m.end()) for m in re.finditer(r"\w+|[^\w\s]", text)]}
 
 def test_parse_txt():
     """Test TXT parsing"""
@@ -42,3 +50,157 @@ async def test_index_text():
     assert result["chunks_created"] > 0
     assert result["course_id"] == 999
 
+
+@pytest.mark.asyncio
+async def test_reindex_is_incremental():
+    """Test re-indexing reuses unchanged chunks and removes orphans"""
+    metadata = {"source": "test_reindex"}
+    sentences = [f"Предложение номер {i} про векторный поиск и эмбеддинги." for i in range(30)]
+    
+    first = await indexer_service.index_text(" ".join(sentences), course_id=997, metadata=metadata)
+    assert first["chunks_embedded"] == first["chunks_created"]
+    
+    again = await indexer_service.index_text(" ".join(sentences), course_id=997, metadata=metadata)
+    assert again["status"] == "unchanged"
+    assert again["chunks_embedded"] == 0
+    
+    shorter = await indexer_service.index_text(" ".join(sentences[:10]), course_id=997, metadata=metadata)
+    assert shorter["chunks_embedded"] < shorter["chunks_created"]
+    assert shorter["chunks_deleted"] > 0
+    
+    stored = indexer_service.store.get_source_points(997, "test_reindex")
+    assert len(stored) == shorter["chunks_created"]
+
+@pytest.mark.asyncio
+async def test_reindex_after_model_change_reembeds(monkeypatch):
+    """Test stored vectors of another embedding model are not reused"""
+    from app.config import settings
+    metadata = {"source": "test_model_change"}
+    text = " ".join(f"Предложение {i} о квантовании векторов." for i in range(20))
+    
+    await indexer_service.index_text(text, course_id=996, metadata=metadata)
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL", settings.EMBEDDING_MODEL + "-v2")
+    
+    result = await indexer_service.index_text(text, course_id=996, metadata=metadata)
+    assert result["chunks_embedded"] == result["chunks_created"]
+    assert result["chunks_reused"] == 0
+
+def test_streaming_chunks_match_and_carry_pages():
+    """Test streamed chunking matches whole-text chunking and tracks pages"""
+    pages = [
+        (1, "Первая страница начинается здесь. Предложение переходит"),
+        (2, "на вторую страницу. " + "Еще одно предложение про RAG. " * 30),
+        (3, "Последняя страница.")
+    ]
+    
+    streamed = list(chunker.iter_chunks(pages))
+    whole = chunker.chunk_by_sentences(" ".join(text for _, text in pages))
+    
+    assert [c["text"] for c in streamed] == whole
+    assert streamed[0]["page_start"] == 1
+    assert "Предложение переходит на вторую страницу." in streamed[0]["text"]
+    assert streamed[-1]["page_end"] == 3
+    assert all(c["page_start"] <= c["page_end"] for c in streamed)
+
+def test_parse_txt_paragraph_stream():
+    """Test TXT is read as paragraphs and cleaned incrementally"""
+    with open("/tmp/test_stream.txt", "w", encoding="utf-8") as f:
+        f.write("Первый абзац.\nВторая строка.\n\n\nВторой   абзац!\n")
+    
+    segments = list(DocumentParser.iter_clean("/tmp/test_stream.txt"))
+    assert segments == [(None, "Первый абзац. Вторая строка."), (None, "Второй абзац!")]
+    assert DocumentParser.parse("/tmp/test_stream.txt") == "Первый абзац. Вторая строка. Второй абзац!"
+    os.unlink("/tmp/test_stream.txt")
+
+def test_token_chunks_fit_limit_with_offsets():
+    """Test token chunks respect the token limit, overlap and keep offsets"""
+    token_chunker = TextChunker(chunk_tokens=20, chunk_overlap_tokens=5, tokenizer=WordTokenizer())
+    text = " ".join(f"Предложение {i} о поиске по векторам." for i in range(40))
+    
+    chunks = token_chunker.chunk_by_tokens(text)
+    
+    assert len(chunks) > 1
+    assert all(c["tokens"] <= 20 for c in chunks)
+    assert all(text[c["start"]:c["end"]] == c["text"] for c in chunks)
+    # Consecutive chunks overlap and together cover the text
+    assert all(b["start"] < a["end"] for a, b in zip(chunks, chunks[1:]))
+    assert chunks[0]["start"] == 0 and chunks[-1]["end"] == len(text)
+    # Windows end on sentence boundaries when possible
+    assert all(c["text"].endswith(".") for c in chunks)
+
+def test_streamed_token_chunks_match_whole_text():
+    """Test token chunking over segments matches chunking the joined text"""
+    token_chunker = TextChunker(chunk_tokens=16, chunk_overlap_tokens=4, tokenizer=WordTokenizer())
+    pages = [(i + 1, f"Страница {i}. " + "Текст про эмбеддинги и чанки. " * 12) for i in range(20)]
+    joined = " ".join(text for _, text in pages)
+    
+    streamed = list(token_chunker.iter_chunks(pages, method="tokens"))
+    
+    assert [c["text"] for c in streamed] == [c["text"] for c in token_chunker.chunk_by_tokens(joined)]
+    assert all(joined[c["start"]:c["end"]] == c["text"] for c in streamed)
+    assert streamed[0]["page_start"] == 1 and streamed[-1]["page_end"] == 20
+
+def test_character_chunking_terminates():
+    """Test character chunking ends when the tail is shorter than the overlap"""
+    chunks = chunker.chunk("слово " * 100, method="characters")
+    assert 1 < len(chunks) < 10
+
+def test_parse_markdown_sections(tmp_path):
+    """Test Markdown headings become heading paths, code fences excluded"""
+    path = tmp_path / "lecture.md"
+    path.write_text(
+        "# Векторный поиск\nВведение.\n\n## HNSW\nГраф.\n\n```\n# не заголовок\n```\n\n## Квантизация\nСжатие.\n",
+        encoding="utf-8"
+    )
+    
+    sections = list(DocumentParser.iter_clean_sections(str(path)))
+    
+    assert sections[0] == (("Векторный поиск",), None, "Векторный поиск")
+    assert (("Векторный поиск", "HNSW"), None, "Граф.") in sections
+    assert any(text == "не заголовок" and headings[-1] == "HNSW" for headings, _, text in sections)
+    assert sections[-1] == (("Векторный поиск", "Квантизация"), None, "Сжатие.")
+
+def test_section_chunks_do_not_cross_headings():
+    """Test section chunking keeps chunks inside one section with offsets"""
+    token_chunker = TextChunker(chunk_tokens=16, chunk_overlap_tokens=4, tokenizer=WordTokenizer())
+    sections = [
+        (("Модуль", f"Тема {i}"), None, f"Тема {i}. " + "Текст раздела о поиске. " * 6)
+        for i in range(3)
+    ]
+    joined = " ".join(text for _, _, text in sections)
+    
+    chunks = list(token_chunker.iter_section_chunks(sections, method="tokens"))
+    
+    for headings, _, text in sections:
+        own = [c for c in chunks if c["headings"] == list(headings)]
+        assert own and all(c["text"] in text for c in own)
+    assert all(joined[c["start"]:c["end"]] == c["text"] for c in chunks)
+
+def test_cli_indexer_import_skips_model():
+    """Parser workers re-import cli_indexer: it must not load the embedder"""
+    import subprocess
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = (
+        "import sys, cli_indexer; "
+        "assert 'app.services.embedder' not in sys.modules; "
+        "assert 'app.services.indexer' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
+
+def test_module_from_full_path():
+    """Module comes from the directory passed to the CLI, not just below it"""
+    from cli_indexer import module_from_path
+    
+    assert module_from_path("/srv/course-materials/module-3/lectures/lecture-1.md") == 3
+    assert module_from_path("/srv/module-1/extra/Module_04.md") == 4
+    assert module_from_path("/srv/course-materials/test-data/notes.md") is None
+
+def test_document_source_relative_to_root(tmp_path):
+    """CLI and API name a document by its path under MATERIALS_ROOT"""
+    from app.services.indexer import document_source
+    root = tmp_path / "course-materials"
+    
+    assert document_source(str(root / "module-1" / "lectures" / "lecture-1.md"), str(root)) == "module-1/lectures/lecture-1.md"
+    assert document_source(os.path.join(str(root), "module-1/../../secret.md"), str(root)) == "secret.md"
+    assert document_source(str(tmp_path / "other" / "notes.md"), str(root)) == "notes.md"
@@ -0,0 +1,159 @@
+"""
+Tests for background indexing jobs
+"""
+import asyncio
+import os
+import pytest
+from app.config import settings
+from app.services.jobs import IndexJobService, JobQueueFull, LocalJobQueue
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+
+async def wait_for(service: IndexJobService, job_id: str, statuses=("done", "failed")):
+    for _ in range(200):
+        job = await service.get(job_id)
+        if job.status in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def make_upload(service: IndexJobService, tmp_path, name: str = "doc.txt"):
+    job = service.create_job(course_id=1, filename=name, metadata={"title": name})
+    with open(job.file_path, "w", encoding="utf-8") as f:
+        f.write("Текст документа.")
+    return job
+
+@pytest.mark.asyncio
+async def test_job_runs_and_reports_progress(tmp_path):
+    """Job goes queued -> done with progress and timings, upload removed"""
+    async def index_fn(job, progress):
+        await progress({"chunks": 3, "embedded": 2, "reused": 1})
+        return {"chunks_created": 3}
+    
+    service = IndexJobService(index_fn=index_fn, queue=LocalJobQueue(), workers=1)
+    await service.start()
+    job = await service.enqueue(make_upload(service, tmp_path))
+    
+    job = await wait_for(service, job.id)
+    await service.stop()
+    
+    assert job.status == "done"
+    assert job.result == {"chunks_created": 3}
+    assert job.progress["chunks"] == 3
+    assert {"queued", "indexing", "total"} <= set(job.timings_ms)
+    assert "file_path" not in job.public_dict()
+    assert not os.path.exists(job.file_path)
+
+@pytest.mark.asyncio
+async def test_job_error_is_recorded(tmp_path):
+    """Exceptions fail the job instead of killing the worker"""
+    async def index_fn(job, progress):
+        raise ValueError("Document is empty or could not be parsed")
+    
+    service = IndexJobService(index_fn=index_fn, queue=LocalJobQueue(), workers=1)
+    await service.start()
+    first = await service.enqueue(make_upload(service, tmp_path, "a.txt"))
+    second = await service.enqueue(make_upload(service, tmp_path, "b.txt"))
+    
+    first = await wait_for(service, first.id)
+    second = await wait_for(service, second.id)
+    await service.stop()
+    
+    assert first.status == "failed"
+    assert "empty" in first.error
+    assert second.status == "failed"
+
+class LeaseRecordingQueue(LocalJobQueue):
+    def __init__(self):
+        super().__init__()
+        self.extended = []
+        self.acked = []
+    
+    async def extend(self, job):
+        self.extended.append(job.id)
+    
+    async def ack(self, job):
+        self.acked.append((job.id, job.status))
+
+@pytest.mark.asyncio
+async def test_running_job_keeps_lease_and_is_acked(tmp_path, monkeypatch):
+    """Worker extends the job lease while it runs and acks it once finished"""
+    monkeypatch.setattr(settings, "INDEX_JOB_LEASE", 0.03)
+    
+    async def index_fn(job, progress):
+        await asyncio.sleep(0.05)
+        return {}
+    
+    queue = LeaseRecordingQueue()
+    service = IndexJobService(index_fn=index_fn, queue=queue, workers=1)
+    await service.start()
+    job = await service.enqueue(make_upload(service, tmp_path))
+    
+    job = await wait_for(service, job.id)
+    await asyncio.sleep(0.01)
+    await service.stop()
+    
+    assert job.id in queue.extended
+    assert queue.acked == [(job.id, "done")]
+
+@pytest.mark.asyncio
+async def test_worker_concurrency_limit(tmp_path):
+    """No more than `workers` jobs run at once"""
+    running = 0
+    peak = 0
+    
+    async def index_fn(job, progress):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return {}
+    
+    service = IndexJobService(index_fn=index_fn, queue=LocalJobQueue(), workers=2)
+    await service.start()
+    jobs = [await service.enqueue(make_upload(service, tmp_path, f"{i}.txt")) for i in range(6)]
+    for job in jobs:
+        await wait_for(service, job.id)
+    await service.stop()
+    
+    assert peak == 2
+
+@pytest.mark.asyncio
+async def test_queue_full(tmp_path):
+    """Enqueue beyond queue size is rejected"""
+    service = IndexJobService(queue=LocalJobQueue(max_size=1), workers=1)
+    await service.enqueue(make_upload(service, tmp_path, "a.txt"))
+    
+    with pytest.raises(JobQueueFull):
+        await service.enqueue(make_upload(service, tmp_path, "b.txt"))
+
+@pytest.mark.asyncio
+async def test_zero_workers_only_enqueue(tmp_path):
+    """An API process with INDEX_JOB_WORKERS=0 queues jobs without running them"""
+    service = IndexJobService(queue=LocalJobQueue(), workers=0)
+    await service.start()
+    job = await service.enqueue(make_upload(service, tmp_path))
+    await asyncio.sleep(0.05)
+    
+    assert (await service.get(job.id)).status == "queued"
+    assert (await service.stats())["workers"] == 0
+    await service.stop()
+
+@pytest.mark.asyncio
+async def test_stop_fails_queued_local_jobs(tmp_path):
+    """Jobs left in the in-process queue fail on stop and lose their uploads"""
+    queue = LocalJobQueue()
+    service = IndexJobService(queue=queue, workers=0)
+    jobs = [await service.enqueue(make_upload(service, tmp_path, f"{name}.txt")) for name in "ab"]
+    
+    await service.stop()
+    
+    for job in jobs:
+        stored = await queue.load(job.id)
+        assert stored.status == "failed"
+        assert stored.error == "Interrupted by shutdown"
+        assert not os.path.exists(job.file_path)
+    assert await queue.depth() == 0
@@ -0,0 +1,36 @@
+"""
+Tests for write-behind request logging
+"""
+import pytest
+from app.database.log_writer import RequestLogWriter
+
+@pytest.mark.asyncio
+async def test_records_flushed_in_batches():
+    """Records are written in bulk and drained on stop"""
+    batches = []
+    
+    def write_fn(rows):
+        batches.append(list(rows))
+        return len(rows)
+    
+    writer = RequestLogWriter(write_fn, queue_size=100, batch_size=3, flush_interval_ms=20)
+    await writer.start()
+    for i in range(7):
+        writer.enqueue({"user_id": i})
+    await writer.stop()
+    
+    assert sum(len(b) for b in batches) == 7
+    assert max(len(b) for b in batches) <= 3
+    assert writer.stats()["written"] == 7
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_records():
+    """Enqueue never blocks; overflow is counted"""
+    writer = RequestLogWriter(lambda rows: len(rows), queue_size=2, batch_size=10, flush_interval_ms=20)
+    await writer.start()
+    accepted = [writer.enqueue({"user_id": i}) for i in range(5)]
+    await writer.stop()
+    
+    assert accepted == [True, True, False, False, False]
+    assert writer.stats()["dropped"] == 3
+    assert writer.stats()["written"] == 2
@@ -19,6 +19,18 @@ def test_health():
     assert data["status"] == "healthy"
     assert "services" in data
 
+def test_health_live_and_ready():
+    assert client.get("/health/live").json() == {"status": "alive"}
+    # Probes run in the background after startup; nothing is checked yet
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_ready"
+
+def test_metrics():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "rag_requests_in_flight" in response.text
+
 def test_ask_without_auth():
     response = client.post("/ask", json={
         "user_id": 1,
@@ -35,3 +47,11 @@ def test_ask_with_invalid_token():
     )
     assert response.status_code == 401
 
+
+def test_ask_stream_without_auth():
+    response = client.post("/ask/stream", json={
+        "user_id": 1,
+        "course_id": 1,
+        "question": "Test question"
+    })
+    assert response.status_code == 403  # No auth
@@ -0,0 +1,66 @@
+"""
+Tests for request stage metrics
+"""
+import asyncio
+from prometheus_client import REGISTRY
+from app.utils.metrics import RequestTimer, stage
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def test_stages_recorded_with_cache_outcome():
+    """Stages add up per request and are labelled when the request ends"""
+    labels = {"endpoint": "test", "course_id": "7", "cache": "semantic"}
+    before = sample("rag_stage_duration_seconds_count", stage="cache", **labels)
+    
+    with RequestTimer("test", 7) as timer:
+        assert sample("rag_requests_in_flight", endpoint="test") == 1
+        with stage("cache"):
+            pass
+        with stage("cache"):
+            pass
+        timer.cache = "semantic"
+    
+    assert sample("rag_stage_duration_seconds_count", stage="cache", **labels) == before + 1
+    assert sample("rag_stage_duration_seconds_count", stage="total", **labels) >= 1
+    assert sample("rag_requests_in_flight", endpoint="test") == 0
+    assert set(timer.stages) == {"cache", "total"}
+
+def test_stage_follows_request_into_tasks():
+    """Concurrent tasks of a request report to its timer; others are ignored"""
+    async def search():
+        with stage("search"):
+            await asyncio.sleep(0.01)
+    
+    async def run():
+        with RequestTimer("test", 1) as timer:
+            await asyncio.gather(search(), search())
+        return timer
+    
+    timer = asyncio.run(run())
+    assert timer.stages["search"] >= 0.02
+    
+    with stage("search"):
+        pass
+    assert timer.stages["search"] < 1
+
+def test_stream_timer_in_flight_only_while_body_runs():
+    """A stream body that never runs or is closed early leaves no request in flight"""
+    never_started = RequestTimer("test-stream", 1, in_flight=False)
+    assert sample("rag_requests_in_flight", endpoint="test-stream") == 0
+    
+    async def body(timer):
+        timer.start_flight()
+        with timer.activate():
+            yield 1
+            yield 2
+    
+    async def consume_first():
+        stream = body(RequestTimer("test-stream", 1, in_flight=False))
+        await stream.__anext__()
+        assert sample("rag_requests_in_flight", endpoint="test-stream") == 1
+        await stream.aclose()  # client disconnected
+    
+    asyncio.run(consume_first())
+    assert sample("rag_requests_in_flight", endpoint="test-stream") == 0
+    assert not never_started._finished
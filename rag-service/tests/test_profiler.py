@@ -0,0 +1,84 @@
+"""
+Tests for the request sampling profiler
+"""
+import asyncio
+from collections import Counter
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.utils.metrics import RequestTimer, stage
+from app.utils.profiler import ProfileStore, ProfilingMiddleware, RequestProfiler
+
+async def wait_for_llm():
+    await asyncio.sleep(0.05)
+
+def make_client(store):
+    app = FastAPI()
+    
+    @app.get("/slow")
+    async def slow():
+        with RequestTimer("test", 3):
+            with stage("generation"):
+                await wait_for_llm()
+        return {"ok": True}
+    
+    @app.get("/fast")
+    async def fast():
+        return {"ok": True}
+    
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            await wait_for_llm()
+            yield "done"
+        return StreamingResponse(body())
+    
+    app.add_middleware(ProfilingMiddleware, profiler=RequestProfiler(interval_ms=2), store=store)
+    return TestClient(app)
+
+def test_slow_requests_profiled_with_stages(tmp_path, monkeypatch):
+    """Slow requests keep a profile tagged with timer data; fast ones don't"""
+    monkeypatch.setattr(settings, "PROFILING_SLOW_MS", 30)
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 0.0)
+    store = ProfileStore(str(tmp_path), max_files=10, fmt="collapsed")
+    client = make_client(store)
+    
+    assert client.get("/fast").status_code == 200
+    response = client.get("/slow", headers={"X-Request-ID": "req-1"})
+    client.get("/stream")
+    
+    profiles = store.list()
+    assert [p["path"] for p in profiles] == ["/stream", "/slow"]
+    slow = profiles[1]
+    assert response.headers["x-request-id"] == "req-1"
+    assert slow["request_id"] == "req-1" and slow["reason"] == "slow"
+    assert slow["course_id"] == 3 and slow["stages_ms"]["generation"] >= 40
+    with open(store.file_path(slow["file"]), encoding="utf-8") as f:
+        assert "wait_for_llm" in f.read()
+    # The streaming body runs in a child task of the request
+    with open(store.file_path(profiles[0]["file"]), encoding="utf-8") as f:
+        assert "wait_for_llm" in f.read()
+
+def test_sampled_requests_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_SLOW_MS", 0)
+    monkeypatch.setattr(settings, "PROFILING_SAMPLE_RATE", 1.0)
+    store = ProfileStore(str(tmp_path), max_files=10, fmt="speedscope")
+    make_client(store).get("/slow")
+    
+    profile = store.list()[0]
+    assert profile["reason"] == "sampled"
+    assert profile["file"].endswith(".speedscope.json")
+
+def test_store_rotates_and_rejects_bad_names(tmp_path):
+    store = ProfileStore(str(tmp_path), max_files=2, fmt="collapsed")
+    samples = Counter({("<await Future>",): 1000})
+    names = [
+        store.save(samples, {"request_id": f"r{i}", "method": "GET", "path": "/ask"})
+        for i in range(3)
+    ]
+    
+    assert [p["request_id"] for p in store.list()] == ["r2", "r1"]
+    assert store.file_path(names[0]) is None
+    assert store.file_path(names[2]) is not None
+    assert store.file_path("../" + names[2]) is None
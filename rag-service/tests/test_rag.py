@@ -45,3 +45,43 @@ def test_qdrant_insert_and_search():
     assert len(results) > 0
     assert results[0].payload["content"] == text
 
+
+def test_qdrant_insert_many():
+    """Test bulk insert in batches"""
+    texts = ["Чанк номер один", "Чанк номер два", "Чанк номер три"]
+    embeddings = embedder_service.embed_batch(texts)
+    
+    stats = qdrant_service.insert_many(
+        [
+            {
+                "vector": embedding,
+                "course_id": 998,
+                "content": text,
+                "metadata": {"source": "test", "test": True}
+            }
+            for text, embedding in zip(texts, embeddings)
+        ],
+        batch_size=2,
+        wait=False
+    )
+    
+    assert stats["points"] == 3
+    assert stats["batches"] == 2
+    assert len(stats["batch_timings_ms"]) == 2
+    
+    results = qdrant_service.search(
+        vector=embeddings[2],
+        course_id=998,
+        limit=1
+    )
+    assert results[0].payload["content"] == texts[2]
+
+def test_generation_failure_raises():
+    """Failed generation raises instead of returning error text as an answer"""
+    import asyncio
+    from app.services.generator import GeneratorError, GeneratorService
+    generator = GeneratorService()
+    generator.api_key = None
+    
+    with pytest.raises(GeneratorError):
+        asyncio.run(generator.generate_with_context("Что такое RAG?", []))
@@ -0,0 +1,34 @@
+"""
+Tests for Redis rate limiter
+"""
+import uuid
+import pytest
+from app.utils.rate_limiter import RateLimiter, SCRIPTS
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", list(SCRIPTS))
+async def test_limit_enforced(mode):
+    """Requests over the limit are rejected with retry hint"""
+    limiter = RateLimiter(mode=mode)
+    key = f"ratelimit:test:{uuid.uuid4().hex}"
+    
+    results = [await limiter.check(key, max_requests=3) for _ in range(5)]
+    await limiter.redis.delete(key)
+    await limiter.close()
+    
+    assert [allowed for allowed, _ in results] == [True, True, True, False, False]
+    assert results[3][1] > 0
+
+@pytest.mark.asyncio
+async def test_same_second_requests_counted_separately():
+    """Two requests in the same millisecond are both counted"""
+    limiter = RateLimiter(mode="sliding_log")
+    key = f"ratelimit:test:{uuid.uuid4().hex}"
+    
+    await limiter.check(key, max_requests=10)
+    await limiter.check(key, max_requests=10)
+    count = await limiter.redis.zcard(key)
+    await limiter.redis.delete(key)
+    await limiter.close()
+    
+    assert count == 2
@@ -0,0 +1,69 @@
+"""
+Tests for semantic answer cache
+"""
+from benchmarks.standins import FakeRedis
+from app.utils.cache import CacheService
+from app.utils.semantic_cache import SemanticCache
+
+def test_similar_question_hits():
+    """Nearby embedding returns cached answer"""
+    cache = SemanticCache(threshold=0.95, max_entries=10, ttl=60)
+    cache.set([1.0, 0.0, 0.0], 1, "что такое RAG?", {"answer": "RAG"})
+    
+    assert cache.get([0.99, 0.05, 0.0], 1) == {"answer": "RAG"}
+    assert cache.get([0.0, 1.0, 0.0], 1) is None
+    assert cache.get([1.0, 0.0, 0.0], 2) is None
+    assert cache.stats()["hits"] == 1
+
+def test_lru_eviction():
+    """Least recently used entry is evicted when full"""
+    cache = SemanticCache(threshold=0.99, max_entries=2, ttl=60)
+    cache.set([1.0, 0.0, 0.0], 1, "a", {"answer": "a"})
+    cache.set([0.0, 1.0, 0.0], 1, "b", {"answer": "b"})
+    cache.get([1.0, 0.0, 0.0], 1)
+    cache.set([0.0, 0.0, 1.0], 1, "c", {"answer": "c"})
+    
+    assert cache.get([0.0, 1.0, 0.0], 1) is None
+    assert cache.get([1.0, 0.0, 0.0], 1) == {"answer": "a"}
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_and_invalidation():
+    """Expired and invalidated entries are not returned"""
+    cache = SemanticCache(threshold=0.9, max_entries=10, ttl=-1)
+    cache.set([1.0, 0.0], 1, "a", {"answer": "a"})
+    assert cache.get([1.0, 0.0], 1) is None
+    
+    cache.ttl = 60
+    cache.set([1.0, 0.0], 1, "a", {"answer": "a"})
+    cache.invalidate_course(1)
+    assert cache.get([1.0, 0.0], 1) is None
+
+def test_generation_read_at_most_once_per_ttl():
+    """Lookups reuse the course generation instead of reading Redis each time"""
+    redis = FakeRedis()
+    cache = SemanticCache(redis_client=redis, threshold=0.9, max_entries=10, ttl=60)
+    cache.generation_ttl = 60
+    cache.set([1.0, 0.0], 1, "a", {"answer": "a"})
+    for _ in range(5):
+        assert cache.get([1.0, 0.0], 1) == {"answer": "a"}
+    
+    assert redis.hits.get("semcache", 0) + redis.misses.get("semcache", 0) == 1
+    
+    # Reindexing from another process shows up once the generation expires
+    redis.incr("semcache:generation:1")
+    cache.generation_ttl = 0
+    assert cache.get([1.0, 0.0], 1) is None
+
+def test_exact_answers_invalidated_per_course():
+    """Reindexing a course drops its exact cached answers only"""
+    cache = CacheService()
+    cache.redis = FakeRedis()
+    cache.set_answer_cache("что такое RAG?", 1, {"answer": "RAG"})
+    cache.set_answer_cache("что такое RAG?", 1, {"answer": "RAG m2"}, module=2)
+    cache.set_answer_cache("что такое RAG?", 2, {"answer": "other"})
+    
+    cache.invalidate_course(1)
+    
+    assert cache.get_answer_cache("что такое RAG?", 1) is None
+    assert cache.get_answer_cache("что такое RAG?", 1, module=2) is None
+    assert cache.get_answer_cache("что такое RAG?", 2) == {"answer": "other"}
@@ -0,0 +1,69 @@
+"""
+Tests for sparse lexical vectors and rank fusion
+"""
+from app.utils.sparse import SparseEncoder, bm25_idf, tokenize, term_index, reciprocal_rank_fusion
+from app.utils.sparse_stats import CourseTermStats
+
+def test_tokenize_ru_en():
+    """Stopwords dropped, endings stripped, identifiers kept"""
+    tokens = tokenize("Что такое векторные базы данных и параметр top_k?")
+    
+    assert "что" not in tokens
+    assert "векторн" in tokens
+    assert "top_k" in tokens
+    assert "top" in tokens
+
+def test_inflections_share_terms():
+    """Different case forms map to the same sparse index"""
+    encoder = SparseEncoder()
+    doc_indices, _ = encoder.encode_document("Индексирование документов в векторной базе")
+    query_indices, _ = encoder.encode_query("векторная база документ")
+    
+    assert set(query_indices) <= set(doc_indices)
+    assert term_index("rag") == term_index("rag")
+
+def test_bm25_saturation():
+    """Repeated term weight grows sublinearly"""
+    encoder = SparseEncoder(k1=1.2, b=0.0)
+    _, once = encoder.encode_document("qdrant")
+    _, many = encoder.encode_document("qdrant qdrant qdrant qdrant")
+    
+    assert once[0] < many[0] < 4 * once[0]
+
+def test_course_stats_idf():
+    """Rare terms weigh more in the query than common ones"""
+    stats = CourseTermStats()
+    for text in ["qdrant индекс", "qdrant коллекция", "qdrant hnsw граф", "qdrant"]:
+        stats.add(text)
+    
+    assert stats.docs == 4
+    assert stats.avg_doc_length == 2.0
+    idf = {index: bm25_idf(stats.docs, df) for index, df in stats.df.items()}
+    indices, values = SparseEncoder().encode_query("qdrant hnsw", idf)
+    weights = dict(zip(indices, values))
+    
+    assert weights[term_index("hnsw")] > weights[term_index("qdrant")] > 0
+
+def test_query_without_stats():
+    """Without course statistics every query term weighs 1.0"""
+    _, values = SparseEncoder().encode_query("векторная база")
+    
+    assert values == [1.0, 1.0]
+
+def test_avg_doc_length_normalization():
+    """Chunks longer than the course average get lower term weights"""
+    encoder = SparseEncoder(k1=1.2, b=0.75)
+    text = "qdrant " + " ".join(f"term{i}" for i in range(19))
+    _, short_course = encoder.encode_document(text, avg_doc_length=40)
+    _, long_course = encoder.encode_document(text, avg_doc_length=10)
+    
+    assert long_course[0] < short_course[0]
+
+def test_reciprocal_rank_fusion():
+    """Items ranked high in both lists come first"""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], k=60)
+    ids = [item_id for item_id, _ in fused]
+    
+    assert ids[0] == "a"
+    assert set(ids) == {"a", "b", "c", "d"}
+    assert all(0 < score <= 1 for _, score in fused)
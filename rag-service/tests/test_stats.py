@@ -0,0 +1,50 @@
+"""
+Tests for course statistics aggregates
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects import postgresql
+from app.database.crud import LATENCY_BUCKETS_MS, _latency_bucket, latency_percentile, update_course_daily_stats
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+    
+    def execute(self, statement):
+        self.statements.append(statement)
+
+def test_latency_bucket():
+    """Latencies map to the first bucket whose bound covers them"""
+    assert _latency_bucket(10) == 0
+    assert _latency_bucket(50) == 0
+    assert _latency_bucket(51) == 1
+    assert _latency_bucket(10 ** 6) == len(LATENCY_BUCKETS_MS)
+
+def test_latency_percentile():
+    """Percentiles are estimated within bucket bounds"""
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for latency in [40, 90, 120, 180, 250, 800, 1200, 2500, 4000, 9000]:
+        histogram[_latency_bucket(latency)] += 1
+    
+    assert 200 <= latency_percentile(histogram, 0.5) <= 300
+    assert 7500 <= latency_percentile(histogram, 0.99) <= 10000
+    assert latency_percentile([0] * len(histogram), 0.5) is None
+
+def test_daily_stats_single_sorted_upsert():
+    """Rows are grouped per UTC day and upserted in (course_id, day) order"""
+    late_evening = datetime(2026, 3, 1, 23, 30, tzinfo=timezone(timedelta(hours=-3)))
+    db = RecordingSession()
+    update_course_daily_stats(db, [
+        {"course_id": 2, "created_at": late_evening, "status": "success", "response_time_ms": 120},
+        {"course_id": 1, "created_at": late_evening, "status": "error", "response_time_ms": None},
+        {"course_id": 2, "created_at": late_evening, "status": "success", "response_time_ms": 80}
+    ])
+    
+    assert len(db.statements) == 1
+    compiled = db.statements[0].compile(dialect=postgresql.dialect())
+    assert "ON CONFLICT ON CONSTRAINT uq_course_daily_stats DO UPDATE" in str(compiled)
+    params = compiled.params
+    assert [params["course_id_m0"], params["course_id_m1"]] == [1, 2]
+    assert params["day_m1"].isoformat() == "2026-03-02"
+    assert params["total_requests_m1"] == 2
+    assert params["latency_sum_ms_m1"] == 200
+    assert params["error_requests_m0"] == 1
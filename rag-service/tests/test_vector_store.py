@@ -0,0 +1,194 @@
+"""
+Tests for the embedded vector store
+"""
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from app.services import local_vector_store
+from app.services.local_vector_store import AsyncLocalVectorStore, LocalVectorStore
+
+def items(course_id, vectors, source="lecture.md", **metadata):
+    return [
+        {
+            "id": LocalVectorStore.point_id(course_id, source, f"chunk-{i}"),
+            "vector": vector,
+            "course_id": course_id,
+            "content": f"chunk {i}",
+            "metadata": {"source": source, "chunk_index": i, **metadata}
+        }
+        for i, vector in enumerate(vectors)
+    ]
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_search_matches_brute_force(tmp_path, dtype):
+    """Top-k equals exact cosine ranking; other courses are not searched"""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(3000, 16)).astype(np.float32)
+    store = LocalVectorStore(str(tmp_path), dtype=dtype)
+    store.insert_many(items(1, vectors.tolist()))
+    store.insert_many(items(2, vectors[:10].tolist()))
+    query = rng.normal(size=16)
+    
+    results = store.search(query.tolist(), course_id=1, limit=5)
+    
+    normalized = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(dtype).astype(np.float32)
+    expected = np.argsort(-(normalized @ query))[:5]
+    assert [r.payload["metadata"]["chunk_index"] for r in results] == expected.tolist()
+    assert all(r.payload["course_id"] == 1 for r in results)
+    assert results[0].score >= results[-1].score
+    
+    # A reopened store (float16: float32 copy rebuilt from the file) ranks the same
+    reopened = LocalVectorStore(str(tmp_path), dtype=dtype)
+    assert [r.id for r in reopened.search(query.tolist(), course_id=1, limit=5)] == [r.id for r in results]
+
+def test_payload_filters(tmp_path):
+    """Module and section filters select only matching points"""
+    store = LocalVectorStore(str(tmp_path))
+    store.insert_many(items(1, [[1.0, 0.0], [0.9, 0.1]], source="a.md", module=1, headings=["Введение"]))
+    store.insert_many(items(1, [[1.0, 0.0]], source="b.md", module=2, headings=["HNSW", "Графы"]))
+    
+    assert {r.payload["metadata"]["source"] for r in store.search([1.0, 0.0], 1, 10, module=1)} == {"a.md"}
+    assert {r.payload["metadata"]["source"] for r in store.search([1.0, 0.0], 1, 10, section="Графы")} == {"b.md"}
+    assert store.search([1.0, 0.0], 1, 10, module=1, section="Графы") == []
+
+def test_persists_updates_and_deletes(tmp_path):
+    """Reopened store sees upserts and deletes; freed rows are reused"""
+    store = LocalVectorStore(str(tmp_path))
+    points = items(5, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+    store.insert_many(points)
+    store.delete_points([points[0]["id"]])
+    store.insert_many([{**points[1], "metadata": {**points[1]["metadata"], "page": 2}}])
+    
+    reopened = LocalVectorStore(str(tmp_path))
+    
+    assert set(reopened.get_source_points(5, "lecture.md")) == {points[1]["id"], points[2]["id"]}
+    assert reopened.get_source_points(5, "lecture.md")[points[1]["id"]]["page"] == 2
+    assert reopened.get_vectors([points[2]["id"]])[points[2]["id"]] == [0.0, 0.0, 1.0]
+    assert reopened.search([0.0, 0.9, 0.1], 5, 1)[0].id == points[1]["id"]
+    
+    reopened.insert_many(items(5, [[1.0, 1.0, 0.0]], source="new.md"))
+    assert reopened.count(5) == 3
+    assert len(reopened._course(5).ids) == 3
+    assert reopened.source_stats(5) == {"lecture.md": 2, "new.md": 1}
+
+def test_async_store_has_no_sparse_results(tmp_path):
+    """Hybrid retrieval falls back to dense results on the local backend"""
+    store = AsyncLocalVectorStore(LocalVectorStore(str(tmp_path)))
+    assert asyncio.run(store.search_sparse([1, 2], [0.5, 0.5], course_id=1)) == []
+    assert asyncio.run(store.supports_sparse()) is False
+    assert asyncio.run(store.count(1)) == 0
+
+def test_async_score_points(tmp_path):
+    """score_points gives the cosine similarity of the requested points"""
+    local = LocalVectorStore(str(tmp_path))
+    points = items(1, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    local.insert_many(points)
+    store = AsyncLocalVectorStore(local)
+    
+    scores = asyncio.run(store.score_points([1.0, 1.0, 0.0], 1, [points[1]["id"]]))
+    assert list(scores) == [points[1]["id"]]
+    assert abs(scores[points[1]["id"]] - 0.7071) < 1e-3
+
+class AsyncSets:
+    def __init__(self):
+        self.sets = {}
+    
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+    
+    async def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+    
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+def test_qdrant_source_stats_counts_registered_sources(monkeypatch):
+    """Sources are found by one scroll, then counted with count queries"""
+    from qdrant_client import AsyncQdrantClient
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+    from app.services import async_qdrant_service
+    from app.services.async_qdrant_service import AsyncQdrantService
+    from app.utils.course_sources import CourseSources
+    
+    registry = CourseSources(async_redis_client=AsyncSets())
+    monkeypatch.setattr(async_qdrant_service, "course_sources", registry)
+    
+    async def main():
+        store = AsyncQdrantService()
+        store.client = AsyncQdrantClient(location=":memory:")
+        store.collection_name = "sources"
+        await store.client.create_collection("sources", vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+        await store.client.upsert("sources", points=[
+            PointStruct(id=item["id"], vector=item["vector"], payload=item)
+            for item in items(1, [[1.0, 0.0], [0.0, 1.0]]) + items(1, [[1.0, 1.0]], source="api.md")
+        ])
+        scrolls = []
+        scroll = store._scroll_source_stats
+        
+        async def counting_scroll(*args):
+            scrolls.append(args)
+            return await scroll(*args)
+        
+        store._scroll_source_stats = counting_scroll
+        first = await store.source_stats(1)
+        await registry.add_async(1, ["removed.md"])
+        store._source_stats.clear()
+        second = await store.source_stats(1)
+        return first, second, len(scrolls), await registry.members(1)
+    
+    first, second, scrolls, registered = asyncio.run(main())
+    assert first == second == {"lecture.md": 2, "api.md": 1}
+    assert scrolls == 1
+    assert registered == {"lecture.md", "api.md"}
+
+def test_async_search_does_not_block_loop(tmp_path):
+    """A search waiting for the course lock leaves the event loop free"""
+    store = LocalVectorStore(str(tmp_path))
+    store.insert_many(items(1, [[1.0, 0.0], [0.0, 1.0]]))
+    async_store = AsyncLocalVectorStore(store)
+    course = store._course(1)
+    
+    def hold_lock(acquired):
+        with course.lock:
+            acquired.set()
+            time.sleep(0.2)
+    
+    async def main():
+        ticks = 0
+        acquired = threading.Event()
+        threading.Thread(target=hold_lock, args=(acquired,)).start()
+        acquired.wait()
+        search = asyncio.ensure_future(async_store.search([1.0, 0.0], course_id=1))
+        while not search.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks, search.result()
+    
+    ticks, results = asyncio.run(main())
+    assert ticks > 5
+    assert results[0].payload["metadata"]["chunk_index"] == 0
+
+def test_stores_sharing_a_directory(tmp_path, monkeypatch):
+    """Writes of another process are seen and never reuse its rows"""
+    monkeypatch.setattr(local_vector_store, "COMPACT_MIN_STALE", 0)
+    api = LocalVectorStore(str(tmp_path))
+    cli = LocalVectorStore(str(tmp_path))
+    assert api.count(3) == 0
+    
+    first = items(3, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    cli.insert_many(first)
+    assert api.count(3) == 2
+    assert api.search([0.0, 1.0, 0.0], 3, 1)[0].id == first[1]["id"]
+    
+    api.insert_many(items(3, [[0.0, 0.0, 1.0]], source="api.md"))
+    cli.delete_points([first[0]["id"]])  # compacts the log
+    cli.insert_many(items(3, [[0.6, 0.8, 0.0]], source="cli.md"))
+    
+    for store in (api, cli, LocalVectorStore(str(tmp_path))):
+        course = store._course(3)
+        assert store.source_stats(3) == {"lecture.md": 1, "api.md": 1, "cli.md": 1}
+        assert len(set(course.rows.values())) == 3
+        assert store.search([0.0, 0.0, 1.0], 3, 1)[0].payload["metadata"]["source"] == "api.md"
+        assert store.search([0.6, 0.8, 0.0], 3, 1)[0].payload["metadata"]["source"] == "cli.md"